@@ -0,0 +1,239 @@
+"""
+Benchmark of SiMon on large synthetic campaigns.
+
+For every campaign size, a campaign is generated with InitialConditionGenerator in a temporary directory:
+
+- n_sims top-level simulations of the DemoSimulation code, mostly NEW, some DONE, and some RUN (their PID is the PID of
+  the benchmark, so they are seen as running, and nothing is ever started or killed);
+- every 10th simulation has been restarted, with restart chains of 1 to max_depth levels (the intermediate levels are
+  stopped, the deepest one is in the same state as the other simulations);
+- the running simulations have an output file and a restart file of several MB.
+
+The following operations are timed:
+
+- SiMon(): reading the global config and registering the modules;
+- build_simulation_tree(), without and with the simulation index of the previous scan;
+- auto_scheduler(), a full cycle of the daemon (twice: the first cycle also starts the progress histories);
+- print_sim_status_overview() of the whole tree;
+- CheckpointStore.backup() of the restart files of the running simulations (copy, then unchanged files).
+
+The results are printed, and written as JSON (with the version of SiMon and the parameters), so that the results of
+two versions can be compared with --compare.
+
+Usage: python bench_campaign.py [--sizes 1000,10000,100000] [--max-depth 50] [--output-mb 4] [--restart-mb 16]
+                                [--json bench_campaign.json] [--compare old.json]
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import datetime
+import subprocess
+
+__simon_dir__ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, __simon_dir__)
+from ic_generator import InitialConditionGenerator
+from checkpoint import CheckpointStore
+
+OPERATIONS = ['SiMon()', 'build_simulation_tree (cold)', 'build_simulation_tree (index cached)', 'auto_scheduler #1',
+              'auto_scheduler #2', 'print_sim_status_overview', 'checkpoint backup (copy)',
+              'checkpoint backup (unchanged)']
+
+
+class Silenced(object):
+    """
+    Discard what is printed to stdout, e.g. one line per simulation.
+    """
+
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+        return False
+
+
+def write_output_file(path, t_last, size_mb):
+    """
+    Write an output file of about size_mb MB, whose last line gives the model time t_last.
+    """
+    line = '%f, %s\n'
+    with open(path, 'w') as f_out:
+        n_lines = max(1, int(size_mb * (1 << 20) / 64))
+        for i in range(n_lines):
+            t = t_last * (i + 1) / n_lines
+            f_out.write(line % (t, '0.123456789 ' * 4))
+
+
+def generate_campaign(root_dir, n_sims, max_depth, output_mb, restart_mb):
+    """
+    :return: The list of the directories of the running simulations.
+    """
+    sim_root = os.path.join(root_dir, 'sims')
+    os.makedirs(sim_root)
+    conf_fn = os.path.join(root_dir, 'SiMon.conf')
+    n_running = max(1, n_sims // 100)
+    with open(conf_fn, 'w') as f_conf:
+        # the running simulations occupy all slots, so that nothing is started
+        f_conf.write('[SiMon]\nRoot_dir: %s\nMax_concurrent_jobs: %d\nDaemon_sleep_time: 3600\n' % (sim_root, n_running))
+    generator = InitialConditionGenerator(conf_fn)
+    with Silenced():
+        generator.parse_config_file()
+
+    # a process that is not running anymore, for the stopped simulations
+    proc = subprocess.Popen(['true'])
+    proc.wait()
+    dead_pid = proc.pid
+
+    running_dirs = []
+    restart_blob = os.urandom(1 << 20)
+    for i in range(n_sims):
+        sim_dir = 'sim_%06d' % i
+        chain = [sim_dir]
+        if i % 10 == 0:
+            depth = 1 + (i // 10) % max_depth
+            for level in range(depth):
+                chain.append(os.path.join(chain[-1], 'restart1'))
+        if i % 100 == 0:
+            state = 'RUN'
+        elif i % 20 == 1:
+            state = 'DONE'
+        else:
+            state = 'NEW'
+        for level, rel_dir in enumerate(chain):
+            with Silenced():
+                generator.generate_simulation_ic('DemoSimulation', 30, rel_dir, 'true', output_file='output.txt',
+                                                 error_file='error.txt', restart_file='restart.txt',
+                                                 restart_cmd='true')
+            full_dir = os.path.join(sim_root, rel_dir)
+            leaf_state = state
+            if level < len(chain) - 1:
+                leaf_state = 'STOP'
+            if leaf_state == 'NEW':
+                continue
+            conf_path = os.path.join(full_dir, 'SiMon.conf')
+            with open(conf_path) as f_conf:
+                conf = f_conf.read()
+            with open(conf_path, 'w') as f_conf:
+                f_conf.write(conf.replace('Timestamp_started = 0\n', 'Timestamp_started = %d\n' % time.time()))
+            with open(os.path.join(full_dir, '.process.pid'), 'w') as f_pid:
+                f_pid.write('%d\n' % (os.getpid() if leaf_state == 'RUN' else dead_pid))
+            if leaf_state == 'RUN':
+                write_output_file(os.path.join(full_dir, 'output.txt'), 10.0 + level, output_mb)
+                with open(os.path.join(full_dir, 'restart.txt'), 'wb') as f_restart:
+                    for _ in range(int(restart_mb)):
+                        f_restart.write(restart_blob)
+                running_dirs.append(full_dir)
+            else:
+                write_output_file(os.path.join(full_dir, 'output.txt'), 30.0 if leaf_state == 'DONE' else 5.0,
+                                  0.01)
+    return running_dirs
+
+
+def timed(results, label, func, *args):
+    with Silenced():
+        t_start = time.time()
+        ret = func(*args)
+        results[label] = time.time() - t_start
+    print('  %-45s %10.3f s' % (label, results[label]))
+    return ret
+
+
+def backup_all(running_dirs):
+    for sim_dir in running_dirs:
+        CheckpointStore(sim_dir, 'restart.txt', stable_time=0).backup()
+
+
+def run_size(n_sims, args):
+    from module_common import SimulationTask
+    from simon import SiMon
+    root_dir = tempfile.mkdtemp()
+    results = dict()
+    try:
+        t_start = time.time()
+        running_dirs = generate_campaign(root_dir, n_sims, args.max_depth, args.output_mb, args.restart_mb)
+        print('Campaign of %d simulations generated in %.1f s (%s)' % (n_sims, time.time() - t_start, root_dir))
+        SimulationTask.progress_histories.clear()
+
+        app = timed(results, 'SiMon()', lambda: SiMon(cwd=root_dir))
+        app.logger = logging.getLogger('bench_campaign')
+        app.logger.setLevel(logging.CRITICAL)
+        timed(results, 'build_simulation_tree (cold)', app.build_simulation_tree)
+        timed(results, 'build_simulation_tree (index cached)', app.build_simulation_tree)
+        timed(results, 'auto_scheduler #1', app.auto_scheduler)
+        timed(results, 'auto_scheduler #2', app.auto_scheduler)
+        timed(results, 'print_sim_status_overview', app.print_sim_status_overview, 0)
+        SimulationTask.checkpoint_archiver.wait()
+        timed(results, 'checkpoint backup (copy)', backup_all, running_dirs)
+        timed(results, 'checkpoint backup (unchanged)', backup_all, running_dirs)
+        results['n_tasks'] = len(app.sim_inst_dict) - 1
+        results['n_running'] = len(running_dirs)
+    finally:
+        shutil.rmtree(root_dir)
+    return results
+
+
+def simon_version():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=__simon_dir__,
+                                           stderr=devnull).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, old_file):
+    with open(old_file) as f_old:
+        old = json.load(f_old)
+    print('\nComparison with %s (version %s):' % (old_file, old.get('version')))
+    if old.get('parameters') != results['parameters']:
+        print('Warning: the campaigns were generated with different parameters: %s vs. %s' %
+              (old.get('parameters'), results['parameters']))
+    for size in sorted(results['results'], key=int):
+        if size not in old['results']:
+            continue
+        print('%d simulations:' % int(size))
+        for operation in OPERATIONS:
+            new_t = results['results'][size].get(operation)
+            old_t = old['results'][size].get(operation)
+            if new_t is None or old_t is None:
+                continue
+            ratio = new_t / old_t if old_t > 0 else float('inf')
+            print('  %-45s %10.3f s -> %10.3f s  (x%.2f)' % (operation, old_t, new_t, ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of SiMon on large synthetic campaigns.')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='the numbers of top-level simulations')
+    parser.add_argument('--max-depth', type=int, default=50, help='the maximum depth of the restart chains')
+    parser.add_argument('--output-mb', type=float, default=4, help='the size of the output files of running sims')
+    parser.add_argument('--restart-mb', type=float, default=16, help='the size of the restart files of running sims')
+    parser.add_argument('--json', default='bench_campaign.json', help='the file to which the results are written')
+    parser.add_argument('--compare', default=None, help='the results of another version to compare with')
+    args = parser.parse_args()
+
+    results = {'version': simon_version(),
+               'date': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'parameters': {'max_depth': args.max_depth, 'output_mb': args.output_mb,
+                              'restart_mb': args.restart_mb},
+               'results': dict()}
+    for n_sims in [int(s) for s in args.sizes.split(',')]:
+        results['results'][str(n_sims)] = run_size(n_sims, args)
+    with open(args.json, 'w') as f_json:
+        json.dump(results, f_json, indent=2, sort_keys=True)
+    print('Results written to %s' % args.json)
+    if args.compare is not None:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
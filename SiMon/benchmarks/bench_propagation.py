@@ -0,0 +1,94 @@
+"""
+Benchmark of the status propagation in the simulation tree.
+
+The simulation tree is built in memory (no simulation directories are needed): n_sims top-level simulations, each
+with a chain of `depth` restarts, the deepest one running. The single post-order traversal
+(SimulationTask.sim_propagate_status) is compared with the fixed-point iteration it replaced, which made up to 30 passes
+over all the simulations, and could not propagate a status through more than 30 levels of restarts.
+
+Usage: python bench_propagation.py [max_n_sims]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from module_common import SimulationTask
+
+
+def build_tree(n_sims, depth):
+    """
+    :return: The root of the tree, and the dict mapping the IDs to the simulations.
+    """
+    root = SimulationTask(0, 'root', '/nonexistent', SimulationTask.STATUS_NEW)
+    sim_inst_dict = {0: root}
+    sim_id = 0
+    for i in range(n_sims):
+        parent = root
+        for level in range(depth + 1):
+            sim_id += 1
+            sim = SimulationTask(sim_id, 'sim_%d_%d' % (i, level), '/nonexistent', SimulationTask.STATUS_STOP)
+            sim.status = SimulationTask.STATUS_STOP
+            sim.parent_id = parent.id
+            sim.level = level + 1
+            parent.restarts.append(sim)
+            sim_inst_dict[sim_id] = sim
+            parent = sim
+        parent.status = SimulationTask.STATUS_RUN
+    return root, sim_inst_dict
+
+
+def fixed_point_propagation(sim_inst_dict):
+    """
+    The propagation used before, kept for comparison.
+    """
+    update_needed = True
+    max_iter = 0
+    while update_needed and max_iter < 30:
+        max_iter += 1
+        update_needed = False
+        for i in sim_inst_dict:
+            if i == 0:
+                continue
+            inst = sim_inst_dict[i]
+            if inst.status == SimulationTask.STATUS_RUN or inst.status == SimulationTask.STATUS_DONE:
+                if inst.parent_id > 0 and sim_inst_dict[inst.parent_id].status != inst.status:
+                    sim_inst_dict[inst.parent_id].status = inst.status
+                    update_needed = True
+
+
+def n_top_level_running(root):
+    return len([sim for sim in root.restarts if sim.status == SimulationTask.STATUS_RUN])
+
+
+def main(max_n_sims=100000):
+    print('%8s %6s %10s | %12s %8s %9s | %12s %8s %9s' % ('n_sims', 'depth', 'n_nodes', 'single pass', 'us/node',
+                                                         'top RUN', 'fixed point', 'us/node', 'top RUN'))
+    n_sims = 100
+    while n_sims <= max_n_sims:
+        for depth in [2, 50]:
+            n_nodes = n_sims * (depth + 1)
+            if n_nodes > 10 * max_n_sims:
+                continue
+            root, sim_inst_dict = build_tree(n_sims, depth)
+            t_start = time.time()
+            root.sim_propagate_status()
+            t_single = time.time() - t_start
+            n_run_single = n_top_level_running(root)
+
+            root, sim_inst_dict = build_tree(n_sims, depth)
+            t_start = time.time()
+            fixed_point_propagation(sim_inst_dict)
+            t_fixed = time.time() - t_start
+            n_run_fixed = n_top_level_running(root)
+            print('%8d %6d %10d | %10.3f s %8.2f %9d | %10.3f s %8.2f %9d' %
+                  (n_sims, depth, n_nodes, t_single, 1.e6 * t_single / n_nodes, n_run_single,
+                   t_fixed, 1.e6 * t_fixed / n_nodes, n_run_fixed))
+        n_sims *= 10
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
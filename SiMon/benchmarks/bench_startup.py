@@ -0,0 +1,81 @@
+"""
+Benchmark of the startup of SiMon, i.e. of running ``simon`` to see the overview of the simulations.
+
+A synthetic campaign of n_sims simulations (of the DemoSimulation code, never started) is generated in a temporary
+directory. The following phases are timed:
+
+- importing the simon module (in a fresh interpreter);
+- constructing SiMon, which registers the modules (without and with the module manifest);
+- printing the overview by scanning the simulation directories (without and with the simulation index), and from the
+  state store written by the daemon.
+
+Usage: python bench_startup.py [n_sims]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+__simon_dir__ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, __simon_dir__)
+
+
+def generate_campaign(root_dir, n_sims):
+    sim_root = os.path.join(root_dir, 'sims')
+    for i in range(n_sims):
+        sim_dir = os.path.join(sim_root, 'sim_%05d' % i)
+        os.makedirs(sim_dir)
+        with open(os.path.join(sim_dir, 'SiMon.conf'), 'w') as f_conf:
+            f_conf.write('[Simulation]\nCode_name = DemoSimulation\nOutput_file = output.txt\nT_end = 30\n')
+        with open(os.path.join(sim_dir, 'output.txt'), 'w') as f_out:
+            f_out.write('%d, 0.0\n' % (i % 30))
+    with open(os.path.join(root_dir, 'SiMon.conf'), 'w') as f_conf:
+        f_conf.write('[SiMon]\nRoot_dir: %s\nState_db: simon_state.db\nDaemon_sleep_time: 3600\n' % sim_root)
+
+
+def timed(label, func, *args):
+    devnull = open(os.devnull, 'w')
+    stdout = sys.stdout
+    sys.stdout = devnull  # the overview itself is not benchmarked
+    try:
+        t_start = time.time()
+        ret = func(*args)
+        elapsed = time.time() - t_start
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+    print('%-55s %10.1f ms' % (label, 1.e3 * elapsed))
+    return ret
+
+
+def main(n_sims=2000):
+    root_dir = tempfile.mkdtemp()
+    try:
+        generate_campaign(root_dir, n_sims)
+        print('Campaign of %d simulations in %s' % (n_sims, root_dir))
+        import_script = 'import sys, time; sys.path.insert(0, %r); t = time.time(); import simon; ' \
+                        'sys.stdout.write("%%.1f" %% (1.e3 * (time.time() - t)))' % __simon_dir__
+        output = subprocess.check_output([sys.executable, '-c', import_script])
+        print('%-55s %10s ms' % ('import simon (fresh interpreter)', output.decode().strip()))
+
+        from simon import SiMon
+        timed('SiMon() (module manifest missing)', lambda: SiMon(cwd=root_dir))
+        app = timed('SiMon() (module manifest cached)', lambda: SiMon(cwd=root_dir))
+        timed('overview: scan (simulation index missing)', app.interactive_mode, True)
+        timed('overview: scan (simulation index cached)', app.interactive_mode, True)
+
+        # what the daemon does at the end of a cycle
+        app.get_state_store().sync(app.sim_inst_dict)
+        app = SiMon(cwd=root_dir)
+        timed('overview: state store', app.interactive_mode, True)
+    finally:
+        shutil.rmtree(root_dir)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,473 @@
+"""
+Backups of the restartable checkpoint file of a simulation.
+
+The restart file of a running simulation is backed up on every scheduler cycle, so the backups must be cheap:
+
+- A backup is skipped if the restart file is identical to the newest backup. The size and modification time are
+  compared first; the contents are only hashed (and the hashes remembered) if the size matches but the modification
+  time differs, e.g. when the code rewrote an unchanged file.
+- A backup is only taken when the restart file looks complete, so that a file being written by the code is never
+  copied: it has the same size as at the previous probe (a checkpoint rewritten in place is truncated first), it has
+  been renamed into place after it was written, or it has not been modified for a given period of time. The copy is
+  discarded if the file changed while it was being copied. A restart file rewritten more often than the scheduler
+  cycles is thus still backed up.
+- The copy is made as a reflink (copy-on-write clone, e.g. on Btrfs and XFS) if possible, without moving the data
+  through SiMon, falling back to a regular buffered copy.
+
+The backups may be compressed (gzip, bz2, or lzma if available) and made by a pool of background threads
+(CheckpointArchiver), so that a slow copy does not hold up the monitoring of the other simulations. The compressed
+backups are decompressed transparently by CheckpointStore.restore().
+
+The metadata of the backups (size, modification time and hash of the source) is kept in a manifest file in the
+simulation directory.
+"""
+import os
+import bz2
+import gzip
+import time
+import json
+import fcntl
+import shutil
+import hashlib
+import threading
+try:
+    import queue  # Python 3 only
+except ImportError:
+    import Queue as queue  # Python 2 only
+try:
+    import lzma  # Python 3 only
+except ImportError:
+    lzma = None
+
+
+class CheckpointStore(object):
+
+    BACKUP_PREFIX = 'restart.tmp.'  # the backup files are named restart.tmp.<timestamp>
+    MANIFEST_FILE = '.checkpoints.json'
+    FICLONE = 0x40049409  # ioctl request to clone a file (Linux, _IOW(0x94, 9, int))
+    CHUNK_SIZE = 1 << 20
+
+    # restart file path -> its size at the previous probe, kept across the stores created in each scheduler cycle
+    probed_sizes = dict()
+
+    # compression method -> file name extension of the backups
+    COMPRESSIONS = {'gzip': '.gz', 'bz2': '.bz2', 'lzma': '.xz'}
+
+    def __init__(self, sim_dir, restart_file, max_backups=20, stable_time=60.0, compression=None, logger=None):
+        """
+        :param sim_dir: The simulation directory (absolute path).
+        :param restart_file: The name of the restart file in the simulation directory.
+        :param max_backups: The maximum number of backups kept (<= 0: unlimited).
+        :param stable_time: The time (in seconds) since the last modification of the restart file after which it is
+                            backed up, even if it is not known to be complete otherwise.
+        :param compression: The compression method of the new backups: None, 'gzip', 'bz2' or 'lzma'.
+        :param logger: The logger of the daemon (optional).
+        """
+        CheckpointStore.check_compression(compression)
+        self.sim_dir = sim_dir
+        self.restart_file = restart_file
+        self.max_backups = max_backups
+        self.stable_time = stable_time
+        self.compression = compression
+        self.logger = logger
+        self.bytes_copied = 0  # the size of the restart file backed up by the last backup()
+
+    @staticmethod
+    def check_compression(compression):
+        """
+        Raise a ValueError if the compression method is not supported.
+        """
+        if compression is not None and compression not in CheckpointStore.COMPRESSIONS:
+            raise ValueError('Unknown compression method %s. Valid methods: %s' %
+                             (compression, ', '.join(sorted(CheckpointStore.COMPRESSIONS.keys()))))
+        if compression == 'lzma' and lzma is None:
+            raise ValueError('The lzma compression is not available in this version of Python')
+
+    @staticmethod
+    def compression_of(backup_name):
+        """
+        :return: The compression method of a backup, according to its file name (None if not compressed).
+        """
+        for compression, ext in CheckpointStore.COMPRESSIONS.items():
+            if backup_name.endswith(ext):
+                return compression
+        return None
+
+    @staticmethod
+    def open_compressed(path, mode, compression):
+        """
+        Open a (compressed) file for reading or writing in binary mode.
+        """
+        if compression == 'gzip':
+            return gzip.open(path, mode + 'b', 6)
+        elif compression == 'bz2':
+            return bz2.BZ2File(path, mode + 'b')
+        elif compression == 'lzma':
+            return lzma.open(path, mode + 'b')
+        return open(path, mode + 'b')
+
+    def manifest_path(self):
+        return os.path.join(self.sim_dir, CheckpointStore.MANIFEST_FILE)
+
+    def load_manifest(self):
+        """
+        :return: A dict mapping the names of the backups to {'size', 'mtime', 'digest'} of the file they are copied
+                 from. Backups that no longer exist are dropped.
+        """
+        manifest = dict()
+        try:
+            with open(self.manifest_path(), 'r') as f_manifest:
+                manifest = json.load(f_manifest)
+        except (IOError, OSError, ValueError):
+            pass
+        existing = self.list_backups()
+        for name in existing:
+            if name not in manifest:
+                manifest[name] = {'size': None, 'mtime': None, 'digest': None}  # e.g. made by an older version
+        for name in list(manifest.keys()):
+            if name not in existing:
+                del manifest[name]
+        return manifest
+
+    def save_manifest(self, manifest):
+        tmp_fn = '%s.tmp.%d' % (self.manifest_path(), os.getpid())
+        try:
+            with open(tmp_fn, 'w') as f_manifest:
+                json.dump(manifest, f_manifest)
+            os.rename(tmp_fn, self.manifest_path())
+        except (IOError, OSError) as err:
+            if self.logger is not None:
+                self.logger.warning('Checkpoint manifest %s cannot be saved: %s' % (self.manifest_path(), err))
+
+    def list_backups(self):
+        """
+        :return: The names of the backup files, from the oldest to the newest.
+        """
+        try:
+            names = os.listdir(self.sim_dir)
+        except OSError:
+            return []
+        backups = []
+        for name in names:
+            if not name.startswith(CheckpointStore.BACKUP_PREFIX):
+                continue
+            ts = CheckpointStore.backup_timestamp(name)
+            if ts is not None:
+                backups.append((ts, name))
+        return [name for _, name in sorted(backups)]
+
+    @staticmethod
+    def backup_timestamp(backup_name):
+        """
+        :return: The timestamp in the name of a backup (restart.tmp.<timestamp>[.<compression extension>]), or None if
+                 the name is not a backup name.
+        """
+        suffix = backup_name[len(CheckpointStore.BACKUP_PREFIX):]
+        compression = CheckpointStore.compression_of(suffix)
+        if compression is not None:
+            suffix = suffix[:-len(CheckpointStore.COMPRESSIONS[compression])]
+        if suffix.isdigit():
+            return int(suffix)
+        return None
+
+    def newest_backup(self):
+        """
+        :return: The name of the newest backup, or None if there is no backup.
+        """
+        backups = self.list_backups()
+        if len(backups) == 0:
+            return None
+        return backups[-1]
+
+    def backup(self):
+        """
+        Back up the restart file, unless it is still being written or identical to the newest backup.
+
+        :return: A tuple of (return code, name of the backup). Return code: 0 if a backup has been made, 1 if not
+                 needed (unchanged or not stable yet), -1 if failed (e.g. no restart file).
+        """
+        src = os.path.join(self.sim_dir, self.restart_file)
+        try:
+            st = os.stat(src)
+        except OSError:
+            return -1, None
+        if not self.is_complete(src, st):
+            return 1, None  # the code may still be writing it
+
+        manifest = self.load_manifest()
+        backups = self.list_backups()
+        if len(backups) > 0:
+            newest = backups[-1]
+            record = manifest[newest]
+            newest_compression = CheckpointStore.compression_of(newest)
+            if record['size'] is None and newest_compression is None:
+                record['size'] = os.path.getsize(os.path.join(self.sim_dir, newest))  # a backup without metadata
+            if record['size'] == st.st_size and record['mtime'] == st.st_mtime:
+                return 1, newest
+            if record['size'] == st.st_size:
+                # same size but touched since: compare the contents
+                if record['digest'] is None:
+                    record['digest'] = CheckpointStore.file_digest(os.path.join(self.sim_dir, newest),
+                                                                   newest_compression)
+                digest = CheckpointStore.file_digest(src)
+                if digest == record['digest']:
+                    record['size'] = st.st_size
+                    record['mtime'] = st.st_mtime
+                    self.save_manifest(manifest)
+                    return 1, newest
+
+        ts = int(time.time())  # get the timestamp as part of the backup restart file name
+        if len(backups) > 0:
+            # never overwrite (or sort before) the newest backup
+            ts = max(ts, CheckpointStore.backup_timestamp(backups[-1]) + 1)
+        backup_name = '%s%d%s' % (CheckpointStore.BACKUP_PREFIX, ts,
+                                  CheckpointStore.COMPRESSIONS.get(self.compression, ''))
+        dst = os.path.join(self.sim_dir, backup_name)
+        tmp_dst = '%s.part' % dst
+        digest = None
+        try:
+            if self.compression is None:
+                method = CheckpointStore.copy_file(src, tmp_dst)
+            else:
+                digest = CheckpointStore.compress_file(src, tmp_dst, self.compression)
+                method = self.compression
+            st_after = os.stat(src)
+            if st_after.st_size != st.st_size or st_after.st_mtime != st.st_mtime:
+                # modified during the copy: the backup may be inconsistent
+                os.remove(tmp_dst)
+                return 1, None
+            os.rename(tmp_dst, dst)
+        except (IOError, OSError) as err:
+            if os.path.isfile(tmp_dst):
+                os.remove(tmp_dst)
+            if self.logger is not None:
+                self.logger.error('Unable to back up %s: %s' % (src, err))
+            return -1, None
+        if self.logger is not None:
+            self.logger.debug('%s copied to %s (%s)' % (src, backup_name, method))
+        manifest[backup_name] = {'size': st.st_size, 'mtime': st.st_mtime, 'digest': digest}
+        self.bytes_copied = st.st_size
+        backups.append(backup_name)
+
+        # delete the oldest backups if there is a limit of maximum number of backup files
+        if 0 < self.max_backups < len(backups):
+            for name in backups[:-self.max_backups]:
+                try:
+                    os.remove(os.path.join(self.sim_dir, name))
+                except OSError:
+                    pass
+                manifest.pop(name, None)
+        self.save_manifest(manifest)
+        return 0, backup_name
+
+    def is_complete(self, path, st):
+        """
+        Guess whether the restart file has been completely written, from its status and its size at the previous probe.
+
+        :param path: The path of the restart file.
+        :param st: The result of os.stat() of the restart file.
+        :return: True if the restart file has the same size as at the previous probe, has been renamed into place after
+                 its last modification (its status changed later than its contents), or has not been modified for
+                 stable_time seconds.
+        """
+        previous_size = CheckpointStore.probed_sizes.get(path)
+        CheckpointStore.probed_sizes[path] = st.st_size
+        if previous_size == st.st_size or st.st_ctime > st.st_mtime:
+            return True
+        return time.time() - st.st_mtime >= self.stable_time
+
+    def restore(self, backup_name=None, dst=None):
+        """
+        Restore a backup (decompressed if necessary). The destination is replaced atomically.
+
+        :param backup_name: The name of the backup. Default: the newest backup.
+        :param dst: The path of the restored file. Default: the restart file of the simulation.
+        :return: The name of the restored backup, or None if there is no backup.
+        """
+        if backup_name is None:
+            backup_name = self.newest_backup()
+            if backup_name is None:
+                return None
+        if dst is None:
+            dst = os.path.join(self.sim_dir, self.restart_file)
+        tmp_dst = '%s.part.%d' % (dst, os.getpid())
+        compression = CheckpointStore.compression_of(backup_name)
+        try:
+            if compression is None:
+                CheckpointStore.copy_file(os.path.join(self.sim_dir, backup_name), tmp_dst)
+            else:
+                with CheckpointStore.open_compressed(os.path.join(self.sim_dir, backup_name), 'r', compression) as f_in:
+                    with open(tmp_dst, 'wb') as f_out:
+                        shutil.copyfileobj(f_in, f_out, CheckpointStore.CHUNK_SIZE)
+            os.rename(tmp_dst, dst)
+        except (IOError, OSError):
+            if os.path.isfile(tmp_dst):
+                os.remove(tmp_dst)
+            raise
+        return backup_name
+
+    @staticmethod
+    def compress_file(src, dst, compression):
+        """
+        Stream a file through a compressor.
+
+        :return: The SHA-1 hex digest of the uncompressed contents.
+        """
+        sha1 = hashlib.sha1()
+        with open(src, 'rb') as f_in:
+            with CheckpointStore.open_compressed(dst, 'w', compression) as f_out:
+                while True:
+                    chunk = f_in.read(CheckpointStore.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha1.update(chunk)
+                    f_out.write(chunk)
+        return sha1.hexdigest()
+
+    @staticmethod
+    def file_digest(path, compression=None):
+        """
+        :return: The SHA-1 hex digest of the (uncompressed) contents of a file.
+        """
+        sha1 = hashlib.sha1()
+        with CheckpointStore.open_compressed(path, 'r', compression) as f_in:
+            while True:
+                chunk = f_in.read(CheckpointStore.CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+    @staticmethod
+    def copy_file(src, dst):
+        """
+        Copy a file as a reflink if the file system supports it, or with a regular buffered copy.
+
+        :return: The name of the method used: 'reflink' or 'copy'.
+        """
+        fd_src = os.open(src, os.O_RDONLY)
+        try:
+            fd_dst = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                fcntl.ioctl(fd_dst, CheckpointStore.FICLONE, fd_src)
+                return 'reflink'
+            except (IOError, OSError):
+                pass  # not supported by the file system (or different file systems)
+            finally:
+                os.close(fd_dst)
+        finally:
+            os.close(fd_src)
+        shutil.copyfile(src, dst)
+        return 'copy'
+
+
+class CheckpointArchiver(object):
+    """
+    Make the checkpoint backups in a bounded pool of background threads. Each simulation has at most one backup queued
+    or in progress at any time, and backups requested while the queue is full are skipped (the restart file will be
+    backed up in a later cycle).
+    """
+
+    def __init__(self, workers=0, compression=None, queue_size=64, logger=None):
+        """
+        :param workers: The number of background threads. With 0, the backups are made in the calling thread.
+        :param compression: The compression method of the backups: None, 'gzip', 'bz2' or 'lzma'.
+        :param queue_size: The maximum number of backups waiting for a worker.
+        :param logger: The logger of the daemon (optional).
+        """
+        CheckpointStore.check_compression(compression)
+        self.workers = workers
+        self.compression = compression
+        self.logger = logger
+        self.queue = queue.Queue(queue_size)
+        self.threads = []
+        self.pending = set()  # the simulation directories with a backup queued or in progress
+        self.lock = threading.Lock()
+        self.done = threading.Condition(self.lock)  # notified when a simulation directory is no longer pending
+        self.n_backups = 0  # the number of backups made
+        self.bytes_copied = 0  # the total size of the restart files backed up
+
+    def submit(self, store, on_done=None):
+        """
+        Request a backup.
+
+        :param store: The CheckpointStore of the simulation.
+        :param on_done: A function called with the (return code, backup name) of CheckpointStore.backup() (optional).
+        :return: With no workers, the return code of CheckpointStore.backup(). Otherwise, 0 if the backup has been
+                 queued, 1 if it is skipped (a backup of this simulation is pending, or the queue is full).
+        """
+        if self.workers <= 0:
+            result = store.backup()
+            self.record(store, result)
+            if on_done is not None:
+                on_done(result)
+            return result[0]
+        with self.lock:
+            if store.sim_dir in self.pending:
+                return 1
+            try:
+                self.queue.put_nowait((store, on_done))
+            except queue.Full:
+                if self.logger is not None:
+                    self.logger.warning('Checkpoint backup queue is full. Backup of %s postponed.' % store.sim_dir)
+                return 1
+            self.pending.add(store.sim_dir)
+            if len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.worker, name='CheckpointArchiver-%d' % len(self.threads))
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+        return 0
+
+    def worker(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                break
+            store, on_done = job
+            try:
+                result = store.backup()
+                self.record(store, result)
+                if on_done is not None:
+                    on_done(result)
+            except Exception as err:
+                if self.logger is not None:
+                    self.logger.error('Checkpoint backup of %s failed: %s' % (store.sim_dir, err))
+            finally:
+                with self.lock:
+                    self.pending.discard(store.sim_dir)
+                    self.done.notify_all()
+                self.queue.task_done()
+
+    def record(self, store, result):
+        if result[0] == 0:
+            with self.lock:
+                self.n_backups += 1
+                self.bytes_copied += store.bytes_copied
+
+    def wait(self, sim_dir=None):
+        """
+        Block until the queued backups are made.
+
+        :param sim_dir: Only wait for the backup of this simulation directory, if one is queued or in progress.
+                        Default: wait for all the backups.
+        """
+        if self.workers <= 0:
+            return
+        if sim_dir is None:
+            self.queue.join()
+            return
+        with self.lock:
+            while sim_dir in self.pending:
+                self.done.wait()
+
+    def close(self):
+        """
+        Make the queued backups and stop the workers.
+        """
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
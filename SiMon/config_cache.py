@@ -0,0 +1,81 @@
+"""
+Process-wide cache of the parsed config files (SiMon.conf).
+
+The simulation tasks are created again on every rebuild of the simulation tree, and each of them parses its config
+file. The cache keeps the parsed config of every file together with the identity of the file (inode, size and
+modification time), so that the config of an unchanged file is returned after a single stat(), without reading or
+parsing the file again.
+
+A file modified less than ``racy_time`` seconds ago is parsed but not cached: it could be modified again without any
+visible change of its size and modification time (on file systems with a coarse timestamp resolution).
+
+The parsed configs are shared. A caller modifying a config must invalidate its file.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+try:
+    import configparser as cp  # Python 3 only
+except ImportError:
+    import ConfigParser as cp  # Python 2 only
+
+
+class ConfigCache(object):
+
+    def __init__(self, max_entries=10000, racy_time=2.0):
+        """
+        :param max_entries: The maximum number of parsed configs kept, the least recently used ones being evicted
+                            first (0: no caching).
+        :param racy_time: Files modified less than this time (in seconds) ago are not cached.
+        """
+        self.max_entries = max_entries
+        self.racy_time = racy_time
+        self.entries = OrderedDict()  # path -> (identity of the file, parsed config), least recently used first
+        self.lock = threading.Lock()  # the configs may be parsed by several threads
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_evictions = 0
+
+    @staticmethod
+    def file_identity(st):
+        return st.st_ino, st.st_size, getattr(st, 'st_mtime_ns', st.st_mtime)
+
+    def parse(self, path):
+        """
+        :return: The parsed config file (a ConfigParser), or None if the file does not exist.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.invalidate(path)
+            return None
+        identity = ConfigCache.file_identity(st)
+        with self.lock:
+            entry = self.entries.pop(path, None)
+            if entry is not None and entry[0] == identity:
+                self.entries[path] = entry  # most recently used
+                self.n_hits += 1
+                return entry[1]
+            self.n_misses += 1
+        conf = cp.ConfigParser()
+        conf.read(path)
+        if self.max_entries > 0 and time.time() - st.st_mtime >= self.racy_time:
+            with self.lock:
+                self.entries[path] = (identity, conf)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.n_evictions += 1
+        return conf
+
+    def invalidate(self, path):
+        with self.lock:
+            self.entries.pop(path, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __repr__(self):
+        return '%d entries, %d hits, %d misses, %d evictions' % (len(self.entries), self.n_hits, self.n_misses,
+                                                               self.n_evictions)
@@ -0,0 +1,303 @@
+"""
+Local control API of the daemon.
+
+The daemon listens on a Unix-domain socket (by default SiMon_control.sock, next to SiMon.conf). A client connects,
+sends one request as a line of JSON, e.g. ``{"command": "list", "status": ["RUN"]}``, and receives one line of JSON,
+e.g. ``{"ok": true, "tasks": [...], "matched": 12}``. Errors are returned as ``{"ok": false, "error": "..."}``.
+
+The requests are answered by the main loop of the daemon between two scheduler cycles (the socket is one of the file
+descriptors the loop waits on), so that they are served from the simulation tree in memory without a scan, and the
+commands never race with the scheduler. The socket is only accessible to the user running the daemon.
+
+Commands (the optional arguments are given in brackets):
+
+- ping: the process ID of the daemon and the number of simulations
+- list [status, name, level, offset, limit]: the simulations matching the overview filters (see overview.py)
+- overview [status, name, level, offset, limit]: the text of the overview, as printed by ``simon``
+- status ids: the simulations with the given IDs
+- start/restart/stop/kill ids: the return codes of sim_start() etc. for the simulations with the given IDs
+- rescan: request a full scan of the simulation root directory at the next iteration of the main loop
+"""
+import os
+import json
+import errno
+import socket
+from cStringIO import StringIO
+from module_common import SimulationTask
+from overview import OverviewFilter, write_overview
+
+
+class ControlServer(object):
+
+    MAX_REQUEST_SIZE = 1 << 20  # bytes
+    COMMANDS = ['ping', 'list', 'overview', 'status', 'start', 'restart', 'stop', 'kill', 'rescan']
+    ACTIONS = {'start': 'sim_start', 'restart': 'sim_restart', 'stop': 'sim_stop', 'kill': 'sim_kill'}
+
+    def __init__(self, app, socket_path, timeout=5.0, logger=None):
+        """
+        :param app: The SiMon instance of the daemon.
+        :param socket_path: The path of the Unix-domain socket.
+        :param timeout: The maximum time (in seconds) to receive a request from, or send a reply to, a client.
+        :param logger: The logger of the daemon (optional).
+        """
+        self.app = app
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.logger = logger
+        self.sock = None
+        self.rescan_requested = False
+
+    def open(self):
+        """
+        Bind the socket and start listening. A socket left behind by a daemon that has not been stopped cleanly is
+        replaced, unless another daemon still answers on it.
+
+        :return: The file descriptor of the listening socket, to be waited on with select().
+        """
+        if os.path.exists(self.socket_path):
+            if ControlClient(self.socket_path, timeout=1.0).is_available():
+                raise IOError(errno.EADDRINUSE, 'another daemon is listening on %s' % self.socket_path)
+            os.remove(self.socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o077)  # only accessible to the user running the daemon
+        try:
+            sock.bind(self.socket_path)
+        except socket.error:
+            sock.close()
+            raise
+        finally:
+            os.umask(old_umask)
+        sock.listen(16)
+        sock.setblocking(False)
+        self.sock = sock
+        return sock.fileno()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+    def handle_pending(self):
+        """
+        Answer the requests of all pending connections. To be called when the listening socket is readable.
+
+        :return: The number of requests answered.
+        """
+        n_handled = 0
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except socket.error as err:
+                if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    return n_handled
+                raise
+            try:
+                conn.settimeout(self.timeout)
+                self.handle_connection(conn)
+                n_handled += 1
+            except (socket.error, IOError) as err:
+                if self.logger is not None:
+                    self.logger.warning('Control API: connection dropped: %s' % err)
+            finally:
+                conn.close()
+
+    def handle_connection(self, conn):
+        data = ''
+        while '\n' not in data:
+            chunk = conn.recv(65536)
+            if chunk == '':
+                break
+            data += chunk
+            if len(data) > ControlServer.MAX_REQUEST_SIZE:
+                conn.sendall(json.dumps({'ok': False, 'error': 'request too large'}) + '\n')
+                return
+        try:
+            request = json.loads(data.split('\n', 1)[0])
+            if not isinstance(request, dict):
+                raise ValueError('a request must be a JSON object')
+        except ValueError as err:
+            reply = {'ok': False, 'error': 'invalid request: %s' % err}
+        else:
+            reply = self.handle_request(request)
+        conn.sendall(json.dumps(reply) + '\n')
+
+    def handle_request(self, request):
+        """
+        :param request: The decoded request, i.e. a dict with the key 'command' and the arguments of the command.
+        :return: The reply, as a dict with the key 'ok'.
+        """
+        command = request.get('command')
+        if command not in ControlServer.COMMANDS:
+            return {'ok': False,
+                    'error': 'unknown command %s (valid: %s)' % (command, ', '.join(ControlServer.COMMANDS))}
+        try:
+            if command in ControlServer.ACTIONS:
+                return self.cmd_action(command, request)
+            return getattr(self, 'cmd_' + command)(request)
+        except (ValueError, TypeError, KeyError) as err:  # invalid arguments
+            return {'ok': False, 'error': '%s: %s' % (command, err)}
+        except Exception as err:  # the daemon keeps running
+            if self.logger is not None:
+                self.logger.exception('Control API: %s failed' % command)
+            return {'ok': False, 'error': '%s failed: %s' % (command, err)}
+
+    @staticmethod
+    def task_info(sim):
+        """
+        :return: The state of a simulation as a JSON-serializable dict.
+        """
+        return {'id': sim.id, 'name': sim.name, 'path': sim.full_dir, 'level': sim.level, 'parent_id': sim.parent_id,
+                'status': SimulationTask.STATUS_LABEL[sim.status], 't': sim.t, 't_min': sim.t_min, 't_max': sim.t_max,
+                'mtime': sim.mtime, 'ctime': sim.ctime, 'eta': sim.eta, 'cid': sim.cid,
+                'restarts': [child.id for child in sim.restarts]}
+
+    @staticmethod
+    def parse_filter(request):
+        """
+        :return: The OverviewFilter given by the arguments of a list or overview request.
+        """
+        statuses = request.get('status')
+        if isinstance(statuses, basestring):
+            statuses = statuses.split(',')
+        return OverviewFilter(statuses=statuses, name=request.get('name'), max_level=request.get('level'),
+                              offset=int(request.get('offset') or 0), limit=request.get('limit'))
+
+    def parse_ids(self, request):
+        """
+        :return: A tuple of (the requested simulations, the requested IDs that do not exist).
+        """
+        ids = request['ids']
+        if isinstance(ids, (int, long)):
+            ids = [ids]
+        sims = []
+        unknown = []
+        for sim_id in ids:
+            sim = self.app.sim_inst_dict.get(int(sim_id))
+            if sim is None or sim.id == 0:
+                unknown.append(sim_id)
+            else:
+                sims.append(sim)
+        return sims, unknown
+
+    def cmd_ping(self, request):
+        return {'ok': True, 'pid': os.getpid(), 'n_simulations': max(len(self.app.sim_inst_dict) - 1, 0)}
+
+    def cmd_list(self, request):
+        overview_filter = self.parse_filter(request)
+        tasks = []
+        n_matched = 0
+        for row in self.app.sim_tree.sim_overview_rows():
+            level, status, sim_id, name = row[0], row[1], row[2], row[3]
+            if level == 0 or not overview_filter.match(level, status, name):
+                continue
+            n_matched += 1
+            if n_matched <= overview_filter.offset:
+                continue
+            if overview_filter.limit is None or len(tasks) < overview_filter.limit:
+                tasks.append(ControlServer.task_info(self.app.sim_inst_dict[sim_id]))
+        return {'ok': True, 'tasks': tasks, 'matched': n_matched}
+
+    def cmd_overview(self, request):
+        out = StringIO()
+        n_shown, n_matched = write_overview(self.app.sim_tree.sim_overview_rows(), out=out,
+                                            overview_filter=self.parse_filter(request))
+        return {'ok': True, 'text': out.getvalue(), 'shown': n_shown, 'matched': n_matched}
+
+    def cmd_status(self, request):
+        sims, unknown = self.parse_ids(request)
+        return {'ok': True, 'tasks': [ControlServer.task_info(sim) for sim in sims], 'unknown': unknown}
+
+    def cmd_action(self, command, request):
+        """
+        Start, restart, stop or kill simulations, as in the interactive mode, and probe them again so that the next
+        requests see their new status.
+        """
+        sims, unknown = self.parse_ids(request)
+        results = dict()
+        for sim in sims:
+            results[str(sim.id)] = getattr(sim, ControlServer.ACTIONS[command])()
+            if self.logger is not None:
+                self.logger.info('Control API: %s %s [%d]: %s' % (command, sim.name, sim.id, results[str(sim.id)]))
+        if len(sims) > 0:
+            # a restart creates a new directory, which is only added to the tree by a full scan
+            if command == 'restart':
+                self.rescan_requested = True
+            else:
+                self.app.refresh_simulations([sim.full_dir for sim in sims])
+        return {'ok': True, 'results': results, 'unknown': unknown}
+
+    def cmd_rescan(self, request):
+        self.rescan_requested = True
+        return {'ok': True}
+
+
+class ControlClient(object):
+
+    def __init__(self, socket_path, timeout=30.0):
+        """
+        :param socket_path: The path of the Unix-domain socket of the daemon.
+        :param timeout: The maximum time (in seconds) to wait for the reply. The daemon answers between two scheduler
+                        cycles, so the reply may be delayed by a cycle in progress.
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def request(self, command, **args):
+        """
+        Send a request to the daemon.
+
+        :param command: The command, e.g. 'list'.
+        :param args: The arguments of the command, e.g. status=['RUN'].
+        :return: The reply of the daemon, as a dict.
+        :raise IOError: If the daemon does not answer (socket.error is a subclass of IOError).
+        """
+        request = dict(args)
+        request['command'] = command
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps(request) + '\n')
+            data = ''
+            while '\n' not in data:
+                chunk = sock.recv(65536)
+                if chunk == '':
+                    break
+                data += chunk
+        finally:
+            sock.close()
+        try:
+            return json.loads(data)
+        except ValueError:
+            raise IOError('invalid reply from the daemon: %r' % data[:200])
+
+    def is_available(self):
+        """
+        :return: True if a daemon answers on the socket.
+        """
+        if not os.path.exists(self.socket_path):
+            return False
+        try:
+            return self.request('ping').get('ok', False)
+        except (IOError, socket.error):
+            return False
+
+    @staticmethod
+    def filter_args(overview_filter):
+        """
+        :return: The arguments of a list or overview request for an OverviewFilter.
+        """
+        if overview_filter is None:
+            return dict()
+        statuses = None
+        if overview_filter.statuses is not None:
+            statuses = sorted(overview_filter.statuses)
+        return {'status': statuses, 'name': overview_filter.name, 'level': overview_filter.max_level,
+                'offset': overview_filter.offset, 'limit': overview_filter.limit}
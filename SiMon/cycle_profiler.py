@@ -0,0 +1,155 @@
+"""
+Profiling of the scheduler cycles of SiMon.
+
+A number of auto_scheduler() cycles are run under cProfile, while the wall-clock time of every cycle and of its
+phases (see metrics.py) and the latency of every status probe are recorded. The results are written to the root
+directory of the simulations:
+
+- simon_profile_<timestamp>.pstats: the raw cProfile statistics, e.g. for ``python -m pstats`` or snakeviz;
+- simon_profile_<timestamp>.txt: a report with the cycle and phase timings, the time spent in the usual hot spots
+  (status probes, config parsing, reading the output files, process checks, checkpoint backups), a histogram of the
+  probe latencies, and the cProfile statistics sorted by cumulative and by internal time.
+
+cProfile only hooks the thread that enables it, so the cycles must do their work in the calling thread: SiMon.profile()
+disables the probe worker threads (Probe_workers) and the background checkpoint backups (Checkpoint_workers) while the
+cycles are profiled. Otherwise, the probes would only show up as time spent waiting for the thread pool.
+"""
+import os
+import time
+import pstats
+import cProfile
+import datetime
+from module_common import SimulationTask
+
+
+class CycleProfiler(object):
+
+    # (file name, function name, description) of the functions whose cumulative time is reported separately
+    HOT_SPOTS = [('module_common.py', 'sim_get_status', 'status probes'),
+                 ('module_common.py', 'parse_config_file', 'config parsing'),
+                 ('utilities.py', 'last_value', 'reading the output files'),
+                 ('supervisor.py', 'is_running', 'process checks'),
+                 ('executor.py', 'query', 'batch job status queries'),
+                 ('checkpoint.py', 'backup', 'checkpoint backups'),
+                 ('sim_index.py', 'refresh', 'directory walk'),
+                 ('state_store.py', 'sync', 'state store')]
+
+    # the upper bounds of the bins of the probe latency histogram (in seconds)
+    LATENCY_BINS = [1e-4, 3e-4, 1e-3, 3e-3, 1e-2, 3e-2, 0.1, 0.3, 1.0, 3.0]
+
+    N_TOP = 40  # the number of functions printed in the cProfile statistics
+
+    def __init__(self, out_dir, logger=None):
+        """
+        :param out_dir: The directory in which the results are written.
+        :param logger: The logger of the daemon (optional).
+        """
+        self.out_dir = out_dir
+        self.logger = logger
+        self.profile = cProfile.Profile()
+        self.cycle_times = []  # wall-clock time of every cycle
+        self.phase_times = []  # phase name -> time, for every cycle
+        self.probe_latencies = []
+
+    def run(self, app, n_cycles, interval=0.0):
+        """
+        Run and profile scheduler cycles.
+
+        :param app: The SiMon instance.
+        :param n_cycles: The number of cycles.
+        :param interval: The time to sleep between two cycles (not profiled).
+        :return: The path of the report.
+        """
+        SimulationTask.probe_latencies = self.probe_latencies
+        try:
+            for i in range(n_cycles):
+                if i > 0 and interval > 0:
+                    time.sleep(interval)
+                t_start = time.time()
+                self.profile.enable()
+                try:
+                    app.auto_scheduler()
+                finally:
+                    self.profile.disable()
+                self.cycle_times.append(time.time() - t_start)
+                self.phase_times.append(dict(app.metrics.phase_times))
+        finally:
+            SimulationTask.probe_latencies = None
+        return self.write_report(len(app.sim_inst_dict) - 1)
+
+    def hot_spots(self, stats):
+        """
+        :return: A list of (description, function name, number of calls, cumulative time) of the hot spots.
+        """
+        ret = []
+        for file_name, func_name, description in CycleProfiler.HOT_SPOTS:
+            n_calls = 0
+            cum_time = 0.0
+            for (path, _, name), (_, nc, _, ct, _) in stats.stats.items():
+                if name == func_name and os.path.basename(path) == file_name:
+                    n_calls += nc
+                    cum_time += ct
+            ret.append((description, func_name, n_calls, cum_time))
+        return ret
+
+    @staticmethod
+    def percentile(sorted_values, q):
+        if len(sorted_values) == 0:
+            return 0.0
+        return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+    @staticmethod
+    def latency_histogram(latencies, width=50):
+        """
+        :return: The lines of a text histogram of the latencies.
+        """
+        counts = [0] * (len(CycleProfiler.LATENCY_BINS) + 1)
+        for latency in latencies:
+            i = 0
+            while i < len(CycleProfiler.LATENCY_BINS) and latency > CycleProfiler.LATENCY_BINS[i]:
+                i += 1
+            counts[i] += 1
+        n_max = max(max(counts), 1)
+        lines = []
+        for i, count in enumerate(counts):
+            if i < len(CycleProfiler.LATENCY_BINS):
+                label = '<= %g ms' % (CycleProfiler.LATENCY_BINS[i] * 1000)
+            else:
+                label = '> %g ms' % (CycleProfiler.LATENCY_BINS[-1] * 1000)
+            lines.append('%14s %8d %s' % (label, count, '#' * int(round(float(count) * width / n_max))))
+        return lines
+
+    def write_report(self, n_sims):
+        prefix = os.path.join(self.out_dir, 'simon_profile_%s' % datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
+        self.profile.dump_stats(prefix + '.pstats')
+        report_file = prefix + '.txt'
+        with open(report_file, 'w') as f_report:
+            f_report.write('SiMon profile: %d scheduler cycles on %d simulations (%s)\n\n' %
+                           (len(self.cycle_times), n_sims, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            phases = ['walk', 'probe', 'schedule', 'backup']
+            f_report.write('%6s %12s' % ('cycle', 'total [s]') + ''.join(['%12s' % p for p in phases]) + '\n')
+            for i, cycle_time in enumerate(self.cycle_times):
+                f_report.write('%6d %12.4f' % (i + 1, cycle_time) +
+                               ''.join(['%12.4f' % self.phase_times[i].get(p, 0.0) for p in phases]) + '\n')
+
+            stats = pstats.Stats(self.profile, stream=f_report)
+            f_report.write('\nHot spots (cumulative time over all cycles, including the profiling overhead):\n')
+            for description, func_name, n_calls, cum_time in self.hot_spots(stats):
+                f_report.write('%28s %10.4f s %10d calls  (%s)\n' % (description, cum_time, n_calls, func_name))
+
+            latencies = sorted(self.probe_latencies)
+            f_report.write('\nStatus probe latency (%d probes): median %.3f ms, 90%% %.3f ms, 99%% %.3f ms, '
+                           'max %.3f ms\n' % (len(latencies), CycleProfiler.percentile(latencies, 0.5) * 1000,
+                                              CycleProfiler.percentile(latencies, 0.9) * 1000,
+                                              CycleProfiler.percentile(latencies, 0.99) * 1000,
+                                              CycleProfiler.percentile(latencies, 1.0) * 1000))
+            for line in CycleProfiler.latency_histogram(latencies):
+                f_report.write(line + '\n')
+
+            f_report.write('\ncProfile statistics sorted by cumulative time:\n')
+            stats.sort_stats('cumulative').print_stats(CycleProfiler.N_TOP)
+            f_report.write('\ncProfile statistics sorted by internal time:\n')
+            stats.sort_stats('time').print_stats(CycleProfiler.N_TOP)
+        if self.logger is not None:
+            self.logger.info('Profile of %d scheduler cycles written to %s' % (len(self.cycle_times), report_file))
+        return report_file
@@ -0,0 +1,226 @@
+"""
+Execution backends of the simulations.
+
+A backend (executor) launches the start and restart commands of the simulations, tells whether a launched simulation
+is still running, and cancels it. The ID of the job is recorded in a file in the simulation directory, so that the
+simulations launched by an earlier instance of SiMon are still recognized.
+
+- LocalExecutor: the simulations run as processes on the host of SiMon (the default). The job ID is the process ID.
+- BatchExecutor: the simulations are submitted as jobs to a batch system (e.g. Slurm), through configurable submit,
+  status and cancel commands. The status of all jobs is queried with a single command per scheduler cycle.
+"""
+import os
+import re
+import time
+import signal
+import threading
+import subprocess
+try:
+    from shlex import quote  # Python 3 only
+except ImportError:
+    from pipes import quote  # Python 2 only
+from supervisor import ProcessSupervisor
+
+
+class LocalExecutor(object):
+
+    JOB_FILE = ProcessSupervisor.PID_FILE
+    JOB_LABEL = 'PID'
+
+    def __init__(self, supervisor):
+        """
+        :param supervisor: The ProcessSupervisor launching the processes.
+        """
+        self.supervisor = supervisor
+
+    def begin_cycle(self):
+        pass  # the processes are checked individually
+
+    def submit(self, command, cwd, name=None):
+        """
+        Launch a command in the background in the given directory, and record the job ID in the directory.
+
+        :param name: The name of the simulation (not used by this backend).
+        :return: The job ID.
+        """
+        return self.supervisor.launch(command, cwd)
+
+    def read_job_id(self, sim_dir):
+        """
+        :return: The job ID recorded in the simulation directory, or None if not available.
+        """
+        return ProcessSupervisor.read_pid_file(sim_dir)
+
+    def is_running(self, job_id):
+        return self.supervisor.is_running(job_id)
+
+    def is_started(self, job_id):
+        """
+        :return: False if the job is waiting in a queue, i.e. it cannot make progress yet.
+        """
+        return True
+
+    def cancel(self, job_id):
+        """
+        Terminate a job. Raises OSError if it fails.
+        """
+        self.supervisor.kill(job_id, signal.SIGKILL)
+
+
+class BatchExecutor(object):
+
+    JOB_FILE = '.batch.job'
+    JOB_LABEL = 'job'
+
+    # Slurm, by default. In the submit command, {command}, {cwd} and {name} are replaced with the start/restart command,
+    # the simulation directory and the simulation name (shell-quoted); in the cancel command, {job_id} is replaced with
+    # the job ID. The status command lists the jobs of the user, one per line: the job ID, followed by its state.
+    SUBMIT_COMMAND = 'sbatch --parsable --job-name={name} --chdir={cwd} --wrap={command}'
+    STATUS_COMMAND = 'squeue --noheader --Format=JobID,State --user=$USER'
+    CANCEL_COMMAND = 'scancel {job_id}'
+
+    # the states of the jobs that are waiting in the queue, and of the jobs that are not running anymore
+    QUEUED_STATES = ['PENDING', 'PD', 'CONFIGURING', 'CF', 'REQUEUED', 'RQ', 'RESV_DEL_HOLD', 'RD', 'SUSPENDED', 'S',
+                     'Q', 'H', 'W']
+    FINISHED_STATES = ['BOOT_FAIL', 'BF', 'CANCELLED', 'CA', 'COMPLETED', 'CD', 'DEADLINE', 'DL', 'FAILED', 'F',
+                       'NODE_FAIL', 'NF', 'OUT_OF_MEMORY', 'OOM', 'PREEMPTED', 'PR', 'TIMEOUT', 'TO', 'C', 'E']
+
+    def __init__(self, submit_command=None, status_command=None, cancel_command=None, job_id_pattern=r'(\d+)',
+                 submit_grace_time=120.0, logger=None):
+        """
+        :param submit_command: The template of the command submitting a job (default: sbatch).
+        :param status_command: The command listing the jobs and their states (default: squeue).
+        :param cancel_command: The template of the command cancelling a job (default: scancel).
+        :param job_id_pattern: The regular expression finding the job ID in the output of the submit command (the first
+                               group if any, otherwise the whole match).
+        :param submit_grace_time: A job submitted less than this time (in seconds) ago is assumed to be running even
+                                  if it is not listed by the status command yet.
+        :param logger: The logger of the daemon (optional).
+        """
+        self.submit_command = submit_command or BatchExecutor.SUBMIT_COMMAND
+        self.status_command = status_command or BatchExecutor.STATUS_COMMAND
+        self.cancel_command = cancel_command or BatchExecutor.CANCEL_COMMAND
+        self.job_id_pattern = re.compile(job_id_pattern)
+        self.logger = logger
+        self.states = None  # job ID -> state, as listed by the status command in the current cycle (None: not queried)
+        self.submit_grace_time = submit_grace_time
+        self.submitted = dict()  # job ID -> time of submission, for the jobs not listed by the status command yet
+        self.query_failed = False
+        self.n_queries = 0
+        self.lock = threading.Lock()  # the simulations may be probed by several threads
+
+    @staticmethod
+    def run(command, cwd=None):
+        """
+        Run a command of the batch system.
+
+        :return: The standard output of the command. Raises OSError if the command fails.
+        """
+        proc = subprocess.Popen(command, shell=True, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                close_fds=True)
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            raise OSError('%s failed with code %d: %s' % (command, proc.returncode, err.strip()))
+        return out  # the raw bytes: the output may not be ASCII, e.g. localised messages or job names
+
+    def begin_cycle(self):
+        """
+        Discard the job states of the previous cycle. The status command is run again at the next status check.
+        """
+        with self.lock:
+            self.states = None
+
+    def submit(self, command, cwd, name=None):
+        """
+        Submit a job running a command in the given directory, and record the job ID in the directory.
+
+        :return: The job ID. Raises OSError if the job cannot be submitted.
+        """
+        if name is None:
+            name = os.path.basename(cwd)
+        submit_command = self.submit_command.format(command=quote(command), cwd=quote(cwd), name=quote(name))
+        out = BatchExecutor.run(submit_command, cwd=cwd)
+        match = self.job_id_pattern.search(out)
+        if match is None:
+            raise OSError('no job ID in the output of %s: %s' % (submit_command, out.strip()))
+        job_id = match.group(1) if match.re.groups > 0 else match.group(0)
+        BatchExecutor.write_job_file(cwd, job_id)
+        with self.lock:
+            self.submitted[job_id] = time.time()
+        if self.logger is not None:
+            self.logger.debug('Submitted job %s in %s' % (job_id, cwd))
+        return job_id
+
+    @staticmethod
+    def write_job_file(sim_dir, job_id):
+        job_fn = os.path.join(sim_dir, BatchExecutor.JOB_FILE)
+        tmp_fn = '%s.tmp.%d' % (job_fn, os.getpid())
+        with open(tmp_fn, 'w') as f_job:
+            f_job.write('%s\n' % job_id)
+        os.rename(tmp_fn, job_fn)
+
+    def read_job_id(self, sim_dir):
+        try:
+            with open(os.path.join(sim_dir, BatchExecutor.JOB_FILE), 'r') as f_job:
+                job_id = f_job.readline().strip()
+        except IOError:
+            return None
+        if job_id == '':
+            return None
+        return job_id
+
+    def query(self):
+        """
+        List the jobs and their states with the status command (called with the lock held).
+        """
+        self.n_queries += 1
+        self.states = dict()
+        try:
+            out = BatchExecutor.run(self.status_command)
+        except OSError as err:
+            # the states are unknown: the jobs are assumed to be still running, rather than being started twice
+            self.query_failed = True
+            if self.logger is not None:
+                self.logger.warning('Job states cannot be queried: %s' % err)
+            return
+        self.query_failed = False
+        for line in out.splitlines():
+            fields = line.split()
+            if len(fields) > 0:
+                self.states[fields[0]] = fields[1].upper() if len(fields) > 1 else 'RUNNING'
+        now = time.time()
+        for job_id in list(self.submitted.keys()):
+            if job_id in self.states or now - self.submitted[job_id] > self.submit_grace_time:
+                del self.submitted[job_id]
+
+    def get_state(self, job_id):
+        """
+        :return: The state of a job in the current cycle, None if the job is not listed by the status command, or
+                 'UNKNOWN' if the state cannot be known (the job has just been submitted, or the query failed).
+        """
+        job_id = str(job_id)
+        with self.lock:
+            if self.states is None:
+                self.query()
+            if job_id in self.states:
+                return self.states[job_id]
+            if self.query_failed or job_id in self.submitted:
+                return 'UNKNOWN'
+            return None
+
+    def is_running(self, job_id):
+        if job_id is None:
+            return False
+        state = self.get_state(job_id)
+        return state is not None and state not in BatchExecutor.FINISHED_STATES
+
+    def is_started(self, job_id):
+        state = self.get_state(job_id)
+        return state != 'UNKNOWN' and state not in BatchExecutor.QUEUED_STATES
+
+    def cancel(self, job_id):
+        BatchExecutor.run(self.cancel_command.format(job_id=quote(str(job_id))))
+        with self.lock:
+            if self.states is not None:
+                self.states.pop(str(job_id), None)
+            self.submitted.pop(str(job_id), None)
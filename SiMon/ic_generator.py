@@ -1,8 +1,15 @@
 """
 Initial condition (IC) generator.
+
+A simulation is generated with generate_simulation_ic(). A whole campaign, i.e. a sweep of the parameter space, is
+generated with generate_sweep(): the parameter values are sampled on a Cartesian grid, by Latin hypercube sampling or
+at random (with NumPy), all directory names and config files are formatted in bulk, the files are created by a pool
+of threads, and a single manifest listing the simulations and their parameters is written for the campaign.
 """
 import os
 import sys
+import json
+import datetime
 try:
     import configparser as cp  # Python 3 only
 except ImportError:
@@ -60,6 +67,12 @@ Stop_command: %s
 
 # The maximum number of times a simulation will be restarted (a simulation is marked as ERROR when exceeding this limit)
 Max_restarts: %d
+
+# The number of CPU cores used by the simulation
+Cores: %d
+
+# The memory (in GB) used by the simulation (0: not specified)
+Memory: %g
     '''
 
     def __init__(self, conf_file):
@@ -103,7 +116,7 @@ Max_restarts: %d
 
     def generate_simulation_ic(self, code_name, t_end, output_dir, start_cmd, input_file=None, output_file=None,
                                error_file=None, restart_file=None, t_stall=None, t_start=0, restart_cmd=None,
-                               stop_cmd=None, niceness=0, max_restarts=None):
+                               stop_cmd=None, niceness=0, max_restarts=None, cores=1, memory=0):
         """
         Generate the initial condition of a simulation and write it to the given directory.
         :param code_name: The name of the numerical code, e.g. DemoSimulation
@@ -122,32 +135,198 @@ Max_restarts: %d
         :param niceness: The priority of the simulation, -20 to 19, lower are higher (optional, default: 0)
         :param max_restarts: The maximum number of attempts a simulation will be restarted, beyond which the simulation
                              is considered ERROR
+        :param cores: The number of CPU cores used by the simulation (optional, default: 1)
+        :param memory: The memory (in GB) used by the simulation (optional, default: 0, i.e. not specified)
         :return: return 0 if succeed, -1 if failed.
         """
-        if max_restarts is None:
-            max_restarts = self.max_restarts
-        if t_stall is None:
-            t_stall = self.stall_time
         if not os.path.isdir(os.path.join(self.sim_data_dir, output_dir)):
             print('Creating directory: %s' % os.path.join(self.sim_data_dir, output_dir))
             os.makedirs(os.path.join(self.sim_data_dir, output_dir))
         conf_file = open(os.path.join(self.sim_data_dir, output_dir, self.config_file_per_sim), 'w')
-        conf_file.write(InitialConditionGenerator.config_file_template % (code_name,
-                                                                          input_file,
-                                                                          output_file,
-                                                                          error_file,
-                                                                          restart_file,
-                                                                          0,  # timestamp started
-                                                                          0,  # timestamp last modified
-                                                                          t_stall,
-                                                                          t_start,
-                                                                          t_end,
-                                                                          0,  # UNIX process ID (PID)
-                                                                          niceness,
-                                                                          start_cmd,
-                                                                          restart_cmd,
-                                                                          stop_cmd,
-                                                                          max_restarts))  # max_restarts
+        conf_file.write(self.format_simulation_config(code_name, t_end, start_cmd, input_file, output_file, error_file,
+                                                      restart_file, t_stall, t_start, restart_cmd, stop_cmd, niceness,
+                                                      max_restarts, cores, memory))
         conf_file.close()
 
+    def format_simulation_config(self, code_name, t_end, start_cmd, input_file=None, output_file=None,
+                                 error_file=None, restart_file=None, t_stall=None, t_start=0, restart_cmd=None,
+                                 stop_cmd=None, niceness=0, max_restarts=None, cores=1, memory=0):
+        """
+        :return: The contents of the config file of a simulation. See generate_simulation_ic() for the parameters.
+        """
+        if max_restarts is None:
+            max_restarts = self.max_restarts
+        if t_stall is None:
+            t_stall = self.stall_time
+        return InitialConditionGenerator.config_file_template % (code_name,
+                                                                 input_file,
+                                                                 output_file,
+                                                                 error_file,
+                                                                 restart_file,
+                                                                 0,  # timestamp started
+                                                                 0,  # timestamp last modified
+                                                                 t_stall,
+                                                                 t_start,
+                                                                 t_end,
+                                                                 0,  # UNIX process ID (PID)
+                                                                 niceness,
+                                                                 start_cmd,
+                                                                 restart_cmd,
+                                                                 stop_cmd,
+                                                                 max_restarts,  # max_restarts
+                                                                 cores,
+                                                                 memory)
+
+    @staticmethod
+    def sample_parameters(parameters, sampling='cartesian', n_samples=None, seed=None):
+        """
+        Sample the parameter space of a sweep.
+
+        :param parameters: A list of (name, values) pairs, or an OrderedDict. With the Cartesian sampling, the values
+                           of every parameter are given as a NumPy array, a range or a list. With the Latin hypercube
+                           and random sampling, they are given as the bounds (low, high) of the parameter.
+        :param sampling: 'cartesian' (every combination of the values), 'lhs' (Latin hypercube: every parameter range
+                         is divided into n_samples bins, each of them sampled once) or 'random' (uniform).
+        :param n_samples: The number of samples (not used with the Cartesian sampling).
+        :param seed: The seed of the random number generator (optional).
+        :return: An OrderedDict mapping the names of the parameters to NumPy arrays of their values, one per sample.
+        """
+        import numpy as np
+        from collections import OrderedDict
+        if isinstance(parameters, dict):
+            parameters = list(parameters.items())
+        names = [name for name, _ in parameters]
+        columns = OrderedDict()
+        if sampling == 'cartesian':
+            grids = np.meshgrid(*[np.asarray(list(values)) for _, values in parameters], indexing='ij')
+            for name, grid in zip(names, grids):
+                columns[name] = grid.reshape(-1)
+            return columns
+        if n_samples is None or n_samples <= 0:
+            raise ValueError('The number of samples is required with the %s sampling' % sampling)
+        rng = np.random.RandomState(seed)
+        for name, (low, high) in parameters:
+            if sampling == 'lhs':
+                u = (rng.permutation(n_samples) + rng.random_sample(n_samples)) / n_samples
+            elif sampling == 'random':
+                u = rng.random_sample(n_samples)
+            else:
+                raise ValueError('Unknown sampling %s (valid: cartesian, lhs, random)' % sampling)
+            columns[name] = low + u * (high - low)
+        return columns
+
+    @staticmethod
+    def format_template(template, point):
+        """
+        :param template: A string formatted with the values of the point (e.g. 'sim_a=%(a)g'), or a function of the
+                         point returning the string.
+        :param point: A dict mapping the names to the values of the parameters (and the constants) of a simulation.
+        """
+        if callable(template):
+            return template(point)
+        return template % point
+
+    def generate_sweep(self, code_name, t_end, parameters, output_dir_template, start_cmd_template,
+                       restart_cmd_template=None, sampling='cartesian', n_samples=None, seed=None, constants=None,
+                       workers=8, manifest_file='sweep_manifest.json', **kwargs):
+        """
+        Sample the parameter space and generate the initial conditions of all the simulations of the sweep.
+
+        :param parameters: The parameters of the sweep. See sample_parameters().
+        :param output_dir_template: The template of the directory names, e.g. 'sim_a=%(a)g_e=%(e)g'. The templates
+                                    are formatted with the values of the parameters and the constants of a simulation,
+                                    and its index in the sweep (``index``). See format_template().
+        :param start_cmd_template: The template of the command to start a simulation.
+        :param restart_cmd_template: The template of the command to restart a simulation (optional).
+        :param sampling: 'cartesian', 'lhs' or 'random'. See sample_parameters().
+        :param n_samples: The number of simulations (with the Latin hypercube and random sampling).
+        :param seed: The seed of the random number generator (optional).
+        :param constants: A dict of values used in the templates, the same for all the simulations (optional).
+        :param workers: The number of threads creating the files.
+        :param manifest_file: The name of the manifest of the campaign (in the simulation data dir). None: no manifest.
+        :param kwargs: The other parameters of generate_simulation_ic(), the same for all the simulations.
+        :return: The list of the directories of the simulations (relative to the simulation data dir).
+        """
+        columns = InitialConditionGenerator.sample_parameters(parameters, sampling, n_samples, seed)
+        return self.generate_simulations(code_name, t_end, columns, output_dir_template, start_cmd_template,
+                                         restart_cmd_template, constants, workers, manifest_file,
+                                         sampling=sampling, seed=seed, **kwargs)
+
+    def generate_simulations(self, code_name, t_end, columns, output_dir_template, start_cmd_template,
+                             restart_cmd_template=None, constants=None, workers=8,
+                             manifest_file='sweep_manifest.json', sampling=None, seed=None, **kwargs):
+        """
+        Generate the initial conditions of many simulations at once.
+
+        :param columns: A dict mapping the names of the parameters to the sequences (e.g. NumPy arrays) of their
+                        values, one per simulation, e.g. as returned by sample_parameters().
+        :return: The list of the directories of the simulations (relative to the simulation data dir).
+
+        See generate_sweep() for the other parameters.
+        """
+        names = list(columns.keys())
+        values = [list(columns[name]) for name in names]
+        n_sims = len(values[0]) if len(values) > 0 else 0
+        for name, column in zip(names, values):
+            if len(column) != n_sims:
+                raise ValueError('The parameter %s has %d values, but %s has %d. All the parameters must have one value '
+                                 'per simulation.' % (name, len(column), names[0], n_sims))
+        points = []
+        for index in range(n_sims):
+            point = dict()
+            if constants is not None:
+                point.update(constants)
+            for name, column in zip(names, values):
+                point[name] = column[index]
+            point['index'] = index
+            points.append(point)
+
+        output_dirs = [InitialConditionGenerator.format_template(output_dir_template, p) for p in points]
+        if len(set(output_dirs)) < len(output_dirs):
+            raise ValueError('The directory names of the simulations are not unique. Add more parameters (or '
+                             '%(index)d) to the template.')
+        configs = []
+        for point in points:
+            restart_cmd = None
+            if restart_cmd_template is not None:
+                restart_cmd = InitialConditionGenerator.format_template(restart_cmd_template, point)
+            configs.append(self.format_simulation_config(
+                code_name, t_end, InitialConditionGenerator.format_template(start_cmd_template, point),
+                restart_cmd=restart_cmd, **kwargs))
+
+        def write_simulation(i):
+            sim_dir = os.path.join(self.sim_data_dir, output_dirs[i])
+            if not os.path.isdir(sim_dir):
+                os.makedirs(sim_dir)
+            with open(os.path.join(sim_dir, self.config_file_per_sim), 'w') as conf_file:
+                conf_file.write(configs[i])
+
+        if workers > 1 and n_sims > 1:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(workers)
+            try:
+                pool.map(write_simulation, range(n_sims), max(1, n_sims // (workers * 4)))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for i in range(n_sims):
+                write_simulation(i)
+        print('%d simulations generated in %s' % (n_sims, self.sim_data_dir))
 
+        if manifest_file is not None:
+            manifest = {'code_name': code_name,
+                        't_end': t_end,
+                        'sampling': sampling,
+                        'seed': int(seed) if seed is not None else None,  # e.g. a NumPy integer
+                        'created': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        'parameters': names,
+                        'directories': output_dirs,
+                        'values': dict([(name, [v.item() if hasattr(v, 'item') else v for v in column])
+                                        for name, column in zip(names, values)])}
+            manifest_path = os.path.join(self.sim_data_dir, manifest_file)
+            tmp_fn = '%s.tmp.%d' % (manifest_path, os.getpid())
+            with open(tmp_fn, 'w') as f_manifest:
+                json.dump(manifest, f_manifest)
+            os.rename(tmp_fn, manifest_path)
+        return output_dirs
@@ -5,32 +5,31 @@ from ic_generator import InitialConditionGenerator
 
 def generate_ic(output_basedir=os.getcwd()):
     # parameter space
-    a_vec = [1.0, 2.0, 3.0]
-    o_vec = [3.5, 7.5, 10.5, 16.5]
+    a_vec = np.array([1.0, 2.0, 3.0])
+    o_vec = np.array([3.5, 7.5, 10.5, 16.5])
     t_end = 30.0
 
-    # templates
+    # templates (formatted with the parameters of every simulation)
     code_name = 'DemoSimulation'
     executable_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'demo_simulation_code.py')
-    start_cmd_template = 'python -u %s -a %f -o %f -t %f -p %f 1>%s 2>%s'
-    restart_cmd_template = 'cp ../%s . ; python -u %s -a %f -o %f -t %f -p %f 1>%s 2>%s'
+    start_cmd_template = 'python -u %(executable)s -a %(a)f -o %(o)f -t %(t_end)f -p %(p_crash)f 1>output.txt 2>error.txt'
+    restart_cmd_template = 'cp ../restart.txt . ; python -u %(executable)s -a %(a)f -o %(o)f -t %(t_end)f ' \
+                           '-p %(p_crash)f 1>output.txt 2>error.txt'
     stop_cmd = 'touch STOP'
-    output_dir_template = 'demo_sim_t_end=%g_a=%g_e=%g'
+    output_dir_template = 'demo_sim_t_end=%(t_end)g_a=%(a)g_e=%(o)g'
 
     # IC generator
     ic = InitialConditionGenerator(conf_file='SiMon.conf')
     ic.parse_config_file()
 
-    # generate the IC parameter space in the loops
-    for a in a_vec:
-        for o in o_vec:
-            p_crash = 0.01 * np.random.rand()
-            start_cmd = start_cmd_template % (executable_path, a, o, t_end, p_crash, 'output.txt', 'error.txt')
-            restart_cmd = restart_cmd_template % ('restart.txt', executable_path, a, o, t_end, p_crash, 'output.txt', 'error.txt')
-            output_dir = output_dir_template % (t_end, a, o)
-            ic.generate_simulation_ic(code_name, t_end, output_dir, start_cmd,
-                                      input_file='input.txt', output_file='output.txt', error_file='error.txt',
-                                      restart_cmd=restart_cmd, stop_cmd=stop_cmd)
+    # every combination of a and o, with a random crash probability for every simulation
+    columns = ic.sample_parameters([('a', a_vec), ('o', o_vec)], sampling='cartesian')
+    columns['p_crash'] = 0.01 * np.random.rand(len(columns['a']))
+    ic.generate_simulations(code_name, t_end, columns, output_dir_template, start_cmd_template,
+                            restart_cmd_template=restart_cmd_template, constants={'executable': executable_path,
+                                                                                  't_end': t_end},
+                            input_file='input.txt', output_file='output.txt', error_file='error.txt',
+                            stop_cmd=stop_cmd)
 
 if __name__ == "__main__":
     generate_ic()
@@ -0,0 +1,242 @@
+"""
+Metrics of the SiMon daemon in the Prometheus text exposition format.
+
+The daemon updates the metrics during every scheduler cycle: the time spent in each phase of the cycle (walk of the
+directory tree, probe of the simulations, scheduling, checkpoint backups), the number of simulations in each status,
+the usage of the job slots and of the resources of the node, the number of starts, restarts and kills, the launch
+latency and the amount of checkpoint data copied. At the end of the cycle, the metrics are written to a file (replaced
+atomically, e.g. for the textfile collector of the node exporter), and can optionally be served over HTTP on a local
+port.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler  # Python 3 only
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler  # Python 2 only
+
+
+class MetricsRegistry(object):
+
+    # the upper bounds of the buckets of the histograms (in seconds)
+    LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0]
+
+    def __init__(self):
+        self.metrics = OrderedDict()  # name -> [type, help, OrderedDict(labels -> value)]
+        self.lock = threading.Lock()  # the checkpoint workers and the HTTP server run in other threads
+        self.phase_stack = []  # the phases being timed: [name, start time, time spent in nested phases]
+        self.phase_times = OrderedDict()  # phase name -> time spent in the current cycle (exclusive of nested phases)
+        self.cycle_start = None
+
+    def describe(self, name, metric_type, help_text):
+        """
+        Declare a metric. The metrics are rendered in the order in which they are declared.
+
+        :param metric_type: 'counter', 'gauge' or 'histogram'.
+        """
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = [metric_type, help_text, OrderedDict()]
+
+    @staticmethod
+    def label_key(labels):
+        return tuple(sorted(labels.items()))
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.metrics[name][2][MetricsRegistry.label_key(labels)] = value
+
+    def inc(self, name, value=1, **labels):
+        key = MetricsRegistry.label_key(labels)
+        with self.lock:
+            samples = self.metrics[name][2]
+            samples[key] = samples.get(key, 0) + value
+
+    def get(self, name, **labels):
+        """
+        :return: The value of a metric (a list of [bucket counts, sum, count] for a histogram), or None if not set.
+        """
+        with self.lock:
+            return self.metrics[name][2].get(MetricsRegistry.label_key(labels))
+
+    def observe(self, name, value, **labels):
+        """
+        Add an observation to a histogram.
+        """
+        key = MetricsRegistry.label_key(labels)
+        with self.lock:
+            samples = self.metrics[name][2]
+            if key not in samples:
+                samples[key] = [[0] * len(MetricsRegistry.LATENCY_BUCKETS), 0.0, 0]
+            histogram = samples[key]
+            for i, upper_bound in enumerate(MetricsRegistry.LATENCY_BUCKETS):
+                if value <= upper_bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def begin_cycle(self):
+        self.cycle_start = time.time()
+        self.phase_times = OrderedDict()
+        self.phase_stack = []
+
+    def enter_phase(self, phase):
+        self.phase_stack.append([phase, time.time(), 0.0])
+
+    def exit_phase(self):
+        phase, start, nested = self.phase_stack.pop()
+        elapsed = time.time() - start
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + elapsed - nested
+        if len(self.phase_stack) > 0:
+            self.phase_stack[-1][2] += elapsed
+
+    def phase(self, phase):
+        """
+        Time a phase of the scheduler cycle, e.g. ``with metrics.phase('probe'): ...``. The time spent in a phase
+        nested in another one is only counted in the nested phase.
+        """
+        return PhaseTimer(self, phase)
+
+    def end_cycle(self, mode):
+        """
+        Publish the durations of the cycle and of its phases.
+
+        :param mode: 'full' for a scan of all simulations, 'partial' for a check of the changed simulations only.
+        """
+        if self.cycle_start is None:
+            return
+        now = time.time()
+        self.set('simon_cycle_duration_seconds', now - self.cycle_start, mode=mode)
+        self.inc('simon_cycles_total', mode=mode)
+        self.set('simon_last_cycle_timestamp_seconds', now)
+        for phase in ['walk', 'probe', 'schedule', 'backup']:
+            duration = self.phase_times.get(phase, 0.0)
+            self.set('simon_cycle_phase_duration_seconds', duration, phase=phase)
+            self.inc('simon_cycle_phase_seconds_total', duration, phase=phase)
+        self.cycle_start = None
+
+    @staticmethod
+    def format_labels(key, extra=None):
+        items = list(key)
+        if extra is not None:
+            items.append(extra)
+        if len(items) == 0:
+            return ''
+        return '{%s}' % ','.join(['%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                                  for k, v in items])
+
+    @staticmethod
+    def format_value(value):
+        if isinstance(value, float):
+            return repr(value)
+        return str(value)
+
+    def render(self):
+        """
+        :return: The metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for name, (metric_type, help_text, samples) in self.metrics.items():
+                lines.append('# HELP %s %s' % (name, help_text))
+                lines.append('# TYPE %s %s' % (name, metric_type))
+                for key, value in samples.items():
+                    if metric_type == 'histogram':
+                        buckets, total, count = value
+                        for upper_bound, n in zip(MetricsRegistry.LATENCY_BUCKETS, buckets):
+                            lines.append('%s_bucket%s %d' % (name, MetricsRegistry.format_labels(key, ('le', upper_bound)),
+                                                             n))
+                        lines.append('%s_bucket%s %d' % (name, MetricsRegistry.format_labels(key, ('le', '+Inf')),
+                                                         count))
+                        lines.append('%s_sum%s %s' % (name, MetricsRegistry.format_labels(key),
+                                                      MetricsRegistry.format_value(total)))
+                        lines.append('%s_count%s %d' % (name, MetricsRegistry.format_labels(key), count))
+                    else:
+                        lines.append('%s%s %s' % (name, MetricsRegistry.format_labels(key),
+                                                  MetricsRegistry.format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, metrics_file):
+        """
+        Write the metrics to a file, replaced atomically so that a reader never sees a partial file.
+        """
+        tmp_fn = '%s.tmp.%d' % (metrics_file, os.getpid())
+        with open(tmp_fn, 'w') as f_metrics:
+            f_metrics.write(self.render())
+        os.rename(tmp_fn, metrics_file)
+
+    def serve(self, port, address='127.0.0.1'):
+        """
+        Serve the metrics over HTTP in a background thread.
+
+        :return: The HTTP server.
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # do not write every scrape to the output of the daemon
+
+        server = HTTPServer((address, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, name='MetricsServer')
+        thread.daemon = True
+        thread.start()
+        return server
+
+
+class PhaseTimer(object):
+
+    def __init__(self, registry, phase):
+        self.registry = registry
+        self.phase = phase
+
+    def __enter__(self):
+        self.registry.enter_phase(self.phase)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.registry.exit_phase()
+        return False
+
+
+def create_daemon_metrics():
+    """
+    :return: A MetricsRegistry with the metrics of the SiMon daemon declared.
+    """
+    metrics = MetricsRegistry()
+    metrics.describe('simon_cycle_duration_seconds', 'gauge', 'Duration of the last scheduler cycle.')
+    metrics.describe('simon_cycles_total', 'counter', 'Number of scheduler cycles.')
+    metrics.describe('simon_last_cycle_timestamp_seconds', 'gauge', 'Time at which the last scheduler cycle ended.')
+    metrics.describe('simon_cycle_phase_duration_seconds', 'gauge',
+                     'Time spent in each phase of the last scheduler cycle.')
+    metrics.describe('simon_cycle_phase_seconds_total', 'counter', 'Time spent in each phase of the scheduler cycles.')
+    metrics.describe('simon_simulations', 'gauge', 'Number of simulations in each status.')
+    metrics.describe('simon_campaign_progress_ratio', 'gauge',
+                     'Mean fraction of the model time range covered by the top-level simulations.')
+    metrics.describe('simon_slots_used', 'gauge', 'Job slots, cores and memory (GB) used by the running simulations.')
+    metrics.describe('simon_slots_capacity', 'gauge', 'Job slots, cores and memory (GB) available (0: unlimited).')
+    metrics.describe('simon_slots_utilization_ratio', 'gauge', 'Fraction of the limited resources in use.')
+    metrics.describe('simon_starts_total', 'counter', 'Number of simulations started.')
+    metrics.describe('simon_restarts_total', 'counter', 'Number of simulations restarted.')
+    metrics.describe('simon_kills_total', 'counter', 'Number of stalled simulations killed.')
+    metrics.describe('simon_launch_failures_total', 'counter', 'Number of starts and restarts that failed.')
+    metrics.describe('simon_launch_latency_seconds', 'histogram', 'Time taken to start or restart a simulation.')
+    metrics.describe('simon_checkpoint_backups_total', 'counter', 'Number of checkpoint backups made.')
+    metrics.describe('simon_checkpoint_bytes_copied_total', 'counter', 'Size of the checkpoint files backed up.')
+    metrics.describe('simon_config_cache_entries', 'gauge', 'Number of parsed config files in the cache.')
+    metrics.describe('simon_config_cache_hits_total', 'counter', 'Config files found unchanged in the cache.')
+    metrics.describe('simon_config_cache_misses_total', 'counter', 'Config files read and parsed.')
+    metrics.describe('simon_config_cache_evictions_total', 'counter', 'Parsed config files evicted from the cache.')
+    metrics.describe('simon_shard_buckets', 'gauge', 'Number of buckets of Root_dir leased by this daemon.')
+    metrics.describe('simon_shard_daemons', 'gauge', 'Number of live daemons sharing Root_dir.')
+    return metrics
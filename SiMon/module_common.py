@@ -1,14 +1,20 @@
 import datetime
 import abc
+import errno
 import glob
 import os
 import subprocess
-import signal
 import time
 import sys
 import re
 import shutil
-from utilities import Utilities
+import threading
+from utilities import Utilities, TailReader
+from supervisor import ProcessSupervisor
+from executor import LocalExecutor
+from checkpoint import CheckpointStore, CheckpointArchiver
+from progress import ProgressHistory
+from config_cache import ConfigCache
 
 try:
     import configparser as cp  # Python 3 only
@@ -43,8 +49,40 @@ class SimulationTask(object):
 
     STATUS_LABEL = ['NEW', 'STOP', 'RUN', 'STALL', 'DONE', 'ERROR']
 
+    # Shared by all simulation tasks, so that the cached last lines survive the rebuild of the simulation tree
+    tail_reader = TailReader()
+
+    # Launches the simulation processes and keeps their handles (shared by all simulation tasks)
+    supervisor = ProcessSupervisor()
+
+    # Launches, checks and cancels the simulations: on this host by default, or through a batch system (see executor.py)
+    executor = LocalExecutor(supervisor)
+
+    # The parsed config files, kept across the rebuilds of the simulation tree
+    config_cache = ConfigCache()
+
+    # The progress history of every simulation directory, kept across the rebuilds of the simulation tree
+    progress_histories = dict()
+
+    # Makes the checkpoint backups (shared by all simulation tasks). By default in the calling thread, uncompressed
+    checkpoint_archiver = CheckpointArchiver()
+
+    # The status of a simulation is probed (i.e. files stat'ed, PID checked, output parsed) at most once per scheduler
+    # cycle. The cycle number is advanced by begin_probe_cycle(), and the counters are reset for every cycle.
+    probe_cycle = 0
+    probe_counters = {'probes': 0, 'cached': 0, 'invalidated': 0}
+    probe_lock = threading.Lock()  # the simulations may be probed by several threads
+    probe_latencies = None  # if a list, the duration of every probe is appended to it (see cycle_profiler.py)
+
     __metaclass__ = abc.ABCMeta
 
+    # The attributes are stored in slots rather than in a per-instance dictionary, which dominated the memory of the
+    # daemon for large campaigns. The subclasses of the code modules may still define their own attributes.
+    __slots__ = ('id', 'name', 'full_dir', 'fulldir', 'status', 'logger', 'error_type', 'config_file', 'config', 't',
+                 't_min', 't_max', 't_max_extended', 'mtime', 'ctime', 'cid', 'leaf_id', 't_latest', 'level',
+                 'parent_id', 'mode', 'niceness', 'maximum_number_of_checkpoints', 'checkpoint_stable_time',
+                 'stall_rate_window', 'stall_rate_ratio', 'eta', 'cores', 'memory', 'status_cycle', 'restarts')
+
     def __init__(self, sim_id, name, full_dir, status, mode='daemon', t_min=0, t_max=0, restarts=None, logger=None):
         """
         :param sim_id:
@@ -80,12 +118,23 @@ class SimulationTask(object):
         # (-1: no candidate, restart from itself;)
         # (>0: restart from the candidate. If the candidate cannot restart, try siblings)
         self.cid = -1
+        self.leaf_id = sim_id  # the ID of the simulation to restart, found by following the restart candidates
+        self.t_latest = 0  # the latest model time reached by the simulation or any of its restarts
 
         self.level = 0
         self.parent_id = -1
         self.mode = mode
         self.niceness = 0  # Priority, same as UNIX (-20 ~ 19, the lower ==> higher priority)
         self.maximum_number_of_checkpoints = 20
+        self.checkpoint_stable_time = 60.0  # an unchanged restart file is considered complete after this time (sec)
+        # Stall detection based on the progress rate: a running simulation is stalled if its rate over the last
+        # stall_rate_window seconds (0: disabled) is at most stall_rate_ratio times its earlier rate
+        self.stall_rate_window = 3600.0
+        self.stall_rate_ratio = 0.0  # 0: only if the model time does not advance at all
+        self.eta = None  # estimated wall-clock time (in seconds) to reach t_max, if running
+        self.cores = 1  # the number of CPU cores occupied by the simulation when it is running
+        self.memory = 0.0  # the memory (in GB) occupied by the simulation when it is running (0: not specified)
+        self.status_cycle = -1  # the scheduler cycle in which the status has been probed (-1: never/invalidated)
         if restarts is None:
             self.restarts = list()
         else:
@@ -94,24 +143,53 @@ class SimulationTask(object):
         self.sim_get_status()
 
     def __repr__(self, level=0):
+        return ''.join([SimulationTask.format_status_line(*row) for row in self.sim_overview_rows(level)])
+
+    def sim_overview_rows(self, level=0):
+        """
+        Traverse the restart tree of the simulation in pre-order (without recursion).
+
+        :param level: The level of this simulation in the tree (0: the root).
+        :return: A generator of the rows of the overview, i.e. the arguments of format_status_line().
+        """
+        stack = [(level, self)]
+        while len(stack) > 0:
+            level, sim = stack.pop()
+            eta = None
+            if sim.status == SimulationTask.STATUS_RUN:
+                eta = sim.eta
+            yield (level, sim.status, sim.id, sim.name, sim.full_dir, sim.t_min, sim.t, sim.t_max, sim.mtime, eta)
+            for child in reversed(sim.restarts):
+                stack.append((level + 1, child))
+
+    @staticmethod
+    def format_status_line(level, status, sim_id, name, full_dir, t_min, t, t_max, mtime, eta=None):
+        """
+        Format the line of a simulation in the overview of the simulation tree.
+
+        :param level: The level of the simulation in the tree (0: the root).
+        :param eta: The estimated time (in seconds) to finish the simulation (optional).
+        :return: The line, ending with a newline.
+        """
         if level == 0:
-            ret = '[%s] %s\n' % (SimulationTask.STATUS_LABEL[self.status], self.full_dir)
+            ret = '[%s] %s\n' % (SimulationTask.STATUS_LABEL[status], full_dir)
         else:
             # placeholder_dash = "|" + '-' * (level * 4)
             placeholder_dash = "| "
             placeholder_space = ' ' * ((level-1) * 4)
-            mtime_str = datetime.datetime.fromtimestamp(self.mtime).strftime('%m-%d %H:%M')
+            mtime_str = datetime.datetime.fromtimestamp(mtime).strftime('%m-%d %H:%M')
 
-            prefix = 'T: %g >> %g >> %g' % (int(self.t_min), int(self.t), int(self.t_max))
+            prefix = 'T: %g >> %g >> %g' % (int(t_min), int(t), int(t_max))
             suffix = mtime_str
-            progress_bar = Utilities.progress_bar(self.t, self.t_max, self.t_min, prefix=prefix, suffix=suffix)
+            if eta is not None:
+                suffix += ' ETA %s' % Utilities.format_duration(eta)
+            progress_bar = Utilities.progress_bar(t, t_max, t_min, prefix=prefix, suffix=suffix)
 
-            info = "%s    \t%s\t" % (Utilities.highlighted_text(str(self.name), 'cyan', bold=True), progress_bar)
+            info = "%s    \t%s\t" % (Utilities.highlighted_text(str(name), 'cyan', bold=True), progress_bar)
 
-            ret = "[%s]\t%s%d%s%s\n" % (SimulationTask.STATUS_LABEL[self.status], placeholder_space, self.id, placeholder_dash, info)
+            ret = "[%s]\t%s%d%s%s\n" % (SimulationTask.STATUS_LABEL[status], placeholder_space, sim_id, placeholder_dash,
+                                        info)
             # ret = "    "*level+str(self.id)+repr(self.name)+"\n"
-        for child in self.restarts:
-            ret += child.__repr__(level + 1)
         return ret
 
     def parse_config_file(self):
@@ -123,9 +201,8 @@ class SimulationTask(object):
         but a new file with default values is created, the method returns 1.
         """
         conf_fn = os.path.join(self.full_dir, self.config_file)
-        conf = cp.ConfigParser()
-        if os.path.isfile(conf_fn):
-            conf.read(conf_fn)
+        conf = SimulationTask.config_cache.parse(conf_fn)  # not read again if unchanged
+        if conf is not None:
             self.config = conf
             # synchronize config options to attributes
             if self.config.has_option('Simulation', 'T_end'):
@@ -136,6 +213,16 @@ class SimulationTask(object):
                 self.niceness = self.config.getint('Simulation', 'Niceness')
             if self.config.has_option('Simulation', 'Maximum_n_checkpoints'):
                 self.maximum_number_of_checkpoints = self.config.getint('Simulation', 'Maximum_n_checkpoints')
+            if self.config.has_option('Simulation', 'Checkpoint_stable_time'):
+                self.checkpoint_stable_time = self.config.getfloat('Simulation', 'Checkpoint_stable_time')
+            if self.config.has_option('Simulation', 'Stall_rate_window'):
+                self.stall_rate_window = self.config.getfloat('Simulation', 'Stall_rate_window')
+            if self.config.has_option('Simulation', 'Stall_rate_ratio'):
+                self.stall_rate_ratio = self.config.getfloat('Simulation', 'Stall_rate_ratio')
+            if self.config.has_option('Simulation', 'Cores'):
+                self.cores = self.config.getint('Simulation', 'Cores')
+            if self.config.has_option('Simulation', 'Memory'):
+                self.memory = self.config.getfloat('Simulation', 'Memory')
 
         else:
             if self.id > 0:
@@ -146,6 +233,117 @@ class SimulationTask(object):
             # TODO: write default config file
         return 0
 
+    def sim_get_progress_history(self):
+        """
+        :return: The progress history of the simulation (created at the first call).
+        """
+        history = SimulationTask.progress_histories.get(self.full_dir)
+        if history is None:
+            sample_interval = 60.0
+            if self.stall_rate_window > 0:
+                sample_interval = self.stall_rate_window / 16.0  # the 64 samples cover four windows
+            history = SimulationTask.progress_histories.setdefault(
+                self.full_dir, ProgressHistory(capacity=64, sample_interval=sample_interval))
+        return history
+
+    def sim_propagate_status(self):
+        """
+        Propagate the status of the restarts (children) to the simulations they have been restarted from (parents), in
+        a single post-order traversal of the restart tree rooted at this simulation. The children of a simulation are
+        complete before the simulation itself is visited, so restart chains of any depth are handled in O(n).
+
+        A simulation with restarts is RUN if any restart is RUN, otherwise DONE if any restart is DONE, otherwise it
+        takes the status of its last restart. The aggregate fields are computed along the way: the restart candidate
+        (cid), the leaf to restart (leaf_id), the latest model time reached (t_latest) and the extended t_max.
+
+        :return: The number of simulations visited.
+        """
+        # a pre-order listing visited backwards is a valid post-order (every child comes after its parent)
+        order = []
+        stack = [self]
+        while len(stack) > 0:
+            sim = stack.pop()
+            order.append(sim)
+            stack.extend(sim.restarts)
+        for sim in reversed(order):
+            sim.cid = -1
+            sim.leaf_id = sim.id
+            sim.t_latest = sim.t
+            if len(sim.restarts) == 0:
+                continue
+            any_run = False
+            any_done = False
+            for child in sim.restarts:
+                if child.status == SimulationTask.STATUS_RUN:
+                    any_run = True
+                elif child.status == SimulationTask.STATUS_DONE:
+                    any_done = True
+                if child.t_latest > sim.t_latest:
+                    sim.t_latest = child.t_latest
+                if (child.t > sim.t and not os.path.isfile(os.path.join(child.full_dir, 'ERROR'))) \
+                        or child.status == SimulationTask.STATUS_RUN:
+                    # nominate as restart candidate
+                    sim.cid = child.id
+                    sim.leaf_id = child.leaf_id
+                    sim.t_max_extended = child.t_max_extended
+            if any_run:
+                sim.status = SimulationTask.STATUS_RUN
+            elif any_done:
+                sim.status = SimulationTask.STATUS_DONE
+            else:
+                sim.status = sim.restarts[-1].status
+        return len(order)
+
+    @staticmethod
+    def has_stop_marker(full_dir):
+        """
+        :return: True if the simulation directory holds a STOP or ERROR file, i.e. the simulation is not restarted.
+        """
+        return os.path.isfile(os.path.join(full_dir, 'STOP')) or os.path.isfile(os.path.join(full_dir, 'ERROR'))
+
+    @staticmethod
+    def begin_probe_cycle():
+        """
+        Start a new scheduler cycle. The status snapshots taken in the previous cycle become outdated, so the next
+        call of sim_get_status() on every simulation will probe the file system again.
+
+        :return: The number of the new cycle.
+        """
+        SimulationTask.probe_cycle += 1
+        for key in SimulationTask.probe_counters:
+            SimulationTask.probe_counters[key] = 0
+        SimulationTask.executor.begin_cycle()
+        return SimulationTask.probe_cycle
+
+    @staticmethod
+    def prune_progress_histories(full_dirs):
+        """
+        Drop the progress histories of the directories that are not in the simulation tree anymore (e.g. deleted,
+        renamed, or handed over to another daemon).
+
+        :param full_dirs: The directories of the simulations in the tree.
+        :return: The number of histories dropped.
+        """
+        full_dirs = set(full_dirs)
+        stale = [full_dir for full_dir in SimulationTask.progress_histories if full_dir not in full_dirs]
+        for full_dir in stale:
+            del SimulationTask.progress_histories[full_dir]
+        return len(stale)
+
+    def sim_invalidate_status(self):
+        """
+        Discard the status snapshot of the current cycle, e.g. after the simulation has been started or killed, so that
+        the next call of sim_get_status() probes the simulation again.
+        """
+        if self.status_cycle != -1:
+            self.status_cycle = -1
+            SimulationTask.count_probe('invalidated')
+
+    @staticmethod
+    def count_probe(counter):
+        with SimulationTask.probe_lock:
+            SimulationTask.probe_counters[counter] += 1
+
     def sim_start(self):
         """
         Start a new simulation.
@@ -153,41 +351,32 @@ class SimulationTask(object):
         :return: Return 0 if succeed, -1 if failed. If the simulation is already started, then it will do nothing
         but return 1.
         """
-        start_script_template = '%s & echo $!>.process.pid'
-        orig_dir = os.getcwd()
-        os.chdir(self.full_dir)
-
-        # Test if the process is running accoding to the .process.pid file
-        if os.path.isfile('.process.pid'):
-            # if the PID file exists, try to read the process ID
-            f_pid = open('.process.pid', 'r')
-            pid = int(f_pid.readline().strip())
-            f_pid.close()
-            if pid > 0:
-                try:
-                    os.kill(pid, 0)
-                    return 1  # if no exception, the process is already running
-                except (ValueError, OSError):
-                    pass  # process not started yet
+        self.sim_invalidate_status()
+        executor = SimulationTask.executor
+        # Test if the process is running according to the job file (e.g. .process.pid)
+        if executor.is_running(executor.read_job_id(self.full_dir)):
+            return 1  # the process is already running
         # If the process is not started yet, then start it in a normal way
         if self.config.has_option('Simulation', 'Start_command'):
             start_cmd = self.config.get('Simulation', 'Start_command')
-            # self.proc = subprocess.Popen(start_cmd, shell=True)
-            os.system(start_script_template % start_cmd)
-            # sleep for a little while to make sure that the pid file exist
-            time.sleep(0.5)
-            fpid = open('.process.pid', 'r')
-            pid = int(fpid.readline())
-            fpid.close()
+            try:
+                pid = executor.submit(start_cmd, self.full_dir, name=self.name)
+            except OSError as err:
+                msg = 'Simulation %s cannot be started: %s' % (self.name, err)
+                print(msg)
+                if self.logger is not None:
+                    self.logger.error(msg)
+                return -1
+            SimulationTask.config_cache.invalidate(os.path.join(self.full_dir, self.config_file))  # modified below
             self.config.set('Simulation', 'PID', str(pid))
             self.config.set('Simulation', 'Timestamp_started', str(time.time()))
-            self.config.write(open(self.config_file, 'w'))
+            with open(os.path.join(self.full_dir, self.config_file), 'w') as f_conf:
+                self.config.write(f_conf)
             if self.logger is not None:
-                msg = 'Simulation %s started, PID = %d' % (self.name, pid)
+                msg = 'Simulation %s started, %s = %s' % (self.name, executor.JOB_LABEL, pid)
                 self.logger.info(msg)
         else:
             return -1
-        os.chdir(orig_dir)
         return 0
 
     def sim_restart(self):
@@ -198,81 +387,80 @@ class SimulationTask(object):
         necessary, the method will do nothing but return 1. If the simulation is marked as 'STOP' or 'ERROR', then
         return 2 and do nothing.
         """
-        if os.path.isfile('STOP') or os.path.isfile('ERROR'):
+        if SimulationTask.has_stop_marker(self.full_dir):
             print('Restart skipped due to the existence of the STOP file or ERROR file.')
             return 2
-        # Test if the process is running
-        restart_script_template = '%s & echo $!>.process.pid'
-        orig_dir = os.getcwd()
-        os.chdir(self.full_dir)
+        self.sim_invalidate_status()
         print('The full dir is %s' % self.full_dir)
         print('restarting simulation: %s' % self.full_dir)
         if self.logger is not None:
             self.logger.info('Restarting simulation: %s' % self.full_dir)
-        # Test if the process is running accoding to the .process.pid file
-        if os.path.isfile('.process.pid'):
-            # if the PID file exists, try to read the process ID
-            f_pid = open('.process.pid', 'r')
-            pid = int(f_pid.readline().strip())
-            f_pid.close()
-            if pid > 0:
-                try:
-                    os.kill(pid, 0)
-                    return 1  # if no exception, the process is already running
-                except (ValueError, OSError):
-                    # process not started yet
-                    # check how many times the simulation has been restarted
-                    restarts = glob.glob('restart*/')
-                    n_restarts = len(restarts)
-                    print n_restarts, self.config.getint('Simulation', 'Max_restarts')
-                    # check whether it exceeds the maximum times of restarts specified in the per-sim config file
-                    if self.config.has_option('Simulation', 'Max_restarts'):
-                        if n_restarts > self.config.getint('Simulation', 'Max_restarts'):
-                            # if exceed, create an empty file called 'ERROR'
-                            f_error = open('ERROR', 'w')
-                            f_error.close()
-                            msg = 'Simulation %s has been restarted too many times. Further restart skipped...' % self.full_dir
-                            print(msg)
-                            if self.logger is not None:
-                                self.logger.error(msg)
-                            return -2
-                    else:
-                        # if the config entry Max_restarts does not exist in the config file, there is no restart limit
-                        pass
-                    # now try to restart the simulation
-                    if self.config.has_option('Simulation', 'Restart_command'):
-                        restart_cmd = self.config.get('Simulation', 'Restart_command')
-                        if restart_cmd is not '' and restart_cmd.strip() is not 'None':
-                            msg = 'Restarting simulation: %s' % self.full_dir
-                            print(msg)
-                            if self.logger is not None:
-                                self.logger.info(msg)
-                            # create a restart dir
-                            restart_dir = 'restart%d' % (n_restarts + 1)
-                            os.mkdir(restart_dir)
-                            os.chdir(restart_dir)
-                            os.system(restart_script_template % restart_cmd)
-                            # sleep for a little while to make sure that the pid file exist
-                            time.sleep(0.5)
-                            fpid = open('.process.pid', 'r')
-                            pid = int(fpid.readline())
-                            fpid.close()
-                            self.config.set('Simulation', 'PID', str(pid))
-                            self.config.set('Simulation', 'Timestamp_started', str(time.time()))
-                            self.config.write(open(self.config_file, 'w'))
-                        else:
-                            msg = '%s: unable to restart because the restart command is not properly configured.' % self.name
+        # Test if the process is running according to the job file (e.g. .process.pid)
+        executor = SimulationTask.executor
+        pid = executor.read_job_id(self.full_dir)
+        if pid is not None and pid != 0:
+            if executor.is_running(pid):
+                return 1  # the process is already running
+            else:
+                # process not started yet
+                # check how many times the simulation has been restarted
+                restarts = glob.glob(os.path.join(self.full_dir, 'restart*/'))
+                n_restarts = len(restarts)
+                # check whether it exceeds the maximum times of restarts specified in the per-sim config file
+                if self.config.has_option('Simulation', 'Max_restarts'):
+                    if n_restarts > self.config.getint('Simulation', 'Max_restarts'):
+                        # if exceed, create an empty file called 'ERROR'
+                        f_error = open(os.path.join(self.full_dir, 'ERROR'), 'w')
+                        f_error.close()
+                        msg = 'Simulation %s has been restarted too many times. Further restart skipped...' % self.full_dir
+                        print(msg)
+                        if self.logger is not None:
+                            self.logger.error(msg)
+                        return -2
+                else:
+                    # if the config entry Max_restarts does not exist in the config file, there is no restart limit
+                    pass
+                # now try to restart the simulation
+                if self.config.has_option('Simulation', 'Restart_command'):
+                    restart_cmd = self.config.get('Simulation', 'Restart_command')
+                    if restart_cmd.strip() != '' and restart_cmd.strip() != 'None':
+                        msg = 'Restarting simulation: %s' % self.full_dir
+                        print(msg)
+                        if self.logger is not None:
+                            self.logger.info(msg)
+                        # the restart command reads the restart file of this simulation
+                        self.sim_restore_checkpoint()
+                        # create a restart dir
+                        restart_dir = os.path.join(self.full_dir, 'restart%d' % (n_restarts + 1))
+                        os.mkdir(restart_dir)
+                        try:
+                            pid = executor.submit(restart_cmd, restart_dir, name=self.name)
+                        except OSError as err:
+                            os.rmdir(restart_dir)
+                            msg = 'Simulation %s cannot be restarted: %s' % (self.name, err)
                             print(msg)
                             if self.logger is not None:
                                 self.logger.error(msg)
                             return -1
+                        # modified below (the config of this simulation is not written back)
+                        SimulationTask.config_cache.invalidate(os.path.join(self.full_dir, self.config_file))
+                        self.config.set('Simulation', 'PID', str(pid))
+                        self.config.set('Simulation', 'Timestamp_started', str(time.time()))
+                        # the config file in the restart dir makes it a (child) simulation in the simulation tree
+                        with open(os.path.join(restart_dir, self.config_file), 'w') as f_conf:
+                            self.config.write(f_conf)
                     else:
-                        msg = '%s: unable to restart because the restart command is not configured.' % self.name
+                        msg = '%s: unable to restart because the restart command is not properly configured.' % self.name
                         print(msg)
                         if self.logger is not None:
                             self.logger.error(msg)
                         return -1
-        os.chdir(orig_dir)
+                else:
+                    msg = '%s: unable to restart because the restart command is not configured.' % self.name
+                    print(msg)
+                    if self.logger is not None:
+                        self.logger.error(msg)
+                    return -1
         return 0
 
     def sim_get_model_time(self):
@@ -284,19 +472,26 @@ class SimulationTask(object):
 
         :return: the current model time
         """
-        orig_dir = os.getcwd()
-        os.chdir(self.full_dir)
         if self.config.has_option('Simulation', 'Output_file'):
-            output_file = self.config.get('Simulation', 'Output_file')
-            regex = re.compile('\\d+')
-            if os.path.isfile(output_file):
-                last_line = subprocess.check_output(['tail', '-1', output_file])
-                res = regex.findall(last_line)
-                if len(res) > 0:
-                    self.t = float(res[0])
-        os.chdir(orig_dir)
+            output_file = os.path.join(self.full_dir, self.config.get('Simulation', 'Output_file'))
+            t = SimulationTask.tail_reader.last_value(output_file, self.parse_model_time)
+            if t is not None:
+                self.t = t
         return self.t
 
+    @staticmethod
+    def parse_model_time(line):
+        """
+        Parse the model time from the last line of the output file. By default, the first integer number in the line
+        is taken as the model time.
+
+        :return: the model time, or None if it cannot be parsed from the line
+        """
+        res = re.findall('\\d+', line)
+        if len(res) > 0:
+            return float(res[0])
+        return None
+
     def sim_get_model_start_time(self):
         """
         Get the t_min value of the current model
@@ -319,16 +514,25 @@ class SimulationTask(object):
         """
         return self.t_max
 
-    def sim_get_status(self):
+    def sim_get_status(self, refresh=False):
         """
         Get the current status of the simulation. Update the config file if necessary.
 
+        The status is probed only once per scheduler cycle. Subsequent calls in the same cycle return the snapshot,
+        unless the snapshot has been invalidated with sim_invalidate_status(), or refresh is True.
+
+        :param refresh: Probe the simulation even if a snapshot of the current cycle exists.
         :return: The code of the current simulation status.
         """
         if self.config is None:
             return 0
-        orig_dir = os.getcwd()
-        os.chdir(self.full_dir)
+        if not refresh and self.status_cycle == SimulationTask.probe_cycle:
+            SimulationTask.count_probe('cached')
+            return self.status
+        SimulationTask.count_probe('probes')
+        probe_start = time.time()
+        self.status_cycle = SimulationTask.probe_cycle
+        # All paths are absolute (no chdir), so that simulations can be probed in parallel threads
         self.t = self.sim_get_model_time()
         self.t_min = self.sim_get_model_start_time()
 
@@ -336,58 +540,77 @@ class SimulationTask(object):
         output_file = ''
         if self.config.has_option('Simulation', 'Output_file'):
             output_file = self.config.get('Simulation', 'Output_file')
-            if os.path.isfile(output_file):
-                self.mtime = os.stat(output_file).st_mtime
+            if os.path.isfile(os.path.join(self.full_dir, output_file)):
+                self.mtime = os.stat(os.path.join(self.full_dir, output_file)).st_mtime
         elif self.config.has_option('Simulation', 'Error_file'):
             error_file = self.config.get('Simulation', 'Error_file')
-            if os.path.isfile(error_file_file):
-                self.mtime = os.stat(error_file).st_mtime
+            if os.path.isfile(os.path.join(self.full_dir, error_file)):
+                self.mtime = os.stat(os.path.join(self.full_dir, error_file)).st_mtime
 
         # Get the starting time of the simulation
         if self.config.has_option('Simulation', 'Timestamp_started'):
             self.ctime = self.config.getfloat('Simulation', 'Timestamp_started')
 
-        # Determine whether the simulation is running using the process ID
-        if os.path.isfile('.process.pid'):
+        # Determine whether the simulation is running using the process ID (or the ID of the batch job)
+        executor = SimulationTask.executor
+        if os.path.isfile(os.path.join(self.full_dir, executor.JOB_FILE)):
             # if the PID file exists, try to read the process ID
-            f_pid = open('.process.pid', 'r')
-            pid = int(f_pid.readline().strip())
-            f_pid.close()
+            pid = executor.read_job_id(self.full_dir)
+            if pid is None:
+                pid = 0
             if pid == 0:
                 if self.mtime == 0:
                     self.status = SimulationTask.STATUS_NEW
             else:
-                try:
-                    os.kill(pid, 0)  # This just checks if the process is running. It doesn't kill the process
+                running = executor.is_running(pid)
+                if running and not executor.is_started(pid):
+                    # waiting in the queue of the batch system: it occupies a slot, but cannot stall
+                    self.status = SimulationTask.STATUS_RUN
+                elif running:
                     # It is running. Check if stalled.
+                    history = self.sim_get_progress_history()
+                    history.add(time.time(), self.t)
+                    self.eta = history.eta(self.t_max)
                     # The default value is large to prevent a slow simulation to be mistakenly killed
                     stall_time = 6.e6  # after 6.e6 seconds if the code doesn't advance, it is considered stalled
                     if self.config.has_option('Simulation', 'Stall_time'):
                         # Allow overriding the stall time using the per-simulation config file
                         stall_time = self.config.getfloat('Simulation', 'Stall_time')
-                    if time.time() - self.mtime > stall_time:
+                    if self.stall_rate_window > 0 and history.is_stalled(self.stall_rate_window, self.stall_rate_ratio):
+                        # the code may still write to its output file, but its model time does not advance (enough)
+                        self.status = SimulationTask.STATUS_STALL
+                        msg = 'job %s is running [%s=%s], but its progress rate collapsed (%s model time per sec ' \
+                              'earlier, T = %g now). Marked as STALL' % (self.name, executor.JOB_LABEL, pid,
+                                                                         history.rate(), self.t)
+                        print(msg)
+                        if self.logger is not None:
+                            self.logger.info(msg)
+                    elif time.time() - self.mtime > stall_time:
                         self.status = SimulationTask.STATUS_STALL
                         if self.logger is not None:
                             mtime_str = datetime.datetime.fromtimestamp(self.mtime).strftime('%m-%d %H:%M')
-                            msg = 'job %s is running [PID=%d], but no update in its output file (%s) since %s. ' \
+                            msg = 'job %s is running [%s=%s], but no update in its output file (%s) since %s. ' \
                                   'The stall time of this task is %s sec. ' \
-                                  'Marked as STALL' % (self.name, pid, output_file, mtime_str, stall_time)
+                                  'Marked as STALL' % (self.name, executor.JOB_LABEL, pid, output_file, mtime_str,
+                                                       stall_time)
                             print(msg)
                             self.logger.info(msg)
                     else:
                         self.status = SimulationTask.STATUS_RUN
-                except (OSError, ValueError), e:
+                else:
                     # The process is not running, check if stopped or done
                     if self.t >= self.t_max or self.status == SimulationTask.STATUS_DONE:
                         self.status = SimulationTask.STATUS_DONE
                     else:
                         if self.ctime == 0.0:
                             self.status = SimulationTask.STATUS_NEW
-                        elif os.path.isfile('ERROR'):
+                        elif os.path.isfile(os.path.join(self.full_dir, 'ERROR')):
                             self.status = SimulationTask.STATUS_ERROR
                         else:
                             self.status = SimulationTask.STATUS_STOP
-        os.chdir(orig_dir)
+        if SimulationTask.probe_latencies is not None:
+            with SimulationTask.probe_lock:
+                SimulationTask.probe_latencies.append(time.time() - probe_start)
         return self.status
 
     def sim_kill(self):
@@ -398,23 +621,26 @@ class SimulationTask(object):
         :return: Return 0 if succeed, -1 if failed. If the simulation is not running, then it cannot be killed, causing
         the method to do nothing but return 1.
         """
+        self.sim_invalidate_status()
         # Find the process by PID
-        if os.path.isfile('.process.pid'):
-            # if the PID file exists, try to read the process ID
-            f_pid = open('.process.pid', 'r')
-            pid = int(f_pid.readline().strip())
-            f_pid.close()
-            try:
-                os.kill(pid, signal.SIGKILL)
-                msg = 'Simulation %s (PID: %d) killed.' % (self.name, pid)
-                print(msg)
-                if self.logger is not None:
-                    self.logger.info(msg)
-            except OSError, err:
-                msg = '%s: Cannot kill the process: %s\n' % (str(err),  self.name)
-                print(msg)
-                if self.logger is not None:
-                    self.logger.error(msg)
+        executor = SimulationTask.executor
+        pid = executor.read_job_id(self.full_dir)
+        if pid is None or pid == 0:
+            return 1  # never started, or no job file
+        try:
+            executor.cancel(pid)
+        except OSError, err:
+            if err.errno == errno.ESRCH:
+                return 1  # the process has already exited
+            msg = '%s: Cannot kill the process: %s\n' % (str(err),  self.name)
+            print(msg)
+            if self.logger is not None:
+                self.logger.error(msg)
+            return -1
+        msg = 'Simulation %s (%s: %s) killed.' % (self.name, executor.JOB_LABEL, pid)
+        print(msg)
+        if self.logger is not None:
+            self.logger.info(msg)
         return 0
 
     def sim_stop(self):
@@ -439,32 +665,68 @@ class SimulationTask(object):
     def sim_backup_checkpoint(self):
         """
         Back up a snapshot of the latest restart files or simulation snapshot. In case of code crash, the backup files
-        can be used for restarting.
+        can be used for restarting. The restart file is only backed up if it looks complete: same size as in the
+        previous cycle, renamed into place, or not modified for Checkpoint_stable_time seconds (per-simulation config,
+        default: 60).
 
-        :return: Return 0 if succeed, -1 if failed. If the existing simulation snapshot is already the latest version,
-        backup is not necessary, causing the method to do nothing but return 1.
+        :return: Return 0 if succeed, -1 if failed. If the existing simulation snapshot is already the latest version
+        (or the restart file may still be being written), backup is not necessary, causing the method to do nothing but
+        return 1.
         """
         # Try to get the restartable checkpoint file name from the config file
         if self.config.has_option('Simulation', 'Restart_file'):
             restart_fn = self.config.get('Simulation', 'Restart_file')
-            ts = time.time()  # get the timestamp as part of the backup restart file name
-            backup_restart_fn = 'restart.tmp.%d' % int(ts)
-            if os.path.isfile(os.path.join(self.full_dir, restart_fn)):
-                shutil.copyfile(os.path.join(self.full_dir, restart_fn), os.path.join(self.full_dir, backup_restart_fn))
-                msg = 'Restart file has been backup as ' + backup_restart_fn
-                print(msg)
-                if self.logger is not None:
-                    self.logger.info(msg)
-                # delete the oldest backup if there is a limit of maximum number of backup files
-                backup_file_list = sorted(glob.glob(os.path.join(self.full_dir, 'restart.tmp.*')))
-                if 0 < self.maximum_number_of_checkpoints < len(backup_file_list):
-                    for backup_restart_del_fn in backup_file_list[:-abs(self.maximum_number_of_checkpoints)]:
-                        os.remove(os.path.join(self.full_dir, backup_restart_del_fn))
+            archiver = SimulationTask.checkpoint_archiver
+            store = CheckpointStore(self.full_dir, restart_fn, max_backups=self.maximum_number_of_checkpoints,
+                                    stable_time=self.checkpoint_stable_time, compression=archiver.compression,
+                                    logger=self.logger)
+            return archiver.submit(store, self.sim_report_backup)
         else:
             # Without knowing the name of the restartable snapshot, SiMon will not be able to backup
             if self.logger is not None:
                 self.logger.info('SiMon does not know how to backup the current simulation %s' % self.name)
             return -1
+
+    def sim_report_backup(self, result):
+        """
+        Report the outcome of a checkpoint backup (possibly called from a background thread).
+
+        :param result: The tuple of (return code, backup name) returned by CheckpointStore.backup().
+        """
+        ret, backup_restart_fn = result
+        if ret == 0:
+            msg = 'Restart file has been backup as ' + backup_restart_fn
+            print(msg)
+            if self.logger is not None:
+                self.logger.info(msg)
+
+    def sim_restore_checkpoint(self):
+        """
+        Restore the restart file from the newest backup (decompressing it if necessary) if the restart file is missing
+        or empty, e.g. because the code crashed while writing it.
+
+        :return: Return 0 if restored, 1 if not necessary, -1 if failed (no backup available).
+        """
+        if not self.config.has_option('Simulation', 'Restart_file'):
+            return -1
+        restart_fn = self.config.get('Simulation', 'Restart_file')
+        restart_path = os.path.join(self.full_dir, restart_fn)
+        if os.path.isfile(restart_path) and os.path.getsize(restart_path) > 0:
+            return 1
+        SimulationTask.checkpoint_archiver.wait(self.full_dir)  # a backup of this simulation may be in progress
+        store = CheckpointStore(self.full_dir, restart_fn)
+        try:
+            backup_restart_fn = store.restore()
+        except (IOError, OSError) as err:
+            backup_restart_fn = None
+            if self.logger is not None:
+                self.logger.error('%s: unable to restore the restart file: %s' % (self.name, err))
+        if backup_restart_fn is None:
+            return -1
+        msg = '%s: restart file restored from the backup %s' % (self.name, backup_restart_fn)
+        print(msg)
+        if self.logger is not None:
+            self.logger.info(msg)
         return 0
 
     def sim_delete(self):
@@ -497,12 +759,10 @@ class SimulationTask(object):
             shell_command = raw_input('CMD>> ')
         sys.stdout.write('========== Command on #%d ==> %s (PWD=%s) ==========\n'
                          % (self.id, self.full_dir, self.full_dir))
-        original_dir = os.getcwd()
-        os.chdir(self.full_dir)
-        os.system(shell_command)
+        sys.stdout.flush()
+        subprocess.call(shell_command, shell=True, cwd=self.full_dir)
         sys.stdout.write('========== [DONE] Command on #%d ==> %s (PWD=%s) ==========\n'
                          % (self.id, self.full_dir, self.full_dir))
-        os.chdir(original_dir)
         return 0
 
     def sim_clean(self):
@@ -548,18 +808,14 @@ class SimulationTask(object):
 
         :return: Return the messages as a combined string if available. Otherwise return an empty string.
         """
+        messages = ''
         if self.config.has_option('Simulation', 'Output_file'):
             output_file = self.config.get('Simulation', 'Output_file')
-            sys.stdout.write('========== Diagnose for #%d ==> %s ==========\n' % (self.id, self.full_dir))
-            check_dir_name = self.full_dir
-            original_dir = os.getcwd()
-            os.chdir(check_dir_name)
-            os.system('\ntail -%d %s' % (lines, output_file))
-            restart_dir = sorted(glob.glob('restart*/'))
+            messages += '========== Diagnose for #%d ==> %s ==========\n' % (self.id, self.full_dir)
+            messages += TailReader.read_last_lines(os.path.join(self.full_dir, output_file), lines)
+            restart_dir = sorted(glob.glob(os.path.join(self.full_dir, 'restart*/')))
             for r_dir in restart_dir:
-                os.chdir(r_dir)
-                sys.stdout.write('========== Diagnose for restart ==> %s ==========\n' % r_dir)
-                os.system('\ntail -%d %s' % (lines, output_file))
-                os.chdir('..')
-            os.chdir(original_dir)
-        return str()
+                messages += '========== Diagnose for restart ==> %s ==========\n' % os.path.basename(r_dir.rstrip('/'))
+                messages += TailReader.read_last_lines(os.path.join(r_dir, output_file), lines)
+            sys.stdout.write(messages)
+        return messages
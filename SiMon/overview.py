@@ -0,0 +1,132 @@
+"""
+Streaming overview of the simulation tree.
+
+The overview is written one line at a time while the tree is traversed, instead of being built as a single string.
+The simulations can be filtered by status, name and level, and paginated, e.g. ``simon --status RUN --limit 50``. The
+line of a simulation (with its progress bar) is only formatted if the simulation is shown.
+
+A row of the overview is the tuple of the arguments of SimulationTask.format_status_line(), i.e. (level, status, ID,
+name, full path, t_min, t, t_max, mtime, ETA), so that the overview can be written from the simulation tree as well as
+from the state store.
+"""
+import sys
+import errno
+import argparse
+from fnmatch import fnmatch
+from module_common import SimulationTask
+
+
+class OverviewFilter(object):
+
+    def __init__(self, statuses=None, name=None, max_level=None, offset=0, limit=None):
+        """
+        :param statuses: Only the simulations with these statuses (labels, e.g. 'RUN', or codes) are shown (optional).
+        :param name: Only the simulations whose name matches this shell-style pattern are shown (optional).
+        :param max_level: Only the simulations up to this level are shown (1: the top-level simulations) (optional).
+        :param offset: The number of matching simulations skipped.
+        :param limit: The maximum number of simulations shown (optional).
+        """
+        self.statuses = None
+        if statuses is not None:
+            self.statuses = set([OverviewFilter.parse_status(status) for status in statuses])
+        self.name = name
+        self.max_level = max_level
+        self.offset = offset
+        self.limit = limit
+
+    @staticmethod
+    def parse_status(status):
+        """
+        :return: The code of a status given by its label (case insensitive) or its code.
+        """
+        if isinstance(status, int):
+            code = status
+        elif status.isdigit():
+            code = int(status)
+        elif status.upper() in SimulationTask.STATUS_LABEL:
+            code = SimulationTask.STATUS_LABEL.index(status.upper())
+        else:
+            raise ValueError('unknown status %s (valid: %s)' % (status, ', '.join(SimulationTask.STATUS_LABEL)))
+        if not 0 <= code < len(SimulationTask.STATUS_LABEL):
+            raise ValueError('unknown status code %d' % code)
+        return code
+
+    @staticmethod
+    def from_args(args):
+        """
+        Parse the overview options of the command line, e.g. ``--status RUN,STALL --name 'sim_1*' --limit 50``.
+
+        :return: An OverviewFilter.
+        """
+        parser = argparse.ArgumentParser(prog='simon', description='Print an overview of the simulations and quit.')
+        parser.add_argument('--status', default=None,
+                            help='only the simulations with these statuses (comma-separated), e.g. RUN,STALL')
+        parser.add_argument('--name', default=None, help='only the simulations whose name matches this pattern')
+        parser.add_argument('--level', type=int, default=None,
+                            help='only the simulations up to this level (1: the top-level simulations)')
+        parser.add_argument('--offset', type=int, default=0, help='the number of matching simulations skipped')
+        parser.add_argument('--limit', type=int, default=None, help='the maximum number of simulations shown')
+        options = parser.parse_args(args)
+        statuses = None
+        if options.status is not None:
+            statuses = [status.strip() for status in options.status.split(',') if status.strip() != '']
+            try:
+                OverviewFilter(statuses)
+            except ValueError as err:
+                parser.error(str(err))
+        return OverviewFilter(statuses=statuses, name=options.name, max_level=options.level, offset=options.offset,
+                              limit=options.limit)
+
+    def is_paginated(self):
+        return self.offset > 0 or self.limit is not None
+
+    def match(self, level, status, name):
+        """
+        :return: True if a simulation passes the status, name and level filters.
+        """
+        if self.statuses is not None and status not in self.statuses:
+            return False
+        if self.max_level is not None and level > self.max_level:
+            return False
+        if self.name is not None and not fnmatch(str(name), self.name):
+            return False
+        return True
+
+
+def write_overview(rows, out=None, overview_filter=None):
+    """
+    Write the overview of the simulations one line at a time.
+
+    :param rows: An iterable of the rows of the overview in the order of the tree. The first row (the root) is always
+                 written, as the header of the overview.
+    :param out: The file to which the overview is written. Default: stdout.
+    :param overview_filter: An OverviewFilter (optional).
+    :return: A tuple of (the number of simulations shown, the number of simulations matching the filter).
+    """
+    if out is None:
+        out = sys.stdout
+    if overview_filter is None:
+        overview_filter = OverviewFilter()
+    n_shown = 0
+    n_matched = 0
+    try:
+        for row in rows:
+            level, status, name = row[0], row[1], row[3]
+            if level > 0:
+                if not overview_filter.match(level, status, name):
+                    continue
+                n_matched += 1
+                if n_matched <= overview_filter.offset:
+                    continue
+                if overview_filter.limit is not None and n_shown >= overview_filter.limit:
+                    continue  # only counted
+                n_shown += 1
+            out.write(SimulationTask.format_status_line(*row))
+        if overview_filter.is_paginated() and n_shown < n_matched:
+            out.write('-- %d to %d of %d matching simulations shown --\n' %
+                      (min(overview_filter.offset + 1, n_matched), overview_filter.offset + n_shown, n_matched))
+        out.flush()
+    except IOError as err:
+        if err.errno != errno.EPIPE:  # e.g. piped to ``head``
+            raise
+    return n_shown, n_matched
@@ -0,0 +1,126 @@
+"""
+Progress history of a simulation, i.e. the model time reached by the simulation as a function of the wall-clock time.
+
+The samples are kept in a fixed-size ring buffer (a flat array of doubles), so the memory used by a simulation does not
+grow with its run time. Consecutive samples are at least sample_interval seconds apart, so that the buffer covers a
+known period of time however often the simulation is probed; the most recent probe is kept separately.
+
+From the history, the progress rate (model time per wall-clock second), the estimated time to reach t_max (ETA), and
+a stall decision based on the collapse of the progress rate are derived.
+"""
+from array import array
+
+
+class ProgressHistory(object):
+
+    def __init__(self, capacity=64, sample_interval=60.0):
+        """
+        :param capacity: The maximum number of samples kept.
+        :param sample_interval: The minimum wall-clock time (in seconds) between two samples in the buffer.
+        """
+        self.capacity = capacity
+        self.sample_interval = sample_interval
+        self.buffer = array('d', [0.0] * (2 * capacity))  # wallclock_0, t_0, wallclock_1, t_1, ...
+        self.head = -1  # the index of the newest sample
+        self.n_samples = 0
+        self.latest = None  # the most recent (wallclock, t), possibly more recent than the newest sample
+
+    def reset(self):
+        self.head = -1
+        self.n_samples = 0
+        self.latest = None
+
+    def add(self, wallclock, t):
+        """
+        Record the model time t reached at the given wall-clock time.
+        """
+        if self.latest is not None and t < self.latest[1]:
+            self.reset()  # the model time went backwards, e.g. the simulation has been started from scratch again
+        self.latest = (wallclock, t)
+        if self.n_samples > 0 and wallclock - self.buffer[2 * self.head] < self.sample_interval:
+            return
+        self.head = (self.head + 1) % self.capacity
+        self.buffer[2 * self.head] = wallclock
+        self.buffer[2 * self.head + 1] = t
+        self.n_samples = min(self.n_samples + 1, self.capacity)
+
+    def samples(self):
+        """
+        :return: A list of the (wallclock, t) samples from the oldest to the most recent one.
+        """
+        ret = []
+        for i in range(self.n_samples):
+            index = (self.head - self.n_samples + 1 + i) % self.capacity
+            ret.append((self.buffer[2 * index], self.buffer[2 * index + 1]))
+        if self.latest is not None and (len(ret) == 0 or ret[-1] != self.latest):
+            ret.append(self.latest)
+        return ret
+
+    @staticmethod
+    def slope(sample_start, sample_end):
+        """
+        :return: The progress rate between two samples, or None if they are not separated in time.
+        """
+        if sample_end[0] <= sample_start[0]:
+            return None
+        return (sample_end[1] - sample_start[1]) / (sample_end[0] - sample_start[0])
+
+    def rate(self):
+        """
+        The progress rate averaged over the whole history, which smooths out the bursts of codes that report their
+        model time irregularly.
+
+        :return: The model time advanced per wall-clock second, or None if the history is too short.
+        """
+        samples = self.samples()
+        if len(samples) < 2:
+            return None
+        return ProgressHistory.slope(samples[0], samples[-1])
+
+    def eta(self, t_max):
+        """
+        :return: The estimated wall-clock time (in seconds) until the model time reaches t_max, or None if unknown.
+        """
+        rate = self.rate()
+        if rate is None or rate <= 0 or self.latest is None:
+            return None
+        return max(t_max - self.latest[1], 0.0) / rate
+
+    def is_stalled(self, window, ratio):
+        """
+        Decide whether the progress rate has collapsed: over (at least) the last `window` seconds, the rate is below
+        `ratio` times the rate before. The window is widened to three times the longest interval observed between
+        two advances of the model time, so that a code that reports its model time rarely is not considered stalled
+        between two reports.
+
+        :param window: The minimum wall-clock time (in seconds) over which the recent rate is measured.
+        :param ratio: The ratio of the recent rate to the earlier rate below which the simulation is stalled.
+        :return: True if the simulation is stalled. False if not, or if the history is too short to decide.
+        """
+        samples = self.samples()
+        if window <= 0 or len(samples) < 3:
+            return False
+        now = samples[-1][0]
+        # the longest interval between two advances of the model time (before the recent window)
+        max_gap = 0.0
+        last_advance = samples[0][0]
+        for i in range(1, len(samples)):
+            if samples[i][0] > now - window:
+                break
+            if samples[i][1] > samples[i - 1][1]:
+                max_gap = max(max_gap, samples[i][0] - last_advance)
+                last_advance = samples[i][0]
+        window = max(window, 3 * max_gap)
+        # the newest sample at least `window` seconds old marks the start of the recent window
+        start = None
+        for i in range(len(samples) - 1, -1, -1):
+            if samples[i][0] <= now - window:
+                start = i
+                break
+        if start is None or start == 0:
+            return False  # not enough history before the window
+        earlier_rate = ProgressHistory.slope(samples[0], samples[start])
+        recent_rate = ProgressHistory.slope(samples[start], samples[-1])
+        if earlier_rate is None or recent_rate is None or earlier_rate <= 0:
+            return False  # no progress to compare with (e.g. the simulation has not really started yet)
+        return recent_rate <= ratio * earlier_rate
@@ -0,0 +1,121 @@
+"""
+Registry of the SiMon modules, i.e. the module_*.py files defining the SimulationTask subclass of a simulation code.
+
+The modules are not imported when SiMon starts. The name of the simulation code of each module is read from its
+``__simulation__ = '<Code_name>'`` assignment, and cached in a manifest keyed by the modification time and size of the
+file, so that an unchanged module is not even read again. A module is imported only when a simulation with its
+Code_name is found.
+"""
+import os
+import re
+import sys
+import glob
+import json
+import threading
+
+
+class ModuleRegistry(object):
+
+    MODULE_PATTERN = 'module_*.py'
+    MANIFEST_FILE = '.simon_modules.json'
+    SIMULATION_RE = re.compile(r'''^__simulation__\s*=\s*['"]([^'"]+)['"]''', re.MULTILINE)
+
+    def __init__(self, search_dirs, manifest_file=None, logger=None):
+        """
+        :param search_dirs: The directories in which the modules are searched. If several modules declare the same
+                            code name, the one found in the last directory is used.
+        :param manifest_file: The path of the manifest caching the code names of the modules (optional).
+        :param logger: The logger of the daemon (optional).
+        """
+        self.search_dirs = []
+        for search_dir in search_dirs:
+            if search_dir not in self.search_dirs:
+                self.search_dirs.append(search_dir)
+        self.manifest_file = manifest_file
+        self.logger = logger
+        self.modules = dict()  # code name -> module name
+        self.classes = dict()  # code name -> the imported SimulationTask subclass
+        self.lock = threading.Lock()  # simulations may be created by several threads
+        self.n_read = 0  # number of module files read (not found in the manifest) in the last scan()
+
+    def load_manifest(self):
+        if self.manifest_file is None or not os.path.isfile(self.manifest_file):
+            return dict()
+        try:
+            with open(self.manifest_file, 'r') as f_manifest:
+                return json.load(f_manifest)
+        except (IOError, ValueError):
+            return dict()
+
+    def save_manifest(self, manifest):
+        if self.manifest_file is None:
+            return
+        tmp_fn = '%s.tmp.%d' % (self.manifest_file, os.getpid())
+        try:
+            with open(tmp_fn, 'w') as f_manifest:
+                json.dump(manifest, f_manifest)
+            os.rename(tmp_fn, self.manifest_file)
+        except (IOError, OSError) as err:
+            if self.logger is not None:
+                self.logger.warning('Module manifest %s cannot be saved: %s' % (self.manifest_file, err))
+
+    @staticmethod
+    def read_code_name(path):
+        """
+        :return: The code name declared by the module file, or None if the file is not a SiMon module.
+        """
+        try:
+            with open(path, 'r') as f_mod:
+                match = ModuleRegistry.SIMULATION_RE.search(f_mod.read())
+        except IOError:
+            return None
+        if match is None:
+            return None
+        return match.group(1)
+
+    def scan(self):
+        """
+        Find the modules in the search directories.
+
+        :return: A dict mapping the code names to the module names.
+        """
+        manifest = self.load_manifest()
+        new_manifest = dict()
+        self.modules = dict()
+        self.n_read = 0
+        for search_dir in self.search_dirs:
+            for path in sorted(glob.glob(os.path.join(search_dir, ModuleRegistry.MODULE_PATTERN))):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entry = manifest.get(path)
+                if entry is None or entry['mtime'] != st.st_mtime or entry['size'] != st.st_size:
+                    entry = {'mtime': st.st_mtime, 'size': st.st_size, 'code_name': ModuleRegistry.read_code_name(path)}
+                    self.n_read += 1
+                new_manifest[path] = entry
+                if entry['code_name'] is not None:
+                    self.modules[entry['code_name']] = os.path.splitext(os.path.basename(path))[0]
+        if new_manifest != manifest:
+            self.save_manifest(new_manifest)
+        return self.modules
+
+    def get_class(self, code_name):
+        """
+        Import the module of a simulation code (at the first call only).
+
+        :return: The SimulationTask subclass of the simulation code, or None if no module declares this code name.
+        """
+        sim_class = self.classes.get(code_name)
+        if sim_class is not None:
+            return sim_class
+        if code_name not in self.modules:
+            return None
+        with self.lock:
+            if code_name not in self.classes:
+                for search_dir in self.search_dirs:
+                    if search_dir not in sys.path:
+                        sys.path.append(search_dir)
+                mod = __import__(self.modules[code_name])
+                self.classes[code_name] = getattr(mod, code_name)
+            return self.classes[code_name]
@@ -0,0 +1,348 @@
+"""
+Priority scheduler of the simulations waiting for a slot to (re)start.
+
+The scheduler keeps the pending simulations (i.e. NEW simulations, and top-level STOP simulations to be restarted) in
+a heap that persists across scheduler cycles. Updating a simulation whose priority has not changed costs O(1), and
+O(log n) otherwise, so that the dispatch decisions remain cheap for very large campaigns.
+
+The order in which the pending simulations are dispatched is determined by the scheduling policy:
+
+- niceness: the lowest niceness first (same as UNIX), then the lowest ID
+- fifo: the simulations that became pending first are dispatched first
+- srt: the shortest remaining model time (t_max - t) first
+- fair: fair share between the groups of simulations (the ``Group`` option in the per-simulation SiMon.conf,
+  defaulting to the ``Code_name``). The group with the fewest running simulations is served first, and the simulations
+  within a group are ordered by niceness.
+
+The simulations are dispatched as long as they fit into the free capacity of the node (see ResourcePool). A pending
+simulation that does not fit is skipped, and the next one in priority order is tried (first-fit backfilling), so that
+the cores left over by a large simulation can still be used by smaller ones.
+"""
+import heapq
+import itertools
+
+from module_common import SimulationTask
+
+
+class IndexedHeap(object):
+    """
+    A binary heap of items with updatable keys. Updated or removed items are marked invalid and skipped when popped
+    (lazy deletion); the heap is compacted when the invalid entries dominate.
+    """
+
+    def __init__(self):
+        self.heap = []  # entries: [key, sequence number, item, valid]
+        self.entries = dict()  # item -> entry
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, item):
+        return item in self.entries
+
+    def key(self, item):
+        return self.entries[item][0]
+
+    def push(self, item, key):
+        """
+        Insert an item, or update its key if it is already in the heap.
+        """
+        entry = self.entries.get(item)
+        if entry is not None:
+            if entry[0] == key:
+                return
+            entry[3] = False
+        entry = [key, next(self.counter), item, True]
+        self.entries[item] = entry
+        heapq.heappush(self.heap, entry)
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.compact()
+
+    def remove(self, item):
+        entry = self.entries.pop(item, None)
+        if entry is not None:
+            entry[3] = False
+
+    def peek(self):
+        """
+        :return: The item with the smallest key (without removing it), or None if the heap is empty.
+        """
+        while len(self.heap) > 0 and not self.heap[0][3]:
+            heapq.heappop(self.heap)
+        if len(self.heap) == 0:
+            return None
+        return self.heap[0][2]
+
+    def pop(self):
+        """
+        :return: The item with the smallest key, or None if the heap is empty.
+        """
+        item = self.peek()
+        if item is not None:
+            heapq.heappop(self.heap)
+            del self.entries[item]
+        return item
+
+    def compact(self):
+        self.heap = [entry for entry in self.heap if entry[3]]
+        heapq.heapify(self.heap)
+
+
+class ResourcePool(object):
+    """
+    The capacity of the node (cores, memory and job slots) and its current usage. A capacity of 0 means unlimited.
+    """
+
+    def __init__(self, cores=0, memory=0.0, max_jobs=0):
+        """
+        :param cores: The number of CPU cores available to the simulations.
+        :param memory: The memory (in GB) available to the simulations.
+        :param max_jobs: The maximum number of simulations running at the same time.
+        """
+        self.cores = cores
+        self.memory = memory
+        self.max_jobs = max_jobs
+        self.used_cores = 0
+        self.used_memory = 0.0
+        self.n_jobs = 0
+
+    def exceeds_capacity(self, cores, memory):
+        """
+        :return: True if the requirements can never be satisfied, even on an idle node.
+        """
+        return (self.cores > 0 and cores > self.cores) or (self.memory > 0 and memory > self.memory)
+
+    def fits(self, cores, memory):
+        """
+        :return: True if a simulation with the given requirements can be started now.
+        """
+        if self.max_jobs > 0 and self.n_jobs >= self.max_jobs:
+            return False
+        if self.cores > 0 and self.used_cores + cores > self.cores:
+            return False
+        if self.memory > 0 and self.used_memory + memory > self.memory:
+            return False
+        return True
+
+    def is_full(self):
+        """
+        :return: True if no simulation (not even one requiring no resources) can be started any more.
+        """
+        return (self.max_jobs > 0 and self.n_jobs >= self.max_jobs) or (self.cores > 0 and self.used_cores >= self.cores)
+
+    def allocate(self, cores, memory):
+        self.used_cores += cores
+        self.used_memory += memory
+        self.n_jobs += 1
+
+    def __repr__(self):
+        ret = 'jobs: %d/%s, cores: %d/%s, memory: %g/%s GB' % \
+              (self.n_jobs, self.max_jobs if self.max_jobs > 0 else '-',
+               self.used_cores, self.cores if self.cores > 0 else '-',
+               self.used_memory, ('%g' % self.memory) if self.memory > 0 else '-')
+        return ret
+
+
+class TaskScheduler(object):
+
+    POLICIES = ['niceness', 'fifo', 'srt', 'fair']
+
+    def __init__(self, policy='niceness'):
+        """
+        :param policy: The scheduling policy, one of TaskScheduler.POLICIES.
+        """
+        if policy not in TaskScheduler.POLICIES:
+            raise ValueError('Unknown scheduling policy %s. Valid policies: %s' %
+                             (policy, ', '.join(TaskScheduler.POLICIES)))
+        self.policy = policy
+        self.queues = dict()  # group -> IndexedHeap of the IDs of the pending simulations
+        self.pending_group = dict()  # ID of a pending simulation -> its group
+        self.running_group = dict()  # ID of a running simulation -> its group
+        self.n_running = dict()  # group -> number of running simulations
+        self.groups = IndexedHeap()  # fair share: the groups with pending simulations, keyed by their running count
+        self.enqueued = dict()  # ID of a pending simulation -> sequence number of its arrival (fifo)
+        self.counter = itertools.count()
+
+    @staticmethod
+    def is_pending(sim, leaf=None):
+        """
+        :param leaf: The simulation that is restarted for a top-level STOP simulation, i.e. the leaf of its restart
+                     tree (default: the simulation itself).
+        :return: True if the simulation is waiting for a slot to start (NEW) or to be restarted (top-level STOP). A
+                 simulation whose restart is blocked by a STOP or ERROR file (see sim_restart()) is not pending, so
+                 that it does not take the slot of another simulation.
+        """
+        if sim.id <= 0:
+            return False
+        if sim.status == SimulationTask.STATUS_NEW:
+            return True
+        if sim.status == SimulationTask.STATUS_STOP and sim.level == 1:
+            if leaf is None:
+                leaf = sim
+            return not SimulationTask.has_stop_marker(leaf.full_dir)
+        return False
+
+    @staticmethod
+    def is_running(sim):
+        """
+        :return: True if the simulation occupies a slot, i.e. its own process is running (it is not an ancestor of
+                 a running restart).
+        """
+        return sim.id > 0 and sim.status == SimulationTask.STATUS_RUN and sim.cid == -1
+
+    def group_of(self, sim):
+        """
+        :return: The fair-share group of the simulation (None for the other policies, which use a single queue).
+        """
+        if self.policy != 'fair':
+            return None
+        if sim.config is not None:
+            for option in ['Group', 'Code_name']:
+                if sim.config.has_option('Simulation', option):
+                    return sim.config.get('Simulation', option)
+        return sim.name
+
+    def priority(self, sim):
+        """
+        :return: The sort key of a pending simulation according to the policy (lower keys are dispatched first).
+        """
+        if self.policy == 'fifo':
+            return self.enqueued[sim.id], sim.id
+        elif self.policy == 'srt':
+            return sim.t_max - sim.t, sim.niceness, sim.id
+        else:
+            return sim.niceness, sim.id
+
+    def update(self, sim, leaf=None):
+        """
+        Synchronize the scheduler with the current status of a simulation.
+
+        :param leaf: The leaf of the restart tree of the simulation (see is_pending()).
+        """
+        sim_id = sim.id
+        group = self.group_of(sim)
+        if TaskScheduler.is_pending(sim, leaf):
+            if sim_id in self.pending_group and self.pending_group[sim_id] != group:
+                self._dequeue(sim_id)
+            if sim_id not in self.enqueued:
+                self.enqueued[sim_id] = next(self.counter)
+            if group not in self.queues:
+                self.queues[group] = IndexedHeap()
+            self.queues[group].push(sim_id, self.priority(sim))
+            self.pending_group[sim_id] = group
+            self._update_group(group)
+        else:
+            self._dequeue(sim_id)
+        self._set_running(sim_id, TaskScheduler.is_running(sim), group)
+
+    def remove(self, sim_id):
+        """
+        Forget a simulation (e.g. its directory has been deleted).
+        """
+        self._dequeue(sim_id)
+        self._set_running(sim_id, False)
+
+    def retain(self, sim_ids):
+        """
+        Forget all the simulations whose IDs are not in sim_ids.
+        """
+        for sim_id in set(self.pending_group.keys()) | set(self.running_group.keys()):
+            if sim_id not in sim_ids:
+                self.remove(sim_id)
+
+    def pop(self, fits=None):
+        """
+        Take the next simulation to dispatch out of the queue. It is counted as running until the next update().
+
+        :param fits: A function telling whether the simulation with the given ID fits into the free resources
+                     (optional). The simulations that do not fit are skipped, and stay in the queue.
+        :return: The ID of the simulation, or None if there is no pending simulation (that fits).
+        """
+        if self.policy == 'fair':
+            # try the groups in the order of their fair share
+            skipped_groups = []
+            sim_id = None
+            while sim_id is None:
+                group = self.groups.peek()
+                if group is None:
+                    break
+                key = self.groups.key(group)
+                sim_id = TaskScheduler.pop_first_fit(self.queues[group], fits)
+                if sim_id is None:
+                    self.groups.pop()
+                    skipped_groups.append((group, key))
+            for skipped_group, key in skipped_groups:
+                self.groups.push(skipped_group, key)
+        else:
+            group = None
+            queue = self.queues.get(group)
+            if queue is None:
+                return None
+            sim_id = TaskScheduler.pop_first_fit(queue, fits)
+        if sim_id is None:
+            return None
+        del self.pending_group[sim_id]
+        self.enqueued.pop(sim_id, None)
+        self._set_running(sim_id, True, group)
+        return sim_id
+
+    @staticmethod
+    def pop_first_fit(queue, fits=None):
+        """
+        Pop the first item in priority order that fits. The skipped items are put back with their keys.
+
+        :return: The item, or None if no item fits.
+        """
+        skipped = []
+        item = queue.peek()
+        while item is not None:
+            if fits is None or fits(item):
+                break
+            skipped.append((item, queue.key(item)))
+            queue.pop()
+            item = queue.peek()
+        if item is not None:
+            queue.pop()
+        for skipped_item, key in skipped:
+            queue.push(skipped_item, key)
+        return item
+
+    def n_pending(self):
+        """
+        :return: The number of simulations waiting for a slot.
+        """
+        return len(self.pending_group)
+
+    def _dequeue(self, sim_id):
+        self.enqueued.pop(sim_id, None)
+        if sim_id not in self.pending_group:
+            return
+        group = self.pending_group.pop(sim_id)
+        self.queues[group].remove(sim_id)
+        self._update_group(group)
+
+    def _set_running(self, sim_id, running, group=None):
+        if sim_id in self.running_group:
+            old_group = self.running_group[sim_id]
+            if running and old_group == group:
+                return
+            del self.running_group[sim_id]
+            self.n_running[old_group] -= 1
+            self._update_group(old_group)
+        if running:
+            self.running_group[sim_id] = group
+            self.n_running[group] = self.n_running.get(group, 0) + 1
+            self._update_group(group)
+
+    def _update_group(self, group):
+        """
+        Re-key a group in the fair-share heap after its number of pending or running simulations changed.
+        """
+        if self.policy != 'fair':
+            return
+        queue = self.queues.get(group)
+        if queue is None or len(queue) == 0:
+            self.groups.remove(group)
+        else:
+            self.groups.push(group, (self.n_running.get(group, 0), group))
@@ -0,0 +1,220 @@
+"""
+Cooperative sharding of the simulation root directory between several daemons.
+
+Several SiMon daemons (e.g. on different nodes sharing the file system) can manage the same Root_dir. The top-level
+simulation directories are distributed into a fixed number of buckets by a hash of their names, and each daemon
+claims buckets through lease files on the shared file system. A daemon only scans and schedules the simulations in
+the buckets it holds.
+
+- Every daemon renews its leases and its heartbeat file once per scheduler cycle. A lease (or heartbeat) that has not
+  been renewed for lease_time seconds is expired: the daemon is considered dead, and its buckets are claimed by the
+  other daemons.
+- Every daemon aims at holding ceil(n_buckets / n_live_daemons) buckets: it claims free or expired buckets if it holds
+  fewer, and releases buckets if it holds more (e.g. when another daemon joins). A bucket with running simulations is
+  not released, since the processes of a simulation can only be checked by the daemon of the host on which they run.
+- A lease is created atomically with O_EXCL. An expired lease is taken over by renaming it away first, so that only
+  one daemon can take it over.
+
+The lease time must be much longer than the interval between two scheduler cycles (Daemon_sleep_time).
+"""
+import os
+import time
+import errno
+import socket
+import zlib
+
+
+class ShardLeases(object):
+
+    LEASE_DIR = '.simon_shards'  # the directory of the leases and the heartbeats, in the simulation root directory
+
+    def __init__(self, root_dir, n_buckets=64, lease_time=900.0, name=None, logger=None):
+        """
+        :param root_dir: The simulation root directory, shared by the daemons.
+        :param n_buckets: The number of buckets into which the top-level simulation directories are distributed.
+        :param lease_time: The time (in seconds) after which a lease or a heartbeat that has not been renewed expires.
+        :param name: The name of this daemon, unique among the daemons sharing the root directory (default: the host
+                     name, so that a daemon restarted on the same host gets its buckets back).
+        :param logger: The logger of the daemon (optional).
+        """
+        self.root_dir = root_dir
+        self.n_buckets = n_buckets
+        self.lease_time = lease_time
+        if name is None:
+            name = socket.gethostname()
+        self.name = name
+        self.logger = logger
+        self.lease_dir = os.path.join(root_dir, ShardLeases.LEASE_DIR)
+        self.owned = set()  # the buckets held by this daemon
+        self.n_live = 1  # the number of live daemons, as seen in the last update
+        for sub_dir in ['leases', 'daemons']:
+            try:
+                os.makedirs(os.path.join(self.lease_dir, sub_dir))
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+
+    def bucket_of(self, name):
+        """
+        :return: The bucket of a top-level simulation directory (stable across the daemons and their restarts).
+        """
+        if not isinstance(name, str):
+            name = name.encode('utf-8')  # a unicode name; the names listed from the file system are bytes
+        return (zlib.crc32(name) & 0xffffffff) % self.n_buckets
+
+    def lease_path(self, bucket):
+        return os.path.join(self.lease_dir, 'leases', 'bucket_%04d.lease' % bucket)
+
+    def is_expired(self, path, now=None):
+        if now is None:
+            now = time.time()
+        try:
+            return now - os.stat(path).st_mtime > self.lease_time
+        except OSError:
+            return True
+
+    @staticmethod
+    def read_owner(path):
+        try:
+            with open(path, 'r') as f_lease:
+                return f_lease.readline().strip()
+        except IOError:
+            return None
+
+    def heartbeat(self):
+        """
+        Renew the heartbeat of this daemon, and count the live daemons. The heartbeats of the dead daemons are removed.
+
+        :return: The number of live daemons (including this one).
+        """
+        daemons_dir = os.path.join(self.lease_dir, 'daemons')
+        with open(os.path.join(daemons_dir, self.name), 'w') as f_heartbeat:
+            f_heartbeat.write('%f\n' % time.time())
+        now = time.time()
+        n_live = 0
+        for fn in os.listdir(daemons_dir):
+            path = os.path.join(daemons_dir, fn)
+            try:
+                age = now - os.stat(path).st_mtime
+            except OSError:
+                continue
+            if fn == self.name or age <= self.lease_time:
+                n_live += 1
+            elif age > 10 * self.lease_time:
+                try:
+                    os.remove(path)  # long dead
+                except OSError:
+                    pass
+        self.n_live = max(1, n_live)
+        return self.n_live
+
+    def claim(self, bucket):
+        """
+        Try to claim a free or expired bucket.
+
+        :return: True if the bucket is now held by this daemon.
+        """
+        path = self.lease_path(bucket)
+        for attempt in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+                if ShardLeases.read_owner(path) == self.name:
+                    os.utime(path, None)  # e.g. held before a restart of this daemon
+                    return True
+                if attempt > 0 or not self.is_expired(path):
+                    return False
+                # take the expired lease over: only one daemon can rename it away
+                stale_path = '%s.%s.stale' % (path, self.name)
+                try:
+                    os.rename(path, stale_path)
+                except OSError:
+                    return False
+                if not self.is_expired(stale_path):
+                    # renewed by its owner in the meantime: put it back
+                    try:
+                        os.link(stale_path, path)
+                    except OSError:
+                        pass
+                    os.remove(stale_path)
+                    return False
+                if self.logger is not None:
+                    self.logger.info('Shard: bucket %d taken over from %s' %
+                                     (bucket, ShardLeases.read_owner(stale_path) or 'an expired daemon'))
+                os.remove(stale_path)
+                continue
+            with os.fdopen(fd, 'w') as f_lease:
+                f_lease.write('%s\n' % self.name)
+            return True
+        return False
+
+    def renew(self, bucket):
+        """
+        :return: True if the lease is still held by this daemon (and has been renewed).
+        """
+        path = self.lease_path(bucket)
+        if ShardLeases.read_owner(path) != self.name:
+            return False
+        try:
+            os.utime(path, None)
+        except OSError:
+            return False  # expired and taken over by another daemon since it has been read
+        return True
+
+    def release(self, bucket):
+        path = self.lease_path(bucket)
+        if ShardLeases.read_owner(path) == self.name:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.owned.discard(bucket)
+
+    def update(self, busy_dirs=()):
+        """
+        Renew the leases and the heartbeat of this daemon, and claim or release buckets to hold a fair share of them.
+        To be called once per scheduler cycle.
+
+        :param busy_dirs: The names of the top-level directories with running simulations (their buckets are kept).
+        :return: The set of the buckets held by this daemon.
+        """
+        n_live = self.heartbeat()
+        for bucket in sorted(self.owned):
+            if not self.renew(bucket):
+                self.owned.discard(bucket)
+                if self.logger is not None:
+                    self.logger.warning('Shard: the lease of bucket %d has been lost (expired)' % bucket)
+        target = -(-self.n_buckets // n_live)  # ceil
+        busy = set([self.bucket_of(name) for name in busy_dirs])
+        for bucket in sorted(self.owned, reverse=True):
+            if len(self.owned) <= target:
+                break
+            if bucket not in busy:
+                self.release(bucket)
+        if len(self.owned) < target:
+            # start at a different bucket on every daemon, so that they do not compete for the same buckets
+            start = self.bucket_of(self.name)
+            for i in range(self.n_buckets):
+                bucket = (start + i) % self.n_buckets
+                if bucket not in self.owned and self.claim(bucket):
+                    self.owned.add(bucket)
+                    if len(self.owned) >= target:
+                        break
+        return self.owned
+
+    def select(self, names):
+        """
+        :param names: The names of the top-level directories in the simulation root directory.
+        :return: The names of the directories in the buckets held by this daemon.
+        """
+        return [name for name in names if name != ShardLeases.LEASE_DIR and self.bucket_of(name) in self.owned]
+
+    def release_all(self):
+        for bucket in list(self.owned):
+            self.release(bucket)
+
+    def __repr__(self):
+        return '%s holds %d of %d buckets (%d live daemons)' % (self.name, len(self.owned), self.n_buckets,
+                                                                  self.n_live)
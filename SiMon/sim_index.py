@@ -0,0 +1,216 @@
+"""
+Persistent index of the simulation directory tree.
+
+Walking the whole simulation root directory on every scan is expensive on shared file systems with many simulations.
+The index remembers, for every directory below the root, its modification time, its sub-directories and the ID
+assigned to it. On a rescan, only the directories whose modification time changed are listed again; all the others
+reuse the cached list of sub-directories. Since the ID of a directory is stored in the index, the IDs shown to the
+user remain stable across scans.
+
+By default, the index file is kept in a hidden directory of the root directory that is not indexed itself, so that
+saving the index does not change the modification time of an indexed directory (which would list it again on the next
+scan). The index is only written when the directory structure changes.
+"""
+import os
+import stat
+import time
+import json
+
+
+class SimulationIndex(object):
+
+    INDEX_DIR = '.simon_index'  # the directory of the index in the simulation root directory (not indexed)
+    INDEX_FILE = os.path.join(INDEX_DIR, 'index.json')  # the default path of the index, relative to the root directory
+    INDEX_VERSION = 1
+
+    def __init__(self, root_dir, index_file=None, logger=None):
+        """
+        :param root_dir: The simulation data root directory (absolute path).
+        :param index_file: The path of the index file. Default: <root_dir>/.simon_index/index.json
+        :param logger: The logger of the daemon (optional).
+        """
+        self.root_dir = root_dir
+        if index_file is None:
+            index_file = os.path.join(root_dir, SimulationIndex.INDEX_FILE)
+        self.index_file = index_file
+        self.logger = logger
+        self.entries = dict()  # path -> {'id': int, 'parent': path, 'mtime': float, 'subdirs': [names]}
+        self.max_id = 0
+        self.n_rescanned = 0  # number of directories listed in the last refresh()
+        self.n_visited = 0  # number of directories visited in the last refresh()
+        self.modified = False
+        # a function selecting the top-level directories to be indexed among the names of all of them, e.g. the shard
+        # of this daemon (see shard.py); None: all directories
+        self.select_top_level = None
+
+    def load(self):
+        """
+        Load the index from the disk. A missing or corrupted index is silently replaced by an empty one.
+
+        :return: The number of directories in the loaded index.
+        """
+        self.entries = dict()
+        self.max_id = 0
+        if os.path.isfile(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f_index:
+                    data = json.load(f_index)
+                if data.get('version') == SimulationIndex.INDEX_VERSION and data.get('root') == self.root_dir:
+                    self.entries = data['entries']
+                    self.max_id = data['max_id']
+            except (IOError, ValueError, KeyError) as err:
+                if self.logger is not None:
+                    self.logger.warning('Simulation index %s cannot be loaded (%s). Rebuilding...' %
+                                        (self.index_file, err))
+                self.entries = dict()
+                self.max_id = 0
+        self.modified = False
+        return len(self.entries)
+
+    def save(self):
+        """
+        Write the index to the disk atomically, if it has been modified.
+
+        :return: Return 0 if succeed, -1 if failed, 1 if there is nothing to save.
+        """
+        if not self.modified:
+            return 1
+        data = {'version': SimulationIndex.INDEX_VERSION,
+                'root': self.root_dir,
+                'max_id': self.max_id,
+                'entries': self.entries}
+        tmp_fn = '%s.tmp.%d' % (self.index_file, os.getpid())
+        try:
+            index_dir = os.path.dirname(self.index_file)
+            if not os.path.isdir(index_dir):
+                os.makedirs(index_dir)
+            with open(tmp_fn, 'w') as f_index:
+                json.dump(data, f_index)
+            os.rename(tmp_fn, self.index_file)
+        except (IOError, OSError) as err:
+            if self.logger is not None:
+                self.logger.warning('Simulation index %s cannot be saved: %s' % (self.index_file, err))
+            return -1
+        self.modified = False
+        return 0
+
+    @staticmethod
+    def list_subdirs(path):
+        """
+        List the sub-directories of a directory, including the symbolic links to directories (same as os.path.isdir).
+
+        :return: A sorted list of the names of the sub-directories.
+        """
+        subdirs = []
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return subdirs
+        for name in names:
+            try:
+                st = os.stat(os.path.join(path, name))
+            except OSError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                subdirs.append(name)
+        return sorted(subdirs)
+
+    def refresh(self):
+        """
+        Bring the index up-to-date with the file system. Every known directory is stat'ed, but only the directories
+        with a changed modification time (i.e. entries added or removed) are listed again. Directories that no longer
+        exist are dropped from the index, and new directories are assigned new IDs.
+
+        :return: The number of directories that have been listed again.
+        """
+        self.n_rescanned = 0
+        self.n_visited = 0
+        scan_time = time.time()
+        visited = set()
+        stack = [(self.root_dir, None)]
+        while len(stack) > 0:
+            path, parent = stack.pop()
+            try:
+                st = os.lstat(path)
+                is_link = stat.S_ISLNK(st.st_mode)
+                if is_link:
+                    st = os.stat(path)
+            except OSError:
+                continue
+            mtime = st.st_mtime
+            self.n_visited += 1
+            visited.add(path)
+            entry = self.entries.get(path)
+            if entry is None:
+                if path == self.root_dir:
+                    entry_id = 0
+                else:
+                    self.max_id += 1
+                    entry_id = self.max_id
+                entry = {'id': entry_id, 'parent': parent, 'mtime': None, 'subdirs': []}
+                self.entries[path] = entry
+                self.modified = True
+            if entry['mtime'] != mtime:
+                if is_link:
+                    subdirs = []  # a linked simulation directory is registered, but not descended (same as os.path.walk)
+                else:
+                    subdirs = SimulationIndex.list_subdirs(path)
+                if path == self.root_dir:
+                    subdirs = [name for name in subdirs if name != SimulationIndex.INDEX_DIR]
+                # A directory modified within the resolution of the file system timestamps may still change without
+                # changing its mtime, so it is marked dirty and will be listed again during the next refresh.
+                if scan_time - mtime < 2.0:
+                    entry['mtime'] = None
+                else:
+                    entry['mtime'] = mtime
+                self.n_rescanned += 1
+                # a changed mtime alone (e.g. a new output file) is kept in memory, the index is only written again if
+                # the directory structure changed
+                if subdirs != entry['subdirs']:
+                    entry['subdirs'] = subdirs
+                    self.modified = True
+            # depth-first, visiting the sub-directories in sorted order
+            for name in reversed(self.get_subdirs(path)):
+                stack.append((os.path.join(path, name), path))
+
+        # purge the directories that are gone
+        for path in list(self.entries.keys()):
+            if path not in visited:
+                del self.entries[path]
+                self.modified = True
+        return self.n_rescanned
+
+    def get_subdirs(self, path):
+        """
+        :return: The names of the indexed sub-directories of a directory (at the top level, the selected ones only).
+        """
+        subdirs = self.entries[path]['subdirs']
+        if path == self.root_dir and self.select_top_level is not None:
+            subdirs = self.select_top_level(subdirs)
+        return subdirs
+
+    def get_id(self, path):
+        """
+        :return: The ID assigned to the directory, or -1 if the directory is not indexed.
+        """
+        entry = self.entries.get(path)
+        if entry is None:
+            return -1
+        return entry['id']
+
+    def walk(self):
+        """
+        Traverse the indexed directory tree from the root (top-down, same order as os.path.walk with sorted names).
+
+        :return: A generator of (base_dir, subdir_names) tuples.
+        """
+        stack = [self.root_dir]
+        while len(stack) > 0:
+            path = stack.pop()
+            entry = self.entries.get(path)
+            if entry is None:
+                continue
+            subdirs = self.get_subdirs(path)
+            yield path, subdirs
+            for name in reversed(subdirs):
+                stack.append(os.path.join(path, name))
@@ -3,17 +3,33 @@ import os.path
 import sys
 import time
 import logging
+import datetime
 import glob
+import json
+import socket
 
 from utilities import Utilities
-import numpy as np
 try:
     import configparser as cp  # Python 3 only
 except ImportError:
     import ConfigParser as cp  # Python 2 only
 from fnmatch import fnmatch
-from daemon import runner
 from module_common import SimulationTask
+from sim_index import SimulationIndex
+from watcher import TreeWatcher
+from scheduler import TaskScheduler, ResourcePool
+from checkpoint import CheckpointArchiver
+from executor import LocalExecutor, BatchExecutor
+from shard import ShardLeases
+from registry import ModuleRegistry
+from metrics import create_daemon_metrics
+from cycle_profiler import CycleProfiler
+from overview import OverviewFilter, write_overview
+from control import ControlServer, ControlClient
+try:
+    from task_table import TaskTable
+except ImportError:  # NumPy not installed
+    TaskTable = None
 
 __simon_dir__ = os.path.dirname(os.path.abspath(__file__))
 __user_shell_dir__ = os.getcwd()
@@ -23,6 +39,9 @@ class SiMon(object):
     Main code of Simulation Monitor (SiMon).
     """
 
+    # the actions of the interactive mode carried out by the daemon if it is running
+    DAEMON_ACTIONS = {'n': 'start', 'r': 'restart', 't': 'stop', 'k': 'kill'}
+
     def __init__(self, pidfile=None, stdin='/dev/tty', stdout='/dev/tty', stderr='/dev/tty',
                  mode='interactive', cwd=os.getcwd(), config_file='SiMon.conf'):
         """
@@ -30,6 +49,7 @@ class SiMon(object):
         """
 
         # Only needed in interactive mode
+        simon_dir = cwd
         conf_path = os.path.join(cwd, config_file)
         self.config = self.parse_config_file(conf_path)
         
@@ -59,11 +79,11 @@ class SiMon(object):
                 print('Exiting...')
             sys.exit(-1)
 
-        self.module_dict = self.register_modules()
 
         self.selected_inst = []  # A list of the IDs of selected simulation instances
         self.sim_inst_dict = dict()  # the container of all SimulationTask objects (ID to object mapping)
         self.sim_inst_parent_dict = dict()  # given the current path, find out the instance of the parent
+        self.task_table = None  # columnar mirror of the simulation tree, updated at the end of every cycle
 
         # TODO: create subclass instance according to the config file
         self.sim_tree = SimulationTask(0, 'root', cwd, SimulationTask.STATUS_NEW)
@@ -77,12 +97,176 @@ class SiMon(object):
         self.inst_id = 0
         self.logger = None
         self.max_concurrent_jobs = 2
+        self.module_registry = None
+        self.module_dict = self.register_modules()
 
         if self.config.has_option('SiMon', 'Max_concurrent_jobs'):
             self.max_concurrent_jobs = self.config.getint('SiMon', 'Max_concurrent_jobs')
 
+        # the capacity of the node shared by the simulations (0: unlimited)
+        self.node_cores = 0
+        self.node_memory = 0.0
+        if self.config.has_option('SiMon', 'Node_cores'):
+            self.node_cores = self.config.getint('SiMon', 'Node_cores')
+        if self.config.has_option('SiMon', 'Node_memory'):
+            self.node_memory = self.config.getfloat('SiMon', 'Node_memory')
+
+        # the order in which the pending simulations are started
+        scheduling_policy = 'niceness'
+        if self.config.has_option('SiMon', 'Scheduling_policy'):
+            scheduling_policy = self.config.get('SiMon', 'Scheduling_policy').strip().lower()
+        try:
+            self.scheduler = TaskScheduler(scheduling_policy)
+        except ValueError as err:
+            print('Item Scheduling_policy in configuration file SiMon.conf is invalid: %s. Exiting...' % err)
+            sys.exit(-1)
+
+        # checkpoint backups: made by a pool of background threads (0: in the scheduler loop), optionally compressed
+        checkpoint_workers = 0
+        checkpoint_compression = None
+        if self.config.has_option('SiMon', 'Checkpoint_workers'):
+            checkpoint_workers = self.config.getint('SiMon', 'Checkpoint_workers')
+        if self.config.has_option('SiMon', 'Checkpoint_compression'):
+            checkpoint_compression = self.config.get('SiMon', 'Checkpoint_compression').strip().lower()
+            if checkpoint_compression == 'none':
+                checkpoint_compression = None
+        try:
+            SimulationTask.checkpoint_archiver = CheckpointArchiver(checkpoint_workers, checkpoint_compression)
+        except ValueError as err:
+            print('Item Checkpoint_compression in configuration file SiMon.conf is invalid: %s. Exiting...' % err)
+            sys.exit(-1)
+
+        # the backend launching the simulations: processes on this host ('local'), or jobs of a batch system ('batch')
+        executor = 'local'
+        if self.config.has_option('SiMon', 'Executor'):
+            executor = self.config.get('SiMon', 'Executor').strip().lower()
+        if executor == 'local':
+            SimulationTask.executor = LocalExecutor(SimulationTask.supervisor)
+        elif executor == 'batch':
+            batch_options = dict()
+            for option, key in [('Batch_submit_command', 'submit_command'), ('Batch_status_command', 'status_command'),
+                                ('Batch_cancel_command', 'cancel_command'), ('Batch_job_id_pattern', 'job_id_pattern')]:
+                if self.config.has_option('SiMon', option) and self.config.get('SiMon', option).strip() != '':
+                    batch_options[key] = self.config.get('SiMon', option).strip()
+            SimulationTask.executor = BatchExecutor(**batch_options)
+        else:
+            print('Item Executor in configuration file SiMon.conf is invalid: %s (valid: local, batch). Exiting...'
+                  % executor)
+            sys.exit(-1)
+
+        # number of worker threads probing the simulations in parallel (1: probe in the main thread)
+        self.probe_workers = 1
+        self.probe_pool = None
+        if self.config.has_option('SiMon', 'Probe_workers'):
+            self.probe_workers = self.config.getint('SiMon', 'Probe_workers')
+
+        # persistent index of the simulation directories, so that a rescan only lists the directories that changed
+        index_file = None
+        if self.config.has_option('SiMon', 'Index_file'):
+            index_file = self.config.get('SiMon', 'Index_file')
+            if not os.path.isabs(index_file):
+                index_file = os.path.join(cwd, index_file)
+        self.sim_index = SimulationIndex(cwd, index_file=index_file)
+        self.sim_index.load()
+
+        # sharding of Root_dir between several daemons (e.g. on several nodes): the top-level simulation directories
+        # are distributed into buckets, leased by the daemons (0: no sharding). Only enabled in the daemon.
+        self.shard_buckets = 0
+        self.shard_lease_time = 900.0
+        self.shard = None
+        if self.config.has_option('SiMon', 'Shard_buckets'):
+            self.shard_buckets = self.config.getint('SiMon', 'Shard_buckets')
+        if self.config.has_option('SiMon', 'Shard_lease_time'):
+            self.shard_lease_time = self.config.getfloat('SiMon', 'Shard_lease_time')
+
+        # optional SQLite store of the simulation states, opened at the first use (i.e. after the daemon has been forked)
+        self.state_db = None
+        self.state_store = None
+        if self.config.has_option('SiMon', 'State_db'):
+            state_db = self.config.get('SiMon', 'State_db').strip()
+            if state_db != '' and state_db.lower() != 'none':
+                if not os.path.isabs(state_db):
+                    state_db = os.path.join(cwd, state_db)
+                # with sharding, the simulation IDs are only unique within a daemon: every daemon has its own store
+                self.state_db = daemon_file(simon_dir, state_db)
+
+        # metrics of the daemon in the Prometheus text format, written to a file and/or served on a local port
+        self.metrics = create_daemon_metrics()
+        self.metrics_file = None
+        self.metrics_port = 0
+        if self.config.has_option('SiMon', 'Metrics_file'):
+            metrics_file = self.config.get('SiMon', 'Metrics_file').strip()
+            if metrics_file != '' and metrics_file.lower() != 'none':
+                if not os.path.isabs(metrics_file):
+                    metrics_file = os.path.join(cwd, metrics_file)
+                self.metrics_file = daemon_file(simon_dir, metrics_file)
+        if self.config.has_option('SiMon', 'Metrics_port'):
+            self.metrics_port = self.config.getint('SiMon', 'Metrics_port')
+
+        # Unix-domain socket of the control API of the daemon, used by the CLI when the daemon is running
+        self.control_socket = daemon_file(simon_dir, 'SiMon_control.sock')
+        if self.config.has_option('SiMon', 'Control_socket'):
+            control_socket = self.config.get('SiMon', 'Control_socket').strip()
+            if control_socket == '' or control_socket.lower() == 'none':
+                self.control_socket = None
+            elif os.path.isabs(control_socket):
+                self.control_socket = control_socket
+            else:
+                self.control_socket = daemon_file(simon_dir, control_socket)
+        self.control = None  # the ControlServer of the daemon
+        self.control_client = None  # the ControlClient of the interactive mode, if the daemon is running
+
+        # number of scheduler cycles profiled when the daemon starts (0: no profiling)
+        self.profile_cycles = 0
+        if self.config.has_option('SiMon', 'Profile_cycles'):
+            self.profile_cycles = self.config.getint('SiMon', 'Profile_cycles')
+
+        # maximum number of parsed config files kept in memory between the scans (0: always parse the files)
+        if self.config.has_option('SiMon', 'Config_cache_size'):
+            SimulationTask.config_cache.max_entries = self.config.getint('SiMon', 'Config_cache_size')
+
         os.chdir(cwd)
 
+    @staticmethod
+    def shard_daemon_name(config):
+        """
+        :return: The name of this daemon among the daemons sharing Root_dir (Shard_name, by default the host name), or
+                 None if sharding is disabled.
+        """
+        if config is None or not config.has_option('SiMon', 'Shard_buckets') or \
+                config.getint('SiMon', 'Shard_buckets') <= 0:
+            return None
+        if config.has_option('SiMon', 'Shard_name') and config.get('SiMon', 'Shard_name').strip() != '':
+            return config.get('SiMon', 'Shard_name').strip()
+        return socket.gethostname()
+
+    def enable_sharding(self):
+        """
+        Join the daemons sharing Root_dir. From now on, only the simulations in the buckets leased by this daemon are
+        scanned and scheduled. The simulation index of this daemon is kept in its own file.
+        """
+        name = SiMon.shard_daemon_name(self.config)
+        self.shard = ShardLeases(self.cwd, n_buckets=self.shard_buckets, lease_time=self.shard_lease_time, name=name,
+                                 logger=self.logger)
+        base, ext = os.path.splitext(self.sim_index.index_file)
+        self.sim_index = SimulationIndex(self.cwd, index_file='%s.%s%s' % (base, name, ext), logger=self.logger)
+        self.sim_index.load()
+        self.sim_index.select_top_level = self.shard.select
+        if self.logger is not None:
+            self.logger.info('Sharding enabled: daemon %s, %d buckets, lease time %g sec' %
+                             (name, self.shard_buckets, self.shard_lease_time))
+
+    def update_shard(self):
+        """
+        Renew the leases of this daemon, and claim or release buckets (called before every full scan).
+        """
+        busy_dirs = [sim.name for sim in self.sim_tree.restarts
+                     if sim.status in [SimulationTask.STATUS_RUN, SimulationTask.STATUS_STALL]]
+        n_owned = len(self.shard.owned)
+        self.shard.update(busy_dirs)
+        if self.logger is not None and len(self.shard.owned) != n_owned:
+            self.logger.info('Shard: %s' % self.shard)
+
     @staticmethod
     def parse_config_file(config_file):
         """
@@ -97,33 +281,18 @@ class SiMon(object):
         :return: return 0 if succeed, -1 if failed (file not exist, and cannot be created). If the file does not exist
         but a new file with default values is created, the method returns 1.
         """
-        conf = cp.ConfigParser()
-        if os.path.isfile(config_file):
-            conf.read(config_file)
-            return conf
-        else:
-            return None
+        return SimulationTask.config_cache.parse(config_file)  # not read again if unchanged, None if not found
 
-    @staticmethod
-    def register_modules():
+    def register_modules(self):
         """
-        Register modules
+        Register modules. The modules are found in the SiMon directory and in the current directory, but only imported
+        when a simulation of their code is found.
         :return: A dict-like mapping between the name of the code and the filename of the module.
         """
-        mod_dict = dict()
-        module_candidates = glob.glob(os.path.join(__simon_dir__, 'module_*.py'))
-        module_cwd = glob.glob(os.path.join(__user_shell_dir__, 'module_*.py'))  # load the modules also from cwd
-        for m_cwd in module_cwd:
-            module_candidates.append(m_cwd)
-        for mod_name in module_candidates:
-            sys.path.append(__simon_dir__)
-            sys.path.append(os.getcwd())
-            mod_name = os.path.basename(mod_name)
-            mod = __import__(mod_name.split('.')[0])
-            if hasattr(mod, '__simulation__'):
-                # it is a valid SiMon module
-                mod_dict[mod.__simulation__] = mod_name.split('.')[0]
-        return mod_dict
+        self.module_registry = ModuleRegistry([__simon_dir__, __user_shell_dir__],
+                                              manifest_file=os.path.join(self.cwd, ModuleRegistry.MANIFEST_FILE),
+                                              logger=self.logger)
+        return self.module_registry.scan()
 
     def traverse_simulation_dir_tree(self, pattern, base_dir, files):
         """
@@ -134,49 +303,103 @@ class SiMon(object):
             if fnmatch(filename, pattern):
                 if os.path.isdir(os.path.join(base_dir, filename)):
                     fullpath = os.path.join(base_dir, filename)
-                    self.inst_id += 1
-                    id = self.inst_id
-
-                    # Try to determine the simulation code type by reading the config file
-                    sim_config = self.parse_config_file(os.path.join(fullpath, 'SiMon.conf'))
-                    sim_inst = None
-                    if sim_config is not None:
-                        try:
-                            code_name = sim_config.get('Simulation', 'Code_name')
-                            if code_name in self.module_dict:
-                                sim_inst_mod = __import__(self.module_dict[code_name])
-                                sim_inst = getattr(sim_inst_mod, code_name)(id, filename, fullpath,
-                                                                            SimulationTask.STATUS_NEW,
-                                                                            logger=self.logger)
-                        except cp.NoOptionError:
-                            pass
-                    else:
+                    if base_dir not in self.sim_inst_parent_dict:
+                        # not inside a simulation directory (e.g. a data sub-directory), nothing to attach to
                         continue
+                    # IDs are kept in the simulation index, so that they remain stable across scans
+                    id = self.sim_index.get_id(fullpath)
+                    if id < 0:
+                        self.inst_id += 1
+                        id = self.inst_id
+                    sim_inst = self.create_simulation_task(id, filename, fullpath)
                     if sim_inst is None:
                         continue
-                    self.sim_inst_dict[id] = sim_inst
-                    sim_inst.id = id
-                    sim_inst.fulldir = fullpath
-                    sim_inst.name = filename
-
-                    # register child to the parent
-                    self.sim_inst_parent_dict[base_dir].restarts.append(sim_inst)
-                    sim_inst.level = self.sim_inst_parent_dict[base_dir].level + 1
-                    # register the node itself in the parent tree
-                    self.sim_inst_parent_dict[fullpath] = sim_inst
-                    sim_inst.parent_id = self.sim_inst_parent_dict[base_dir].id
-
-                    # Get simulation status
-                    sim_inst.sim_get_status()
-
-                    self.sim_inst_dict[sim_inst.parent_id].status = sim_inst.status
-
-                    if (sim_inst.t > self.sim_inst_dict[sim_inst.parent_id].t and
-                            not os.path.isfile(os.path.join(sim_inst.fulldir, 'ERROR'))) \
-                            or sim_inst.status == SimulationTask.STATUS_RUN:
-                        # nominate as restart candidate
-                        self.sim_inst_dict[sim_inst.parent_id].cid = sim_inst.id
-                        self.sim_inst_dict[sim_inst.parent_id].t_max_extended = sim_inst.t_max_extended
+                    self.register_simulation_task(sim_inst, base_dir)
+
+    def create_simulation_task(self, sim_id, name, full_dir):
+        """
+        Create the simulation task of a directory, which parses its config file and probes its status. This method
+        only reads from the file system and does not modify the simulation tree, so it can run in a worker thread.
+
+        :return: The simulation task, or None if the directory does not contain a simulation known to SiMon.
+        """
+        # Try to determine the simulation code type by reading the config file
+        sim_config = self.parse_config_file(os.path.join(full_dir, 'SiMon.conf'))
+        if sim_config is None:
+            return None
+        try:
+            code_name = sim_config.get('Simulation', 'Code_name')
+        except (cp.NoOptionError, cp.NoSectionError):
+            return None
+        sim_class = self.module_registry.get_class(code_name)
+        if sim_class is None:
+            return None
+        return sim_class(sim_id, name, full_dir, SimulationTask.STATUS_NEW, logger=self.logger)
+
+    def register_simulation_task(self, sim_inst, base_dir):
+        """
+        Insert a simulation task into the simulation tree, as a child (i.e. restart) of the simulation in base_dir.
+        """
+        id = sim_inst.id
+        fullpath = sim_inst.full_dir
+        self.sim_inst_dict[id] = sim_inst
+        sim_inst.fulldir = fullpath
+
+        # register child to the parent
+        self.sim_inst_parent_dict[base_dir].restarts.append(sim_inst)
+        sim_inst.level = self.sim_inst_parent_dict[base_dir].level + 1
+        # register the node itself in the parent tree
+        self.sim_inst_parent_dict[fullpath] = sim_inst
+        sim_inst.parent_id = self.sim_inst_parent_dict[base_dir].id
+
+        # Get simulation status (propagated to the parent once the whole tree is built)
+        sim_inst.sim_get_status()
+
+    def get_state_store(self):
+        """
+        :return: The store of the simulation states, or None if not configured (or not available).
+        """
+        if self.state_store is None and self.state_db is not None:
+            import sqlite3
+            from state_store import StateStore
+            try:
+                self.state_store = StateStore(self.state_db, logger=self.logger)
+            except sqlite3.Error as err:
+                msg = 'State database %s cannot be opened: %s' % (self.state_db, err)
+                print(msg)
+                if self.logger is not None:
+                    self.logger.error(msg)
+                self.state_db = None
+        return self.state_store
+
+    def get_probe_pool(self):
+        """
+        :return: The pool of worker threads probing the simulations, created at the first use (i.e. after the daemon
+                 has been forked), or None if the simulations are probed in the main thread.
+        """
+        if self.probe_pool is None and self.probe_workers > 1:
+            from multiprocessing.pool import ThreadPool
+            self.probe_pool = ThreadPool(self.probe_workers)
+        return self.probe_pool
+
+    def probe_simulation_dirs(self):
+        """
+        Create the simulation tasks of all directories in the index on the pool of worker threads, and insert them
+        into the simulation tree in the order of the index, so that the result does not depend on the order in which
+        the probes complete.
+        """
+        candidates = []
+        for base_dir, subdirs in self.sim_index.walk():
+            for filename in subdirs:
+                fullpath = os.path.join(base_dir, filename)
+                candidates.append((base_dir, filename, fullpath, self.sim_index.get_id(fullpath)))
+        chunk_size = max(1, len(candidates) // (self.probe_workers * 4))
+        sim_insts = self.get_probe_pool().map(lambda c: self.create_simulation_task(c[3], c[1], c[2]),
+                                              candidates, chunk_size)
+        for candidate, sim_inst in zip(candidates, sim_insts):
+            # a parent precedes its children in the index, so it has been registered already (if it is a simulation)
+            if sim_inst is not None and candidate[0] in self.sim_inst_parent_dict:
+                self.register_simulation_task(sim_inst, candidate[0])
 
     def build_simulation_tree(self):
         """
@@ -187,54 +410,191 @@ class SiMon(object):
         :type: None
         """
         os.chdir(self.cwd)
+        SimulationTask.begin_probe_cycle()  # every simulation will be probed once in the new tree
+        if self.shard is not None:
+            with self.metrics.phase('walk'):
+                self.update_shard()  # before the previous tree is dropped
         self.sim_inst_dict = dict()
 
         self.sim_tree = SimulationTask(0, 'root', self.cwd, SimulationTask.STATUS_NEW)  # initially only the root node
         self.sim_inst_dict[0] = self.sim_tree  # map ID=0 to the root node
+        self.sim_inst_parent_dict = dict()
         self.sim_inst_parent_dict[self.cwd.strip()] = self.sim_tree  # map the current dir to be the sim tree root
-        self.inst_id = 0
 
-        os.path.walk(self.cwd, self.traverse_simulation_dir_tree, '*')
+        # Only the directories changed since the last scan are listed again; the rest comes from the index
+        self.sim_index.logger = self.logger
+        with self.metrics.phase('walk'):
+            self.sim_index.refresh()
+        self.inst_id = self.sim_index.max_id
+        with self.metrics.phase('probe'):
+            if self.get_probe_pool() is not None:
+                self.probe_simulation_dirs()
+            else:
+                for base_dir, subdirs in self.sim_index.walk():
+                    self.traverse_simulation_dir_tree('*', base_dir, subdirs)
+        self.sim_index.save()
+        if self.logger is not None:
+            self.logger.debug('Simulation index: %d directories visited, %d listed again' %
+                              (self.sim_index.n_visited, self.sim_index.n_rescanned))
+
+        SimulationTask.prune_progress_histories([sim.full_dir for sim in self.sim_inst_dict.values()])
 
         # Synchronize the status tree (status propagation)
-        update_needed = True
-        max_iter = 0
-        while update_needed and max_iter < 30:
-            max_iter += 1
-            inst_status_modified = False
-            for i in self.sim_inst_dict:
-                if i == 0:
-                    continue
-                inst = self.sim_inst_dict[i]
-                if inst.status == SimulationTask.STATUS_RUN or inst.status == SimulationTask.STATUS_DONE:
-                    if inst.parent_id > 0 and self.sim_inst_dict[inst.parent_id].status != inst.status:
-                        # propagate the status of children (restarted simulation) to parents' status
-                        self.sim_inst_dict[inst.parent_id].status = inst.status
-                        inst_status_modified = True
-            if inst_status_modified is True:
-                update_needed = True
-            else:
-                update_needed = False
+        self.sim_tree.sim_propagate_status()
         return 0
         # print self.sim_tree
 
-    def print_sim_status_overview(self, sim_id):
+    def print_sim_status_overview(self, sim_id, overview_filter=None):
         """
         Output an overview of the simulation status in the terminal.
 
+        :param overview_filter: An OverviewFilter selecting the simulations shown (optional).
         :return: start and stop time
         :rtype: int
         """
-        print(self.sim_inst_dict[sim_id])  # print the root node will cause the whole tree to be printed
+        # the overview of the root node is the whole tree
+        write_overview(self.sim_inst_dict[sim_id].sim_overview_rows(), overview_filter=overview_filter)
         return self.sim_inst_dict[sim_id].t_min, self.sim_inst_dict[sim_id].t_max
 
+    def print_state_overview(self, max_age=None, overview_filter=None):
+        """
+        Output an overview of the simulation status from the state store written by the daemon, without scanning the
+        simulation directories.
+
+        :param max_age: The maximum age (in seconds) of the state store. If it has not been updated since, nothing is
+                        printed.
+        :param overview_filter: An OverviewFilter selecting the simulations shown (optional).
+        :return: True if the overview has been printed, False if the state store is not available or outdated.
+        """
+        store = self.get_state_store()
+        if store is None:
+            return False
+        last_sync = store.last_sync()
+        if last_sync is None or (max_age is not None and time.time() - last_sync > max_age):
+            return False
+        children = dict()
+        for task in store.tasks():
+            children.setdefault(task['parent_id'], []).append(task)
+
+        def rows():
+            stack = [task for task in reversed(children.get(-1, []))]  # the root
+            while len(stack) > 0:
+                task = stack.pop()
+                yield (task['level'], task['status'], task['id'], task['name'], task['path'], task['t_min'],
+                       task['t'], task['t_max'], task['mtime'], None)
+                stack.extend(reversed(sorted(children.get(task['id'], []), key=lambda child: child['path'])))
+
+        write_overview(rows(), overview_filter=overview_filter)
+        print('State as of %s (written by the daemon)' %
+              datetime.datetime.fromtimestamp(last_sync).strftime('%Y-%m-%d %H:%M:%S'))
+        return True
+
+    def connect_daemon(self):
+        """
+        :return: A ControlClient connected to the running daemon, or None if no daemon answers.
+        """
+        if self.control_socket is None:
+            return None
+        client = ControlClient(self.control_socket)
+        if not client.is_available():
+            return None
+        return client
+
+    def print_daemon_overview(self, overview_filter=None):
+        """
+        Output an overview of the simulation status from the simulation tree held by the running daemon, without
+        scanning the simulation directories.
+
+        :param overview_filter: An OverviewFilter selecting the simulations shown (optional).
+        :return: True if the overview has been printed, False if no daemon answers.
+        """
+        client = self.control_client
+        if client is None:
+            if self.control_socket is None or not os.path.exists(self.control_socket):
+                return False
+            client = ControlClient(self.control_socket)
+        try:
+            reply = client.request('overview', **ControlClient.filter_args(overview_filter))
+        except (IOError, socket.error):
+            self.control_client = None
+            return False
+        if not reply.get('ok', False):
+            print('Error from the SiMon daemon: %s' % reply.get('error'))
+            return False
+        sys.stdout.write(reply['text'])
+        sys.stdout.flush()
+        return True
+
+    def daemon_action(self, command, ids):
+        """
+        Start, restart, stop or kill simulations through the running daemon.
+
+        :param command: The command of the control API, e.g. 'kill'.
+        :param ids: The IDs of the simulations.
+        :return: True if the daemon has carried out the command, False if it does not answer anymore.
+        """
+        try:
+            reply = self.control_client.request(command, ids=ids)
+        except (IOError, socket.error) as err:
+            print('The SiMon daemon does not answer (%s). The simulations are now controlled directly.' % err)
+            self.control_client = None
+            return False
+        if not reply.get('ok', False):
+            print('Error from the SiMon daemon: %s' % reply.get('error'))
+            return True
+        for sid in reply['unknown']:
+            print('The selected simulation with ID = %s does not exist. Cannot %s simulation.\n' % (sid, command))
+        for sid in sorted(reply['results'].keys(), key=int):
+            print('%s simulation %s: return code %d' % (command.capitalize(), sid, reply['results'][sid]))
+        return True
+
+    def open_control_server(self):
+        """
+        Start listening on the socket of the control API (in the daemon).
+
+        :return: The file descriptor of the socket, or None if the control API is disabled or cannot be started.
+        """
+        if self.control_socket is None:
+            return None
+        if len(self.control_socket) > 100:
+            self.logger.warning('The path of the control socket may be too long for a Unix-domain socket: %s. Set '
+                                'Control_socket in SiMon.conf to a shorter path if it cannot be opened' %
+                                self.control_socket)
+        self.control = ControlServer(self, self.control_socket, logger=self.logger)
+        try:
+            control_fd = self.control.open()
+        except (IOError, OSError) as err:
+            self.logger.error('Control API cannot be started on %s: %s' % (self.control_socket, err))
+            self.control = None
+            return None
+        self.logger.info('Control API listening on %s' % self.control_socket)
+        return control_fd
+
+    def handle_control_requests(self):
+        """
+        Answer the pending requests to the control API.
+
+        :return: True if a full rescan has been requested.
+        """
+        os.chdir(self.cwd)
+        self.control.handle_pending()
+        return self.control.rescan_requested
+
     @staticmethod
     def print_help():
-        print('Usage: python simon.py [start|stop|interactive|help]')
+        print('Usage: python simon.py [start|stop|interactive|profile [N]|help]')
         print('\tTo show an overview of job status and quit: python simon.py (no arguments)')
+        print('\tTo show only some simulations: python simon.py [--status RUN,STALL] [--name PATTERN] [--level N] '
+              '[--offset N] [--limit N]')
         print('\tstart: start the daemon')
         print('\tstop: stop the daemon')
-        print('\tinteractive/i/-i: run in interactive mode (no daemon)')
+        print('\tinteractive/i/-i: run in interactive mode (the simulations are listed and controlled through the '
+              'daemon if it is running)')
+        print('\tapi COMMAND [IDs|--status ...]: send a command to the running daemon and print its JSON reply. '
+              'Commands: ping, list, overview, status, start, restart, stop, kill (with IDs seperated by comma), '
+              'rescan')
+        print('\tprofile [N]: run N (default: 3) scheduler cycles of the daemon under the profiler (no daemon). '
+              'Simulations are started and restarted as the daemon would do')
         print('\thelp: print this help message')
 
     @staticmethod
@@ -266,13 +626,22 @@ class SiMon(object):
         if opt == 'q':  # quit interactive mode
             sys.exit(0)
         if opt == 'l':  # list all simulations
-            self.build_simulation_tree()
-            self.print_sim_status_overview(0)
+            if not self.print_daemon_overview():
+                self.build_simulation_tree()
+                self.print_sim_status_overview(0)
         if opt in ['s', 'n', 'r', 'c', 'x', 't', 'd', 'k', 'b', 'p']:
             if self.mode == 'interactive':
                 if self.selected_inst is None or len(self.selected_inst) == 0 or opt == 's':
                     self.selected_inst = Utilities.id_input('Please specify a list of IDs (seperated by comma): ')
                     sys.stdout.write('Instances ' + str(self.selected_inst) + ' selected.\n')
+        if opt in SiMon.DAEMON_ACTIONS and self.control_client is not None:
+            # carried out by the daemon, so that it does not race with the scheduler
+            if self.daemon_action(SiMon.DAEMON_ACTIONS[opt], self.selected_inst):
+                if opt != 't':
+                    self.selected_inst = []
+                return
+        if opt in ['n', 'r', 'c', 'x', 't', 'd', 'k', 'b', 'p'] and len(self.sim_inst_dict) == 0:
+            self.build_simulation_tree()  # the overview has been printed by the daemon
 
         # TODO: use message? to rewrite this part in a smarter way
         if opt == 'n':  # start new simulations
@@ -333,6 +702,7 @@ class SiMon(object):
                     self.sim_inst_dict[sid].sim_backup_checkpoint()
                 else:
                     print('The selected simulation with ID = %d does not exist. Cannot backup checkpoint.\n' % sid)
+            SimulationTask.checkpoint_archiver.wait()
         if opt == 'p':  # perform (post)-processing (usually after the simulation is done)
             for sid in self.selected_inst:
                 if sid in self.sim_inst_dict:
@@ -342,7 +712,39 @@ class SiMon(object):
                 else:
                     print('The selected simulation with ID = %d does not exist. Cannot perform postprocessing.\n' % sid)
 
-    def auto_scheduler(self):
+    def refresh_simulations(self, sim_dirs):
+        """
+        Probe again the simulations in the given directories without rebuilding the simulation tree, and propagate
+        their status to their ancestors (i.e. the simulations they have been restarted from).
+
+        :param sim_dirs: The full paths of the simulation directories in which changes have been detected.
+        :return: A list of the refreshed simulations and their ancestors, sorted by ID.
+        """
+        refreshed = dict()
+        top_level = dict()  # the top-level simulations whose restart trees have to be propagated again
+        SimulationTask.executor.begin_cycle()  # the job states of the last full scan may be outdated
+        with self.metrics.phase('probe'):
+            for sim_dir in sim_dirs:
+                sim = self.sim_inst_parent_dict.get(sim_dir)
+                if sim is None or sim.id == 0:
+                    continue
+                if sim.id not in refreshed:
+                    sim.sim_invalidate_status()
+                    sim.sim_get_status()
+                    refreshed[sim.id] = sim
+                while sim.parent_id > 0:
+                    parent = self.sim_inst_dict[sim.parent_id]
+                    if parent.id not in refreshed:
+                        parent.sim_invalidate_status()
+                        parent.sim_get_status()
+                        refreshed[parent.id] = parent
+                    sim = parent
+                top_level[sim.id] = sim
+        for sim in top_level.values():
+            sim.sim_propagate_status()
+        return [refreshed[i] for i in sorted(refreshed.keys())]
+
+    def auto_scheduler(self, sim_dirs=None):
         """
         The automatic decision maker for the daemon.
 
@@ -350,88 +752,334 @@ class SiMon(object):
         status of all simulations by traversing to all simulation directories and parsing the
         output files. It subsequently deals with the simulation instance according to the informtion
         gathered.
+
+        :param sim_dirs: If given, only the simulations in these directories (and their ancestors) are checked and
+                         scheduled, without rebuilding the simulation tree. This is used by the event-driven mode.
         """
         os.chdir(self.cwd)
-        self.build_simulation_tree()
-        schedule_list = []
-        # Sort jobs according to priority (niceness)
-        sim_niceness_vec = []
-
-        # check how many simulations are running
-        concurrent_jobs = 0
+        self.metrics.begin_cycle()
+        if sim_dirs is None:
+            if self.control is not None:
+                self.control.rescan_requested = False
+            self.build_simulation_tree()
+            candidates = [self.sim_inst_dict[i] for i in sorted(self.sim_inst_dict.keys())]
+        else:
+            candidates = self.refresh_simulations(sim_dirs)
+        self.metrics.enter_phase('schedule')
+        # check the resources used by the running simulations (the statuses have been probed while building the tree)
+        pool = ResourcePool(cores=self.node_cores, memory=self.node_memory, max_jobs=self.max_concurrent_jobs)
         for i in self.sim_inst_dict.keys():
             inst = self.sim_inst_dict[i]
-            sim_niceness_vec.append(inst.niceness)
-            inst.sim_get_status()  # update its status
             # test if the process is running
-            if inst.status == SimulationTask.STATUS_RUN and inst.cid == -1:
-                concurrent_jobs += 1
+            if TaskScheduler.is_running(inst):
+                pool.allocate(inst.cores, inst.memory)
 
-        index_niceness_sorted = np.argsort(sim_niceness_vec)
-        for ind in index_niceness_sorted:
-            if self.sim_inst_dict[ind].status != SimulationTask.STATUS_DONE and self.sim_inst_dict[ind].id > 0:
-                schedule_list.append(self.sim_inst_dict[ind])
-                print(self.sim_inst_dict[ind].name)
+        # Synchronize the priority queue with the new statuses (no work for the simulations whose priority is unchanged)
+        if sim_dirs is None:
+            self.scheduler.retain(self.sim_inst_dict)
+        for sim in candidates:
+            self.scheduler.update(sim, self.sim_inst_dict.get(sim.leaf_id))
 
-        for sim in schedule_list:
-            if sim.id == 0:  # the root group, skip
+        for sim in candidates:
+            if sim.id == 0 or sim.status == SimulationTask.STATUS_DONE:  # the root group, or nothing to do
                 continue
-            sim.sim_get_status()  # update its status
+            sim.sim_get_status()  # no new probe, unless invalidated by an action taken earlier in this cycle
             print('Checking instance #%d ==> %s [%s]' % (sim.id, sim.name, sim.status))
             if sim.status == SimulationTask.STATUS_RUN:
-                sim.sim_backup_checkpoint()
+                with self.metrics.phase('backup'):
+                    sim.sim_backup_checkpoint()
             elif sim.status == SimulationTask.STATUS_STALL:
-                sim.sim_kill()
-                self.build_simulation_tree()
+                if sim.sim_kill() == 0:  # invalidates its status, it will be restarted in a later cycle
+                    self.metrics.inc('simon_kills_total')
             elif sim.status == SimulationTask.STATUS_STOP and sim.level == 1:
                 self.logger.warning('STOP detected: '+sim.fulldir)
-                # check if there is available slot to restart the simulation
-                if concurrent_jobs < self.max_concurrent_jobs and sim.level == 1:
-                    # search only top level instance to find the restart candidate
-                    # build restart path
-                    current_inst = sim
-                    # restart the simulation instance at the leaf node
-                    while current_inst.cid != -1:
-                        current_inst = self.sim_inst_dict[current_inst.cid]
-                    print('RESTART: #%d ==> %s' % (current_inst.id, current_inst.fulldir))
-                    self.logger.info('RESTART: #%d ==> %s' % (current_inst.id, current_inst.fulldir))
-                    current_inst.sim_restart()
-                    concurrent_jobs += 1
-            elif sim.status == SimulationTask.STATUS_NEW:
-                # check if there is available slot to start the simulation
-                if concurrent_jobs < self.max_concurrent_jobs:
-                    # Start new run
-                    sim.sim_start()
-                    concurrent_jobs += 1
-        self.logger.info('SiMon routine checking completed. Machine load: %d/%d' % (concurrent_jobs,
-                                                                                    self.max_concurrent_jobs))
+            if TaskScheduler.is_pending(sim, self.sim_inst_dict.get(sim.leaf_id)) and \
+                    pool.exceeds_capacity(sim.cores, sim.memory):
+                self.logger.warning('%s requires %d cores and %g GB of memory, which exceeds the capacity of the node. '
+                                    'It will never be started.' % (sim.name, sim.cores, sim.memory))
+
+        # Dispatch the pending simulations in the order given by the scheduling policy, as long as they fit into the
+        # free resources. A simulation that does not fit is skipped in favor of the next one that does (backfilling).
+        def fits(pending_id):
+            pending = self.sim_inst_dict[pending_id]
+            return pool.fits(pending.cores, pending.memory)
+
+        while not pool.is_full():
+            sim_id = self.scheduler.pop(fits)
+            if sim_id is None:
+                break
+            sim = self.sim_inst_dict[sim_id]
+            launch_start = time.time()
+            if sim.status == SimulationTask.STATUS_STOP:
+                # search only top level instance to find the restart candidate
+                # build restart path
+                # restart the simulation instance at the leaf node
+                current_inst = self.sim_inst_dict[sim.leaf_id]
+                print('RESTART: #%d ==> %s' % (current_inst.id, current_inst.fulldir))
+                self.logger.info('RESTART: #%d ==> %s' % (current_inst.id, current_inst.fulldir))
+                ret = current_inst.sim_restart()
+                launch_metric = 'simon_restarts_total'
+            else:
+                # Start new run
+                ret = sim.sim_start()
+                launch_metric = 'simon_starts_total'
+            if ret == 0:
+                self.metrics.inc(launch_metric)
+                self.metrics.observe('simon_launch_latency_seconds', time.time() - launch_start)
+            elif ret < 0:
+                self.metrics.inc('simon_launch_failures_total')
+            if ret in (0, 1):  # launched, or already running: the slot is taken
+                pool.allocate(sim.cores, sim.memory)
+        self.metrics.exit_phase()
+        self.logger.info('SiMon routine checking completed. Machine load: %s' % pool)
+        store = self.get_state_store()
+        if store is not None:
+            # one transaction per cycle, writing only the simulations that changed
+            if sim_dirs is None:
+                store.sync(self.sim_inst_dict)
+            else:
+                store.sync(dict([(sim.id, sim) for sim in candidates]), full=False)
+        self.logger.info('Status probes in this cycle: %d for %d simulations (%d cached, %d invalidated)' %
+                         (SimulationTask.probe_counters['probes'], len(self.sim_inst_dict) - 1,
+                          SimulationTask.probe_counters['cached'], SimulationTask.probe_counters['invalidated']))
+        self.logger.debug('Config cache: %s' % SimulationTask.config_cache)
+        self.update_metrics(pool, 'full' if sim_dirs is None else 'partial', candidates)
+
+    def update_task_table(self, sims):
+        """
+        Update the columnar table of the simulation tree (see task_table.py), for the campaign-wide queries. Only the
+        rows of the given simulations are updated; the table is built again if the tree has lost simulations.
+
+        :param sims: The simulations probed in this cycle (and their ancestors).
+        :return: The TaskTable, or None if NumPy is not available.
+        """
+        if TaskTable is None:
+            return None
+        if self.task_table is not None:
+            for sim in sims:
+                self.task_table.update(sim)
+        if self.task_table is None or len(self.task_table) != len(self.sim_inst_dict):
+            self.task_table = TaskTable.from_tasks(self.sim_inst_dict)
+        if self.logger is not None and self.logger.isEnabledFor(logging.DEBUG):
+            least_advanced = ', '.join(['#%d %s (%.0f%%)' % (sim.id, sim.name, 100 * sim.progress)
+                                        for sim in self.task_table.least_advanced(5)])
+            self.logger.debug('Campaign progress: %.1f%%. Least advanced: %s' %
+                              (100 * self.task_table.total_progress(), least_advanced or 'none'))
+        return self.task_table
+
+    def update_metrics(self, pool, mode, sims):
+        """
+        Update the metrics at the end of a scheduler cycle, and write them to the metrics file (if configured).
+
+        :param pool: The ResourcePool with the resources used by the running simulations.
+        :param mode: 'full' if all simulations have been checked, 'partial' otherwise.
+        :param sims: The simulations checked in this cycle.
+        """
+        table = self.update_task_table(sims)
+        if table is not None:
+            status_counts = table.status_counts()
+            self.metrics.set('simon_campaign_progress_ratio', table.total_progress())
+        else:
+            status_counts = [0] * len(SimulationTask.STATUS_LABEL)
+            for sim_id in self.sim_inst_dict:
+                if sim_id > 0:
+                    status_counts[self.sim_inst_dict[sim_id].status] += 1
+        for status, label in enumerate(SimulationTask.STATUS_LABEL):
+            self.metrics.set('simon_simulations', status_counts[status], status=label)
+        for resource, used, capacity in [('jobs', pool.n_jobs, pool.max_jobs), ('cores', pool.used_cores, pool.cores),
+                                         ('memory', pool.used_memory, pool.memory)]:
+            self.metrics.set('simon_slots_used', used, resource=resource)
+            self.metrics.set('simon_slots_capacity', capacity, resource=resource)
+            if capacity > 0:
+                self.metrics.set('simon_slots_utilization_ratio', float(used) / capacity, resource=resource)
+        archiver = SimulationTask.checkpoint_archiver
+        self.metrics.set('simon_checkpoint_backups_total', archiver.n_backups)
+        self.metrics.set('simon_checkpoint_bytes_copied_total', archiver.bytes_copied)
+        config_cache = SimulationTask.config_cache
+        self.metrics.set('simon_config_cache_entries', len(config_cache.entries))
+        self.metrics.set('simon_config_cache_hits_total', config_cache.n_hits)
+        self.metrics.set('simon_config_cache_misses_total', config_cache.n_misses)
+        self.metrics.set('simon_config_cache_evictions_total', config_cache.n_evictions)
+        if self.shard is not None:
+            self.metrics.set('simon_shard_buckets', len(self.shard.owned))
+            self.metrics.set('simon_shard_daemons', self.shard.n_live)
+        self.metrics.end_cycle(mode)
+        if self.metrics_file is not None:
+            try:
+                self.metrics.write(self.metrics_file)
+            except (IOError, OSError) as err:
+                self.logger.warning('Metrics file %s cannot be written: %s' % (self.metrics_file, err))
 
     def run(self):
         """
         The entry point of this script if it is run with the daemon.
         """
         os.chdir(self.cwd)
+        if self.shard_buckets > 0:
+            self.enable_sharding()
         self.build_simulation_tree()
+        sleep_time = 180
+        if self.config.has_option('SiMon', 'daemon_sleep_time'):
+            sleep_time = self.config.getfloat('SiMon', 'daemon_sleep_time')
+        # wake up as soon as a simulation launched by this daemon exits
+        SimulationTask.supervisor.logger = self.logger
+        SimulationTask.executor.logger = self.logger
+        SimulationTask.checkpoint_archiver.logger = self.logger
+        if self.metrics_port > 0:
+            try:
+                self.metrics.serve(self.metrics_port)
+                self.logger.info('Metrics served on http://127.0.0.1:%d/metrics' % self.metrics_port)
+            except (IOError, OSError) as err:
+                self.logger.error('Metrics cannot be served on port %d: %s' % (self.metrics_port, err))
+        wakeup_fd = SimulationTask.supervisor.install_sigchld_handler()
+        control_fd = self.open_control_server()
+        if self.profile_cycles > 0:
+            self.profile(self.profile_cycles, interval=sleep_time)
+        if self.config.has_option('SiMon', 'Event_driven') and self.config.getboolean('SiMon', 'Event_driven'):
+            self.run_event_driven(sleep_time)
         while True:
             # print('[%s] Auto scheduled' % datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S'))
             self.auto_scheduler()
             sys.stdout.flush()
             sys.stderr.flush()
-            if self.config.has_option('SiMon', 'daemon_sleep_time'):
-                time.sleep(self.config.getfloat('SiMon', 'daemon_sleep_time'))
-            else:
-                time.sleep(180)
+            next_sweep = time.time() + sleep_time
+            wait_fds = [wakeup_fd]
+            if control_fd is not None:
+                wait_fds.append(control_fd)
+            while time.time() < next_sweep:
+                ready_fds = TreeWatcher.select(wait_fds, next_sweep - time.time())
+                if control_fd in ready_fds and self.handle_control_requests():
+                    break
+                if wakeup_fd in ready_fds:
+                    exited_dirs, rescan = self.handle_exited_children()
+                    if rescan:
+                        break
+                    if len(exited_dirs) > 0:
+                        self.auto_scheduler(sim_dirs=exited_dirs)
+
+    def handle_exited_children(self):
+        """
+        Reap the simulation processes that have exited since the last call.
+
+        :return: A tuple of (the set of the directories of the exited simulations, whether a full rescan is needed
+                 because some of them are not in the simulation tree yet).
+        """
+        SimulationTask.supervisor.drain_wakeup()
+        exited_dirs = set()
+        rescan = False
+        for pid, sim_dir, return_code in SimulationTask.supervisor.reap():
+            if self.logger is not None:
+                self.logger.info('Process %d exited with code %d: %s' % (pid, return_code, sim_dir))
+            exited_dirs.add(sim_dir)
+            if sim_dir not in self.sim_inst_parent_dict:
+                rescan = True  # e.g. a restart directory created after the last scan
+        return exited_dirs, rescan
+
+    def get_watch_targets(self):
+        """
+        :return: A dict mapping the directories to be watched in the event-driven mode to the names of the files of
+                 interest in each directory. The root directory is watched for new simulations only.
+        """
+        targets = {self.cwd: []}
+        for i in self.sim_inst_dict:
+            sim = self.sim_inst_dict[i]
+            if i == 0 or sim.config is None:
+                continue
+            names = list(TreeWatcher.MARKER_FILES)
+            for option in ['Output_file', 'Error_file']:
+                if sim.config.has_option('Simulation', option):
+                    names.append(sim.config.get('Simulation', option))
+            targets[sim.full_dir] = names
+        return targets
+
+    def run_event_driven(self, sweep_interval):
+        """
+        The main loop of the daemon in the event-driven mode. The daemon sleeps until a change is detected in the
+        simulation directories, and then checks only the affected simulations. A full scan of all simulations is still
+        carried out every ``sweep_interval`` seconds as a safety net, and whenever the directory structure changes.
+
+        :param sweep_interval: The time interval between two full scans (in seconds).
+        """
+        poll_interval = 10.0
+        if self.config.has_option('SiMon', 'Event_poll_interval'):
+            poll_interval = self.config.getfloat('SiMon', 'Event_poll_interval')
+        self.watcher = TreeWatcher.create(poll_interval=poll_interval, logger=self.logger)
+        self.watcher.add_wakeup_fd(SimulationTask.supervisor.install_sigchld_handler())
+        if self.control is not None:
+            self.watcher.add_wakeup_fd(self.control.fileno())
+        if self.logger is not None:
+            self.logger.info('Event-driven mode enabled (%s), full scan every %g sec' %
+                             (self.watcher.__class__.__name__, sweep_interval))
+        next_sweep = 0.0
+        changed = set()
+        rescan = True
+        while True:
+            if rescan or time.time() >= next_sweep:
+                self.auto_scheduler()
+                self.watcher.sync(self.get_watch_targets())
+                next_sweep = time.time() + sweep_interval
+            elif len(changed) > 0:
+                if self.logger is not None:
+                    self.logger.info('Changes detected in %d simulation directories' % len(changed))
+                self.auto_scheduler(sim_dirs=changed)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            changed, rescan, ready_fds = self.watcher.wait(next_sweep - time.time())
+            if SimulationTask.supervisor.wakeup_r in ready_fds:
+                exited_dirs, exited_rescan = self.handle_exited_children()
+                changed.update(exited_dirs)
+                rescan = rescan or exited_rescan
+            if self.control is not None and self.control.fileno() in ready_fds:
+                rescan = self.handle_control_requests() or rescan
+
+    def profile(self, n_cycles, interval=0.0):
+        """
+        Run scheduler cycles under cProfile, and write the statistics and a report to the root directory.
+
+        cProfile only sees the calling thread, so the simulations are probed and the checkpoints backed up in the main
+        thread while profiling, even if Probe_workers or Checkpoint_workers is set.
+
+        :param n_cycles: The number of cycles.
+        :param interval: The time to sleep between two cycles (in seconds).
+        :return: The path of the report.
+        """
+        profiler = CycleProfiler(self.cwd, logger=self.logger)
+        archiver = SimulationTask.checkpoint_archiver
+        archiver.wait()
+        probe_workers, probe_pool, archiver_workers = self.probe_workers, self.probe_pool, archiver.workers
+        self.probe_workers, self.probe_pool, archiver.workers = 1, None, 0
+        try:
+            return profiler.run(self, n_cycles, interval)
+        finally:
+            self.probe_workers, self.probe_pool, archiver.workers = probe_workers, probe_pool, archiver_workers
 
-    def interactive_mode(self, autoquit=False):
+    def interactive_mode(self, autoquit=False, overview_filter=None):
         """
         Run SiMon in the interactive mode. In this mode, the user can see an overview of the simulation status from the
         terminal, and control the simulations accordingly.
+        :param overview_filter: An OverviewFilter selecting the simulations shown in the overview (optional).
         :return:
         """
         print os.getcwd()
         os.chdir(self.cwd)
-        self.build_simulation_tree()
-        self.print_sim_status_overview(0)
+        if autoquit is True:
+            # ask the running daemon, which holds the simulation tree in memory
+            if self.print_daemon_overview(overview_filter=overview_filter):
+                return
+            # use the state written by the daemon if it is recent, instead of scanning all simulations
+            sleep_time = 180
+            if self.config.has_option('SiMon', 'daemon_sleep_time'):
+                sleep_time = self.config.getfloat('SiMon', 'daemon_sleep_time')
+            if self.print_state_overview(max_age=2 * sleep_time, overview_filter=overview_filter):
+                return
+        else:
+            self.control_client = self.connect_daemon()
+        if self.control_client is not None:
+            print('Connected to the SiMon daemon: the simulations are listed, started, restarted, stopped and killed '
+                  'through it.')
+        if self.control_client is None or not self.print_daemon_overview(overview_filter=overview_filter):
+            self.build_simulation_tree()
+            self.print_sim_status_overview(0, overview_filter=overview_filter)
         choice = ''
         if autoquit is False:
             while choice != 'q':
@@ -447,9 +1095,9 @@ class SiMon(object):
         if necessary.
         :return:
         """
-        app = SiMon(pidfile=os.path.join(simon_dir, 'SiMon_daemon.pid'),
-                    stdout=os.path.join(simon_dir, 'SiMon.out.txt'),
-                    stderr=os.path.join(simon_dir, 'SiMon.err.txt'),
+        app = SiMon(pidfile=daemon_file(simon_dir, 'SiMon_daemon.pid'),
+                    stdout=daemon_file(simon_dir, 'SiMon.out.txt'),
+                    stderr=daemon_file(simon_dir, 'SiMon.err.txt'),
                     cwd=simon_dir,
                     mode='daemon')
         # log system
@@ -467,10 +1115,11 @@ class SiMon(object):
             else:
                 app.logger.setLevel(logging.INFO)
         formatter = logging.Formatter("%(asctime)s - [%(levelname)s] - %(name)s - %(message)s")
-        handler = logging.FileHandler(os.path.join(simon_dir, 'SiMon.log'))
+        handler = logging.FileHandler(daemon_file(simon_dir, 'SiMon.log'))
         handler.setFormatter(formatter)
         app.logger.addHandler(handler)
-        # initialize the daemon runner
+        # initialize the daemon runner (python-daemon is only imported when needed, to keep the CLI startup fast)
+        from daemon import runner
         app.logger.info('Starting SiMon daemon at log level %s' % log_level)
         daemon_runner = runner.DaemonRunner(app)
         # This ensures that the logger file handle does not get closed during daemonization
@@ -478,6 +1127,35 @@ class SiMon(object):
         daemon_runner.do_action()  # fixed time period of calling run()
 
 
+def daemon_file(simon_dir, file_name):
+    """
+    :param file_name: The name of the file in simon_dir, or an absolute path (e.g. the state database in Root_dir).
+    :return: The path of a file of the daemon, e.g. its PID file. With sharding, the daemons of several hosts may run in
+             the same directory, so the name of the daemon is inserted in the file name (e.g. SiMon_daemon.node1.pid).
+    """
+    name = SiMon.shard_daemon_name(SiMon.parse_config_file(os.path.join(simon_dir, 'SiMon.conf')))
+    if name is not None:
+        base, ext = os.path.splitext(file_name)
+        file_name = '%s.%s%s' % (base, name, ext)
+    return os.path.join(simon_dir, file_name)
+
+
+def running_daemon_pid():
+    """
+    :return: The process ID of the SiMon daemon running in the current directory, or None if it is not running.
+    """
+    pid_fn = daemon_file(os.getcwd(), 'SiMon_daemon.pid')
+    if os.path.isfile(pid_fn):
+        try:
+            f_pid = open(pid_fn)
+            simon_pid = int(f_pid.readline())
+            os.kill(simon_pid, 0)  # test whether the process exists, does not kill the process
+            return simon_pid
+        except (ValueError, OSError):
+            pass
+    return None
+
+
 def main():
     # execute only if run as a script
     if len(sys.argv) == 1:
@@ -485,20 +1163,20 @@ def main():
         s = SiMon()
         s.interactive_mode(autoquit=True)
     elif len(sys.argv) > 1:
-        if sys.argv[1] in ['start', 'stop', 'restart']:
+        if sys.argv[1].startswith('--'):
+            overview_filter = OverviewFilter.from_args(sys.argv[1:])
+            s = SiMon()
+            s.interactive_mode(autoquit=True, overview_filter=overview_filter)
+        elif sys.argv[1] in ['start', 'stop', 'restart']:
             if sys.argv[1] == 'start':
                 # test if the daemon is already started
-                if os.path.isfile('SiMon_daemon.pid'):
-                    try:
-                        f_pid = open('SiMon_daemon.pid')
-                        simon_pid = int(f_pid.readline())
-                        os.kill(simon_pid, 0)  # test whether the process exists, does not kill the process
-                        print('Error: the SiMon daemon is already running with process ID: %d' % simon_pid)
-                        print('Please make sure that you stop the daemon before starting it. Exiting...')
-                        sys.exit(-1)
-                    except (ValueError, OSError):
-                        pass
+                simon_pid = running_daemon_pid()
+                if simon_pid is not None:
+                    print('Error: the SiMon daemon is already running with process ID: %d' % simon_pid)
+                    print('Please make sure that you stop the daemon before starting it. Exiting...')
+                    sys.exit(-1)
             # The python-daemon library will handle the start/stop/restart arguments by itself
+            from daemon import runner
             try:
                 SiMon.daemon_mode(os.getcwd())
             except runner.DaemonRunnerStopFailureError:
@@ -507,6 +1185,51 @@ def main():
         elif sys.argv[1] in ['interactive', 'i', '-i']:
             s = SiMon()
             s.interactive_mode()
+        elif sys.argv[1] == 'profile':
+            n_cycles = 3
+            if len(sys.argv) > 2:
+                try:
+                    n_cycles = int(sys.argv[2])
+                except ValueError:
+                    SiMon.print_help()
+                    sys.exit(-1)
+            simon_pid = running_daemon_pid()
+            if simon_pid is not None:
+                print('Error: the SiMon daemon is running with process ID: %d. Stop it before profiling, or set '
+                      'Profile_cycles in SiMon.conf to profile the daemon itself. Exiting...' % simon_pid)
+                sys.exit(-1)
+            s = SiMon()
+            s.logger = logging.getLogger('ProfileLog')
+            s.logger.setLevel(logging.WARNING)
+            s.logger.addHandler(logging.StreamHandler())
+            print('Report written to %s' % s.profile(n_cycles))
+        elif sys.argv[1] == 'api':
+            # e.g. ``simon api list --status RUN``, ``simon api kill 3,5``: for scripts, the reply is printed as JSON
+            if len(sys.argv) < 3 or sys.argv[2] not in ControlServer.COMMANDS:
+                SiMon.print_help()
+                sys.exit(-1)
+            command = sys.argv[2]
+            args = dict()
+            if command in ['list', 'overview']:
+                args = ControlClient.filter_args(OverviewFilter.from_args(sys.argv[3:]))
+            elif command not in ['ping', 'rescan']:
+                try:
+                    args['ids'] = [int(sid) for sid in ','.join(sys.argv[3:]).split(',') if sid.strip() != '']
+                except ValueError:
+                    SiMon.print_help()
+                    sys.exit(-1)
+            s = SiMon()
+            if s.control_socket is None:
+                print('Error: the control API is disabled (Control_socket in SiMon.conf). Exiting...')
+                sys.exit(-1)
+            try:
+                reply = ControlClient(s.control_socket).request(command, **args)
+            except (IOError, socket.error) as err:
+                print('Error: the SiMon daemon does not answer on %s: %s' % (s.control_socket, err))
+                sys.exit(-1)
+            print(json.dumps(reply, indent=2, sort_keys=True))
+            if not reply.get('ok', False):
+                sys.exit(1)
         else:
             print(sys.argv[1])
             SiMon.print_help()
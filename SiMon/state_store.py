@@ -0,0 +1,166 @@
+"""
+Optional SQLite store of the state of the simulations.
+
+The daemon writes one row per simulation (status, process ID, model time, timestamps, number of restarts, parent) at
+the end of every scheduler cycle, in a single transaction in which only the rows that changed are written. Every status
+change is appended to a history table. The overview can then be printed from indexed queries on the store, without
+scanning the simulation directories again.
+
+The per-simulation SiMon.conf files remain the reference: the store can be deleted at any time, and will be rebuilt
+from the next scan.
+"""
+import time
+import sqlite3
+
+
+class StateStore(object):
+
+    SCHEMA_VERSION = 1
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+        'CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY, path TEXT NOT NULL, name TEXT, parent_id INTEGER, '
+        'level INTEGER, status INTEGER, pid INTEGER, t REAL, t_min REAL, t_max REAL, mtime REAL, ctime REAL, '
+        'n_restarts INTEGER, updated REAL)',
+        'CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status)',
+        'CREATE INDEX IF NOT EXISTS tasks_parent ON tasks (parent_id)',
+        'CREATE TABLE IF NOT EXISTS history (task_id INTEGER NOT NULL, timestamp REAL NOT NULL, old_status INTEGER, '
+        'new_status INTEGER)',
+        'CREATE INDEX IF NOT EXISTS history_task ON history (task_id, timestamp)',
+    ]
+
+    # the columns of the tasks table, in the order of the rows returned by StateStore.task_row()
+    COLUMNS = ['id', 'path', 'name', 'parent_id', 'level', 'status', 'pid', 't', 't_min', 't_max', 'mtime', 'ctime',
+               'n_restarts']
+
+    def __init__(self, db_file, logger=None):
+        """
+        :param db_file: The path of the SQLite database file.
+        :param logger: The logger of the daemon (optional).
+        """
+        self.db_file = db_file
+        self.logger = logger
+        self.conn = sqlite3.connect(db_file, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')  # the readers do not block the daemon
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            for statement in StateStore.SCHEMA:
+                self.conn.execute(statement)
+            self.conn.execute('INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)',
+                              ('schema_version', str(StateStore.SCHEMA_VERSION)))
+        self.rows = None  # ID -> the row last written, to write only the rows that changed
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def task_row(sim):
+        """
+        :return: The row of the tasks table representing a simulation (without the update timestamp).
+        """
+        pid = 0
+        if sim.config is not None and sim.config.has_option('Simulation', 'PID'):
+            try:
+                pid = int(float(sim.config.get('Simulation', 'PID')))
+            except ValueError:
+                pid = 0
+        return (sim.id, sim.full_dir, sim.name, sim.parent_id, sim.level, sim.status, pid, float(sim.t),
+                float(sim.t_min), float(sim.t_max), float(sim.mtime), float(sim.ctime), len(sim.restarts))
+
+    def load_rows(self):
+        self.rows = dict()
+        for row in self.conn.execute('SELECT %s FROM tasks' % ', '.join(StateStore.COLUMNS)):
+            self.rows[row[0]] = tuple(row)
+
+    def sync(self, sim_inst_dict, full=True):
+        """
+        Write the state of the simulations in a single transaction. Only the rows that changed are written, and the
+        status changes are recorded in the history.
+
+        :param sim_inst_dict: A dict mapping the IDs to the simulation tasks (including the root, ID 0).
+        :param full: True if sim_inst_dict contains all the simulations, so that the rows of the simulations that no
+                     longer exist are deleted. False if only some simulations have been checked.
+        :return: The number of rows written.
+        """
+        if self.rows is None:
+            self.load_rows()
+        now = time.time()
+        updated = []
+        transitions = []
+        for sim_id, sim in sim_inst_dict.items():
+            row = StateStore.task_row(sim)
+            old_row = self.rows.get(sim_id)
+            if row == old_row:
+                continue
+            old_status = None
+            if old_row is not None:
+                old_status = old_row[5]
+            if old_status != row[5]:
+                transitions.append((sim_id, now, old_status, row[5]))
+            updated.append(row + (now,))
+        deleted = []
+        if full:
+            deleted = [(sim_id,) for sim_id in self.rows if sim_id not in sim_inst_dict]
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO tasks (%s, updated) VALUES (%s)' %
+                                  (', '.join(StateStore.COLUMNS), ', '.join(['?'] * (len(StateStore.COLUMNS) + 1))),
+                                  updated)
+            self.conn.executemany('INSERT INTO history (task_id, timestamp, old_status, new_status) VALUES (?, ?, ?, ?)',
+                                  transitions)
+            self.conn.executemany('DELETE FROM tasks WHERE id = ?', deleted)
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('last_sync', repr(now)))
+        for row in updated:
+            self.rows[row[0]] = row[:-1]
+        for sim_id, in deleted:
+            del self.rows[sim_id]
+        if self.logger is not None:
+            self.logger.debug('State store: %d rows written, %d status changes, %d rows deleted' %
+                              (len(updated), len(transitions), len(deleted)))
+        return len(updated)
+
+    def last_sync(self):
+        """
+        :return: The time of the last sync(), or None if the store is empty.
+        """
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', ('last_sync',)).fetchone()
+        if row is None:
+            return None
+        return float(row[0])
+
+    def tasks(self, status=None, parent_id=None):
+        """
+        :param status: Only the simulations with this status (optional).
+        :param parent_id: Only the children of this simulation (optional).
+        :return: A list of dicts (with the keys StateStore.COLUMNS) sorted by ID. The root of the simulation tree has
+                 ID 0.
+        """
+        conditions = []
+        args = []
+        if status is not None:
+            conditions.append('status = ?')
+            args.append(status)
+        if parent_id is not None:
+            conditions.append('parent_id = ?')
+            args.append(parent_id)
+        query = 'SELECT %s FROM tasks' % ', '.join(StateStore.COLUMNS)
+        if len(conditions) > 0:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY id'
+        return [dict(zip(StateStore.COLUMNS, row)) for row in self.conn.execute(query, args)]
+
+    def count_by_status(self):
+        """
+        :return: A dict mapping the status codes to the number of simulations (the root excluded).
+        """
+        return dict(self.conn.execute('SELECT status, COUNT(*) FROM tasks WHERE id > 0 GROUP BY status').fetchall())
+
+    def history(self, task_id, limit=None):
+        """
+        :return: The status changes of a simulation as a list of (timestamp, old status, new status), newest first.
+        """
+        query = 'SELECT timestamp, old_status, new_status FROM history WHERE task_id = ? ORDER BY timestamp DESC'
+        args = [task_id]
+        if limit is not None:
+            query += ' LIMIT ?'
+            args.append(limit)
+        return [tuple(row) for row in self.conn.execute(query, args)]
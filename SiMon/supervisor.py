@@ -0,0 +1,158 @@
+"""
+Supervisor of the simulation processes launched by SiMon.
+
+The simulation codes are launched with subprocess.Popen in their own session, and the supervisor keeps the process
+handles. In the daemon, a SIGCHLD handler wakes up the main loop through a pipe as soon as a child exits, so that
+the exited child can be reaped and the simulation restarted (or another one started in the freed slot) immediately,
+instead of being discovered at the next scan.
+"""
+import os
+import time
+import fcntl
+import errno
+import signal
+import subprocess
+
+
+class ProcessSupervisor(object):
+
+    PID_FILE = '.process.pid'  # the process ID of a simulation is stored in this file in the simulation directory
+
+    def __init__(self, logger=None):
+        """
+        :param logger: The logger of the daemon (optional).
+        """
+        self.logger = logger
+        self.children = dict()  # pid -> (subprocess.Popen, directory in which the process has been launched)
+        self.wakeup_r = -1  # read end of the pipe written by the SIGCHLD handler
+        self.wakeup_w = -1
+        self.n_launched = 0
+        self.last_launch_latency = 0.0  # the time (in seconds) spent in the last launch
+
+    def launch(self, command, cwd):
+        """
+        Launch a shell command in the background, in its own session, and record its process ID in the PID file.
+
+        :param command: The shell command to launch, e.g. the Start_command of a simulation.
+        :param cwd: The directory in which the command is executed.
+        :return: The process ID.
+        """
+        t_start = time.time()
+        dev_null = open(os.devnull, 'r')
+        try:
+            proc = subprocess.Popen(command, shell=True, cwd=cwd, stdin=dev_null, close_fds=True,
+                                    preexec_fn=os.setsid)
+        finally:
+            dev_null.close()
+        self.children[proc.pid] = (proc, cwd)
+        ProcessSupervisor.write_pid_file(cwd, proc.pid)
+        self.n_launched += 1
+        self.last_launch_latency = time.time() - t_start
+        if self.logger is not None:
+            self.logger.debug('Launched PID %d in %s (%.3f sec)' % (proc.pid, cwd, self.last_launch_latency))
+        return proc.pid
+
+    @staticmethod
+    def write_pid_file(sim_dir, pid):
+        """
+        Write the process ID file atomically, so that a concurrent reader never sees a partially written file.
+        """
+        pid_fn = os.path.join(sim_dir, ProcessSupervisor.PID_FILE)
+        tmp_fn = '%s.tmp.%d' % (pid_fn, os.getpid())
+        with open(tmp_fn, 'w') as f_pid:
+            f_pid.write('%d\n' % pid)
+        os.rename(tmp_fn, pid_fn)
+
+    @staticmethod
+    def read_pid_file(sim_dir):
+        """
+        :return: The process ID recorded in the simulation directory, or None if not available.
+        """
+        try:
+            with open(os.path.join(sim_dir, ProcessSupervisor.PID_FILE), 'r') as f_pid:
+                return int(f_pid.readline().strip())
+        except (IOError, ValueError):
+            return None
+
+    def is_running(self, pid):
+        """
+        Test whether a process is running. For the children of the supervisor, the exit status is collected, so that
+        an exited child (i.e. a zombie) is not mistaken for a running process.
+        """
+        if pid is None or pid <= 0:
+            return False
+        child = self.children.get(pid)
+        if child is not None:
+            return child[0].poll() is None
+        try:
+            os.kill(pid, 0)  # This just checks if the process is running. It doesn't kill the process
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def kill(self, pid, sig=signal.SIGKILL):
+        """
+        Send a signal to a simulation process. If the process leads its own process group (i.e. it has been launched by
+        the supervisor), the signal is sent to the whole group, so that the children of the shell are also killed.
+        """
+        try:
+            pgid = os.getpgid(pid)
+        except OSError:
+            pgid = None
+        if pgid == pid:
+            os.killpg(pid, sig)
+        else:
+            os.kill(pid, sig)
+
+    def reap(self):
+        """
+        Collect the exit status of the children that have exited.
+
+        :return: A list of (pid, directory, return code) tuples of the exited children.
+        """
+        exited = []
+        for pid in list(self.children.keys()):
+            proc, cwd = self.children[pid]
+            return_code = proc.poll()
+            if return_code is not None:
+                del self.children[pid]
+                exited.append((pid, cwd, return_code))
+        return exited
+
+    def install_sigchld_handler(self):
+        """
+        Install a SIGCHLD handler that writes to a pipe whenever a child exits (the self-pipe trick). The handler does
+        not reap the children itself, so that it does not interfere with other users of waitpid().
+
+        :return: The file descriptor of the read end of the pipe, to be watched by the main loop.
+        """
+        if self.wakeup_r < 0:
+            self.wakeup_r, self.wakeup_w = os.pipe()
+            for fd in [self.wakeup_r, self.wakeup_w]:
+                flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+                fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+                fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.FD_CLOEXEC)
+            signal.signal(signal.SIGCHLD, self._on_sigchld)
+            signal.siginterrupt(signal.SIGCHLD, False)
+        return self.wakeup_r
+
+    def _on_sigchld(self, signum, frame):
+        try:
+            os.write(self.wakeup_w, b'x')
+        except OSError:
+            pass  # the pipe is full, the main loop will wake up anyway
+
+    def drain_wakeup(self):
+        """
+        Empty the wakeup pipe after the main loop has been woken up.
+        """
+        if self.wakeup_r < 0:
+            return
+        while True:
+            try:
+                if len(os.read(self.wakeup_r, 4096)) == 0:
+                    break
+            except OSError as err:
+                if err.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
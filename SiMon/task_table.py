@@ -0,0 +1,227 @@
+"""
+Compact columnar table of the simulation tasks.
+
+The numerical state of every simulation (ID, parent, level, status, model times, timestamps, niceness and restart
+candidate) is stored in a single NumPy structured array, one row per simulation, instead of the attributes of as many
+Python objects. The names and directories are kept in two lists. The campaign-wide questions (number of simulations
+in each status, total progress, least advanced simulations) are answered by vectorized queries over the columns.
+
+A row can be accessed as a TaskView, a light object (with __slots__) reading its attributes from the table, e.g.
+``table.view(table.index_of(42)).status``.
+
+The SimulationTask objects remain the primary store of the daemon: the table mirrors them for the queries. It is built
+once from the simulation tree (see TaskTable.from_tasks()), and the rows of the simulations probed in each cycle are
+then updated in place (see TaskTable.update()).
+"""
+import numpy as np
+
+
+class TaskTable(object):
+
+    # the columns of the table; t_latest is the latest model time reached by the simulation or any of its restarts
+    DTYPE = np.dtype([('id', np.int32), ('parent_id', np.int32), ('level', np.int16), ('status', np.int8),
+                      ('t', np.float64), ('t_latest', np.float64), ('t_min', np.float64), ('t_max', np.float64),
+                      ('mtime', np.float64), ('ctime', np.float64), ('niceness', np.int8), ('cid', np.int32)])
+
+    # the status codes of SimulationTask (not imported, so that the table does not depend on the simulation modules)
+    STATUS_RUN = 0x2
+    STATUS_DONE = 0x4
+    N_STATUSES = 6
+
+    def __init__(self, capacity=0):
+        self.rows = np.zeros(capacity, dtype=TaskTable.DTYPE)
+        self.names = [None] * capacity
+        self.full_dirs = [None] * capacity
+        self.size = 0
+        self.row_of_id = dict()  # simulation ID -> row
+
+    @staticmethod
+    def from_tasks(sim_inst_dict):
+        """
+        Build the table from the simulation tree, in the order of the IDs.
+
+        :param sim_inst_dict: The simulation tasks, indexed by their ID (including the root, ID 0).
+        :return: A TaskTable.
+        """
+        table = TaskTable(len(sim_inst_dict))
+        for sim_id in sorted(sim_inst_dict.keys()):
+            table.append(sim_inst_dict[sim_id])
+        return table
+
+    def append(self, sim):
+        """
+        Add the row of a simulation task. The table grows by doubling its capacity.
+
+        :return: The row of the simulation.
+        """
+        if self.size == len(self.rows):
+            capacity = max(16, 2 * len(self.rows))
+            rows = np.zeros(capacity, dtype=TaskTable.DTYPE)
+            rows[:self.size] = self.rows[:self.size]
+            self.rows = rows
+            self.names.extend([None] * (capacity - len(self.names)))
+            self.full_dirs.extend([None] * (capacity - len(self.full_dirs)))
+        row = self.size
+        self.size += 1
+        self.set_row(row, sim)
+        return row
+
+    def update(self, sim):
+        """
+        Update the row of a simulation task in place, or add it if it is not in the table.
+
+        :return: The row of the simulation.
+        """
+        row = self.row_of_id.get(sim.id)
+        if row is None:
+            return self.append(sim)
+        self.set_row(row, sim)
+        return row
+
+    def set_row(self, row, sim):
+        self.rows[row] = (sim.id, sim.parent_id, sim.level, sim.status, sim.t, sim.t_latest, sim.t_min, sim.t_max,
+                          sim.mtime, sim.ctime, sim.niceness, sim.cid)
+        self.names[row] = sim.name
+        self.full_dirs[row] = sim.full_dir
+        self.row_of_id[sim.id] = row
+
+    def __len__(self):
+        return self.size
+
+    def column(self, name):
+        """
+        :return: A column of the table (a NumPy array, not a copy).
+        """
+        return self.rows[name][:self.size]
+
+    def index_of(self, sim_id):
+        """
+        :return: The row of a simulation given by its ID, or None if not in the table.
+        """
+        return self.row_of_id.get(sim_id)
+
+    def view(self, row):
+        return TaskView(self, row)
+
+    def views(self, rows):
+        return [TaskView(self, row) for row in rows]
+
+    def simulations(self):
+        """
+        :return: A mask of the rows of the simulations, i.e. all rows except the root.
+        """
+        return self.column('id') > 0
+
+    def top_level(self):
+        """
+        :return: A mask of the rows of the top-level simulations (the restarts excluded).
+        """
+        return self.column('level') == 1
+
+    def status_counts(self):
+        """
+        :return: The number of simulations (the root excluded) in each status, as a list indexed by the status code.
+        """
+        statuses = self.column('status')[self.simulations()]
+        return np.bincount(statuses.astype(np.intp), minlength=TaskTable.N_STATUSES).tolist()
+
+    def progress(self, rows=None):
+        """
+        The progress of the simulations: the fraction of their model time range (t_min to t_max) covered by the
+        simulation or any of its restarts, between 0 and 1. A finished simulation is complete.
+
+        :param rows: The rows (default: all rows).
+        :return: An array with the progress of the rows.
+        """
+        columns = self.rows[:self.size]
+        if rows is not None:
+            columns = columns[rows]
+        t_min = columns['t_min']
+        span = columns['t_max'] - t_min
+        done = np.clip(columns['t_latest'] - t_min, 0.0, None)
+        progress = np.divide(done, span, out=np.zeros(len(columns)), where=span > 0)
+        progress = np.clip(progress, 0.0, 1.0)
+        progress[columns['status'] == TaskTable.STATUS_DONE] = 1.0
+        return progress
+
+    def total_progress(self):
+        """
+        :return: The progress of the whole campaign, i.e. the mean progress of the top-level simulations (0 if none).
+        """
+        top_level = self.top_level()
+        if not top_level.any():
+            return 0.0
+        return float(self.progress()[top_level].mean())
+
+    def least_advanced(self, n, statuses=None):
+        """
+        :param n: The number of simulations to return.
+        :param statuses: Only the simulations with these status codes are considered (optional). By default, all the
+                         top-level simulations that are not finished.
+        :return: The TaskViews of the n least advanced top-level simulations, the least advanced first.
+        """
+        mask = self.top_level()
+        status = self.column('status')
+        if statuses is None:
+            mask &= status != TaskTable.STATUS_DONE
+        else:
+            mask &= np.in1d(status, list(statuses))
+        candidates = np.flatnonzero(mask)
+        if n <= 0 or len(candidates) == 0:
+            return []
+        progress = self.progress(candidates)
+        if n < len(candidates):
+            selected = np.argpartition(progress, n - 1)[:n]  # the n smallest, in O(len(candidates))
+        else:
+            selected = np.arange(len(candidates))
+        selected = selected[np.argsort(progress[selected], kind='mergesort')]
+        return self.views(candidates[selected])
+
+    def select(self, statuses=None, max_level=None):
+        """
+        :return: The rows of the simulations with the given status codes and up to the given level (both optional).
+        """
+        mask = self.simulations()
+        if statuses is not None:
+            mask &= np.in1d(self.column('status'), list(statuses))
+        if max_level is not None:
+            mask &= self.column('level') <= max_level
+        return np.flatnonzero(mask)
+
+    def nbytes(self):
+        """
+        :return: The memory used by the columns (the names and directories excluded).
+        """
+        return self.rows.nbytes
+
+
+class TaskView(object):
+    """
+    A simulation task read from a row of a TaskTable.
+    """
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = int(row)
+
+    def __getattr__(self, name):
+        if name in TaskTable.DTYPE.names:
+            return self.table.rows[name][self.row].item()
+        raise AttributeError(name)
+
+    @property
+    def name(self):
+        return self.table.names[self.row]
+
+    @property
+    def full_dir(self):
+        return self.table.full_dirs[self.row]
+
+    @property
+    def progress(self):
+        return float(self.table.progress(np.array([self.row]))[0])
+
+    def __repr__(self):
+        return 'TaskView(#%d %s)' % (self.id, self.name)
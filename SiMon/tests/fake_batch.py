@@ -0,0 +1,79 @@
+"""
+A fake batch system for the tests of BatchExecutor. The jobs run as local processes; the state of the batch system is
+kept in a directory.
+
+Usage: python fake_batch.py <state dir> submit <command>   (in the directory of the job)
+       python fake_batch.py <state dir> status
+       python fake_batch.py <state dir> cancel <job ID>
+
+A job submitted while the file ``hold`` exists in the state directory stays PENDING and is never run.
+"""
+import os
+import sys
+import signal
+import subprocess
+
+
+def submit(state_dir, command):
+    id_fn = os.path.join(state_dir, 'next_id')
+    job_id = 1
+    if os.path.isfile(id_fn):
+        with open(id_fn) as f_id:
+            job_id = int(f_id.read())
+    with open(id_fn, 'w') as f_id:
+        f_id.write('%d' % (job_id + 1))
+    job_fn = os.path.join(state_dir, '%d.job' % job_id)
+    if os.path.isfile(os.path.join(state_dir, 'hold')):
+        with open(job_fn, 'w') as f_job:
+            f_job.write('PENDING')
+    else:
+        exit_fn = os.path.join(state_dir, '%d.exit' % job_id)
+        dev_null = open(os.devnull, 'r+')
+        proc = subprocess.Popen('%s; echo $? > %s' % (command, exit_fn), shell=True, stdin=dev_null,
+                                stdout=dev_null, stderr=dev_null, close_fds=True, preexec_fn=os.setsid)
+        with open(job_fn, 'w') as f_job:
+            f_job.write('%d' % proc.pid)
+    print('Submitted batch job %d' % job_id)
+
+
+def status(state_dir):
+    query_fn = os.path.join(state_dir, 'n_queries')
+    n_queries = 0
+    if os.path.isfile(query_fn):
+        with open(query_fn) as f_query:
+            n_queries = int(f_query.read())
+    with open(query_fn, 'w') as f_query:
+        f_query.write('%d' % (n_queries + 1))
+    for fn in sorted(os.listdir(state_dir)):
+        if fn.endswith('.job'):
+            job_id = fn[:-len('.job')]
+            with open(os.path.join(state_dir, fn)) as f_job:
+                pid = f_job.read()
+            if pid == 'PENDING':
+                print('%s PENDING' % job_id)
+            elif not os.path.isfile(os.path.join(state_dir, '%s.exit' % job_id)):
+                print('%s RUNNING' % job_id)
+
+
+def cancel(state_dir, job_id):
+    job_fn = os.path.join(state_dir, '%s.job' % job_id)
+    if not os.path.isfile(job_fn):
+        sys.stderr.write('Invalid job id specified: %s\n' % job_id)
+        sys.exit(1)
+    with open(job_fn) as f_job:
+        pid = f_job.read()
+    if pid != 'PENDING':
+        try:
+            os.killpg(int(pid), signal.SIGKILL)
+        except OSError:
+            pass
+    os.remove(job_fn)
+
+
+if __name__ == '__main__':
+    if sys.argv[2] == 'submit':
+        submit(sys.argv[1], sys.argv[3])
+    elif sys.argv[2] == 'status':
+        status(sys.argv[1])
+    elif sys.argv[2] == 'cancel':
+        cancel(sys.argv[1], sys.argv[3])
@@ -0,0 +1,150 @@
+from ..checkpoint import CheckpointStore, CheckpointArchiver
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+
+class BlockedStore(object):
+    """
+    A store whose backup is held until released.
+    """
+    def __init__(self, sim_dir):
+        self.sim_dir = sim_dir
+        self.bytes_copied = 0
+        self.release = threading.Event()
+
+    def backup(self):
+        self.release.wait()
+        return 1, None
+
+
+class TestCheckpointStore(unittest.TestCase):
+    def setUp(self):
+        self.sim_dir = tempfile.mkdtemp()
+        self.restart_fn = os.path.join(self.sim_dir, 'restart.txt')
+        self.write_restart_file('T = 1\n', 1.e9)
+
+    def tearDown(self):
+        shutil.rmtree(self.sim_dir)
+
+    def write_restart_file(self, content, mtime):
+        with open(self.restart_fn, 'w') as f_restart:
+            f_restart.write(content)
+        os.utime(self.restart_fn, (mtime, mtime))
+
+    def test_unchanged_file_is_not_copied(self):
+        store = CheckpointStore(self.sim_dir, 'restart.txt', max_backups=2, stable_time=60)
+        ret, first = store.backup()
+        self.assertEqual(ret, 0)
+        with open(os.path.join(self.sim_dir, first), 'r') as f_backup:
+            self.assertEqual(f_backup.read(), 'T = 1\n')
+        self.assertEqual(store.backup(), (1, first))
+
+        # rewritten with the same contents: hashed, but not copied
+        self.write_restart_file('T = 1\n', 1.e9 + 10)
+        self.assertEqual(store.backup(), (1, first))
+        self.assertIsNotNone(store.load_manifest()[first]['digest'])
+
+        # new contents: copied, and the oldest backups are pruned
+        for t in [2, 3]:
+            self.write_restart_file('T = %d\n' % t, 1.e9 + 10 * t)
+            ret, newest = store.backup()
+            self.assertEqual(ret, 0)
+        self.assertEqual(len(store.list_backups()), 2)
+        self.assertNotIn(first, store.list_backups())
+        self.assertEqual(store.list_backups()[-1], newest)
+        self.assertEqual(sorted(store.load_manifest().keys()), store.list_backups())
+
+    def test_file_being_written_is_not_copied(self):
+        store = CheckpointStore(self.sim_dir, 'restart.txt', stable_time=60)
+        with open(self.restart_fn, 'a') as f_restart:
+            f_restart.write('T = 2\n')
+        self.assertEqual(store.backup(), (1, None))
+        self.assertEqual(store.list_backups(), [])
+
+    def test_frequently_rewritten_file_is_copied(self):
+        store = CheckpointStore(self.sim_dir, 'restart.txt', stable_time=60)
+        with open(self.restart_fn, 'w') as f_restart:
+            f_restart.write('T = 2\n')
+        self.assertEqual(store.backup(), (1, None))  # first probe of a fresh file
+        # rewritten in place before the next cycle: same size as at the previous probe
+        with open(self.restart_fn, 'w') as f_restart:
+            f_restart.write('T = 3\n')
+        ret, first = store.backup()
+        self.assertEqual(ret, 0)
+        with open(os.path.join(self.sim_dir, first), 'r') as f_backup:
+            self.assertEqual(f_backup.read(), 'T = 3\n')
+
+        # written elsewhere and renamed into place, with a different size
+        tmp_fn = os.path.join(self.sim_dir, 'restart.new')
+        with open(tmp_fn, 'w') as f_restart:
+            f_restart.write('T = 40\n')
+        time.sleep(0.05)  # the status change is later than the modification, even with a coarse clock
+        os.rename(tmp_fn, self.restart_fn)
+        ret, second = store.backup()
+        self.assertEqual(ret, 0)
+        self.assertEqual(store.list_backups(), [first, second])
+
+    def test_copy_file(self):
+        data = os.urandom(3 * CheckpointStore.CHUNK_SIZE + 7)
+        with open(self.restart_fn, 'wb') as f_restart:
+            f_restart.write(data)
+        dst = os.path.join(self.sim_dir, 'copy')
+        self.assertIn(CheckpointStore.copy_file(self.restart_fn, dst), ['reflink', 'copy'])
+        with open(dst, 'rb') as f_copy:
+            self.assertEqual(f_copy.read(), data)
+
+    def test_compressed_backup_and_restore(self):
+        store = CheckpointStore(self.sim_dir, 'restart.txt', stable_time=60, compression='gzip')
+        ret, backup_name = store.backup()
+        self.assertEqual(ret, 0)
+        self.assertTrue(backup_name.endswith('.gz'))
+        self.assertIsNotNone(store.load_manifest()[backup_name]['digest'])
+        # touched, but identical to the compressed backup
+        self.write_restart_file('T = 1\n', 1.e9 + 10)
+        self.assertEqual(store.backup(), (1, backup_name))
+        # an uncompressed backup made afterwards is newer
+        self.write_restart_file('T = 2\n', 1.e9 + 20)
+        ret, newest = CheckpointStore(self.sim_dir, 'restart.txt', stable_time=60).backup()
+        self.assertEqual(store.list_backups(), [backup_name, newest])
+
+        os.remove(self.restart_fn)
+        self.assertEqual(store.restore(backup_name), backup_name)
+        with open(self.restart_fn, 'r') as f_restart:
+            self.assertEqual(f_restart.read(), 'T = 1\n')
+        self.assertEqual(store.restore(), newest)
+        with open(self.restart_fn, 'r') as f_restart:
+            self.assertEqual(f_restart.read(), 'T = 2\n')
+
+    def test_background_archiver(self):
+        archiver = CheckpointArchiver(workers=2, compression='bz2')
+        store = CheckpointStore(self.sim_dir, 'restart.txt', stable_time=60, compression=archiver.compression)
+        results = []
+        self.assertEqual(archiver.submit(store, results.append), 0)
+        archiver.wait()
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][0], 0)
+        self.assertTrue(results[0][1].endswith('.bz2'))
+        self.assertEqual(archiver.pending, set())
+        archiver.close()
+        self.assertRaises(ValueError, CheckpointArchiver, 1, 'zip')
+
+    def test_wait_for_one_simulation(self):
+        archiver = CheckpointArchiver(workers=1)
+        blocked = BlockedStore(os.path.join(self.sim_dir, 'other'))
+        self.assertEqual(archiver.submit(blocked), 0)
+        archiver.wait(self.sim_dir)  # nothing pending for this simulation: does not wait for the other one
+        self.assertEqual(archiver.pending, set([blocked.sim_dir]))
+
+        waiter = threading.Thread(target=archiver.wait, args=(blocked.sim_dir,))
+        waiter.start()
+        waiter.join(0.1)
+        self.assertTrue(waiter.is_alive())
+        blocked.release.set()
+        waiter.join(10.0)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(archiver.pending, set())
+        archiver.close()
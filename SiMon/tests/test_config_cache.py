@@ -0,0 +1,78 @@
+from ..config_cache import ConfigCache
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+
+class TestConfigCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_config(self, name, value, age=60.0):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w') as f_conf:
+            f_conf.write('[Simulation]\nT_end = %s\n' % value)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_unchanged_file_is_a_hit(self):
+        cache = ConfigCache()
+        path = self.write_config('SiMon.conf', 10)
+        conf = cache.parse(path)
+        self.assertEqual(conf.get('Simulation', 'T_end'), '10')
+        self.assertIs(cache.parse(path), conf)
+        self.assertEqual((cache.n_hits, cache.n_misses), (1, 1))
+
+    def test_modified_file_is_parsed_again(self):
+        cache = ConfigCache()
+        path = self.write_config('SiMon.conf', 10)
+        cache.parse(path)
+        self.write_config('SiMon.conf', 200, age=30.0)
+        self.assertEqual(cache.parse(path).get('Simulation', 'T_end'), '200')
+        self.assertEqual(cache.n_misses, 2)
+
+    def test_recently_modified_file_is_not_cached(self):
+        cache = ConfigCache(racy_time=2.0)
+        path = self.write_config('SiMon.conf', 10, age=0.0)
+        cache.parse(path)
+        cache.parse(path)
+        self.assertEqual((cache.n_hits, cache.n_misses), (0, 2))
+        self.assertEqual(len(cache.entries), 0)
+
+    def test_missing_file_and_invalidation(self):
+        cache = ConfigCache()
+        path = self.write_config('SiMon.conf', 10)
+        cache.parse(path)
+        cache.invalidate(path)
+        cache.parse(path)
+        self.assertEqual(cache.n_misses, 2)
+        os.remove(path)
+        self.assertIsNone(cache.parse(path))
+        self.assertEqual(len(cache.entries), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ConfigCache(max_entries=2)
+        paths = [self.write_config('SiMon%d.conf' % i, i) for i in range(3)]
+        cache.parse(paths[0])
+        cache.parse(paths[1])
+        cache.parse(paths[0])  # paths[1] is now the least recently used
+        cache.parse(paths[2])
+        self.assertEqual(list(cache.entries.keys()), [paths[0], paths[2]])
+        self.assertEqual(cache.n_evictions, 1)
+
+    def test_no_caching(self):
+        cache = ConfigCache(max_entries=0)
+        path = self.write_config('SiMon.conf', 10)
+        cache.parse(path)
+        cache.parse(path)
+        self.assertEqual((cache.n_hits, cache.n_misses), (0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
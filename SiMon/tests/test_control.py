@@ -0,0 +1,101 @@
+from ..control import ControlServer, ControlClient
+from ..module_common import SimulationTask
+from ..overview import OverviewFilter
+import os
+import select
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+class FakeSiMon(object):
+    def __init__(self, root_dir):
+        self.sim_tree = SimulationTask(0, 'root', root_dir, SimulationTask.STATUS_NEW)
+        self.sim_inst_dict = {0: self.sim_tree}
+        self.refreshed = []
+        for i, status in [(1, SimulationTask.STATUS_RUN), (2, SimulationTask.STATUS_DONE),
+                          (3, SimulationTask.STATUS_NEW)]:
+            sim_dir = os.path.join(root_dir, 'sim_%d' % i)
+            os.mkdir(sim_dir)
+            with open(os.path.join(sim_dir, 'SiMon.conf'), 'w') as f_conf:
+                f_conf.write('[Simulation]\nCode_name = DemoSimulation\nOutput_file = output.txt\nT_end = 30\n'
+                             'Start_command = sleep 60\n')
+            sim = SimulationTask(i, 'sim_%d' % i, sim_dir, status)
+            sim.level = 1
+            self.sim_tree.restarts.append(sim)
+            self.sim_inst_dict[i] = sim
+
+    def refresh_simulations(self, sim_dirs):
+        self.refreshed.extend(sim_dirs)
+
+
+class TestControl(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = FakeSiMon(self.tmp_dir)
+        self.server = ControlServer(self.app, os.path.join(self.tmp_dir, 'control.sock'))
+        self.server.open()
+        self.client = ControlClient(self.server.socket_path, timeout=10.0)
+        self.stopped = False
+        self.thread = threading.Thread(target=self.serve)  # the main loop of the daemon
+        self.thread.start()
+
+    def tearDown(self):
+        self.stopped = True
+        self.thread.join()
+        self.server.close()
+        self.app.sim_inst_dict[3].sim_kill()
+        shutil.rmtree(self.tmp_dir)
+
+    def serve(self):
+        while not self.stopped:
+            readable, _, _ = select.select([self.server.fileno()], [], [], 0.05)
+            if len(readable) > 0:
+                self.server.handle_pending()
+
+    def test_list_and_status(self):
+        self.assertTrue(self.client.is_available())
+        reply = self.client.request('list', status=['RUN', 'NEW'])
+        self.assertTrue(reply['ok'])
+        self.assertEqual(reply['matched'], 2)
+        self.assertEqual([task['name'] for task in reply['tasks']], ['sim_1', 'sim_3'])
+        self.assertEqual(reply['tasks'][0]['status'], 'RUN')
+
+        reply = self.client.request('list', **ControlClient.filter_args(OverviewFilter(offset=1, limit=1)))
+        self.assertEqual(reply['matched'], 3)
+        self.assertEqual([task['id'] for task in reply['tasks']], [2])
+
+        reply = self.client.request('status', ids=[2, 42])
+        self.assertEqual(reply['tasks'][0]['status'], 'DONE')
+        self.assertEqual(reply['unknown'], [42])
+
+        reply = self.client.request('overview', name='sim_2')
+        self.assertIn('sim_2', reply['text'])
+        self.assertNotIn('sim_1', reply['text'])
+
+    def test_commands(self):
+        reply = self.client.request('start', ids=[3])
+        self.assertEqual(reply['results'], {'3': 0})
+        self.assertEqual(self.app.refreshed, [self.app.sim_inst_dict[3].full_dir])
+        self.assertIsNotNone(SimulationTask.executor.read_job_id(self.app.sim_inst_dict[3].full_dir))
+
+        self.assertFalse(self.server.rescan_requested)
+        self.assertTrue(self.client.request('rescan')['ok'])
+        self.assertTrue(self.server.rescan_requested)
+
+    def test_invalid_requests(self):
+        self.assertFalse(self.client.request('format_disk')['ok'])
+        self.assertFalse(self.client.request('list', status=['RUNNING'])['ok'])
+        self.assertFalse(self.client.request('kill')['ok'])  # no IDs
+        self.assertTrue(self.client.request('ping')['ok'])  # still serving
+
+    def test_no_daemon(self):
+        client = ControlClient(os.path.join(self.tmp_dir, 'none.sock'))
+        self.assertFalse(client.is_available())
+        with self.assertRaises(IOError):
+            client.request('ping')
+
+
+if __name__ == '__main__':
+    unittest.main()
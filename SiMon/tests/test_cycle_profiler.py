@@ -0,0 +1,55 @@
+from ..cycle_profiler import CycleProfiler
+from ..metrics import create_daemon_metrics
+from ..module_common import SimulationTask
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class FakeSiMon(object):
+    def __init__(self, sim_dir):
+        self.metrics = create_daemon_metrics()
+        self.sim = SimulationTask(1, 'sim', sim_dir, SimulationTask.STATUS_NEW)
+        self.sim_inst_dict = {0: None, 1: self.sim}
+
+    def auto_scheduler(self):
+        self.metrics.begin_cycle()
+        SimulationTask.begin_probe_cycle()
+        with self.metrics.phase('probe'):
+            self.sim.sim_get_status()
+        self.metrics.end_cycle('full')
+
+
+class TestCycleProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.tmp_dir, 'SiMon.conf'), 'w') as f_conf:
+            f_conf.write('[Simulation]\nCode_name = DemoSimulation\nOutput_file = output.txt\nT_end = 30\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_report(self):
+        profiler = CycleProfiler(self.tmp_dir)
+        report_file = profiler.run(FakeSiMon(self.tmp_dir), 3)
+        self.assertIsNone(SimulationTask.probe_latencies)
+        self.assertEqual(len(profiler.cycle_times), 3)
+        self.assertEqual(len(profiler.probe_latencies), 3)
+        self.assertTrue(os.path.isfile(report_file[:-len('.txt')] + '.pstats'))
+        report = open(report_file).read()
+        self.assertIn('3 scheduler cycles on 1 simulations', report)
+        self.assertIn('Status probe latency (3 probes)', report)
+        self.assertRegexpMatches(report, r'status probes +[0-9.]+ s +3 calls')
+
+    def test_latency_histogram(self):
+        lines = CycleProfiler.latency_histogram([5e-5, 2e-4, 2e-4, 10.0], width=10)
+        self.assertEqual(len(lines), len(CycleProfiler.LATENCY_BINS) + 1)
+        self.assertEqual(lines[0].split(), ['<=', '0.1', 'ms', '1', '#####'])
+        self.assertEqual(lines[1].split(), ['<=', '0.3', 'ms', '2', '##########'])
+        self.assertEqual(lines[-1].split(), ['>', '3000', 'ms', '1', '#####'])
+        self.assertEqual(CycleProfiler.percentile([1, 2, 3, 4], 0.5), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
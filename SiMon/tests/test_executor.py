@@ -0,0 +1,114 @@
+from ..executor import BatchExecutor
+from ..module_common import SimulationTask
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+FAKE_BATCH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_batch.py')
+
+
+class TestBatchExecutor(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.sim_dir = tempfile.mkdtemp()
+        fake_batch = '%s %s %s' % (sys.executable, FAKE_BATCH, self.state_dir)
+        self.executor = BatchExecutor(submit_command=fake_batch + ' submit {command}',
+                                      status_command=fake_batch + ' status',
+                                      cancel_command=fake_batch + ' cancel {job_id}')
+        self.local_executor = SimulationTask.executor
+
+    def tearDown(self):
+        SimulationTask.executor = self.local_executor
+        for fn in os.listdir(self.state_dir):
+            if fn.endswith('.job'):
+                self.executor.cancel(fn[:-len('.job')])
+        shutil.rmtree(self.state_dir)
+        shutil.rmtree(self.sim_dir)
+
+    def n_queries(self):
+        with open(os.path.join(self.state_dir, 'n_queries')) as f_query:
+            return int(f_query.read())
+
+    def test_submit_poll_and_cancel(self):
+        job_id = self.executor.submit('sleep 60', self.sim_dir)
+        self.assertEqual(job_id, '1')
+        self.assertEqual(self.executor.read_job_id(self.sim_dir), '1')
+        self.executor.begin_cycle()
+        self.assertTrue(self.executor.is_running(job_id))
+        self.assertTrue(self.executor.is_started(job_id))
+        self.assertFalse(self.executor.is_running('42'))
+        self.assertEqual(self.n_queries(), 1)  # a single query per cycle for all jobs
+
+        self.executor.cancel(job_id)
+        self.executor.begin_cycle()
+        self.assertFalse(self.executor.is_running(job_id))
+        self.assertEqual(self.n_queries(), 2)
+
+    def test_finished_job(self):
+        self.executor.submit_grace_time = 0  # otherwise assumed to be running until listed by the status command
+        job_id = self.executor.submit('echo 12 > output.txt', self.sim_dir)
+        deadline = time.time() + 10
+        while not os.path.isfile(os.path.join(self.state_dir, '%s.exit' % job_id)) and time.time() < deadline:
+            time.sleep(0.05)
+        self.executor.begin_cycle()
+        self.assertFalse(self.executor.is_running(job_id))
+        with open(os.path.join(self.sim_dir, 'output.txt')) as f_out:
+            self.assertEqual(f_out.read(), '12\n')
+
+    def test_queued_job_is_running_but_not_started(self):
+        open(os.path.join(self.state_dir, 'hold'), 'w').close()
+        job_id = self.executor.submit('sleep 60', self.sim_dir)
+        self.executor.begin_cycle()
+        self.assertTrue(self.executor.is_running(job_id))
+        self.assertFalse(self.executor.is_started(job_id))
+
+    def test_unknown_states(self):
+        self.executor.submit_grace_time = 3600
+        self.executor.status_command = 'false'
+        job_id = self.executor.submit('sleep 60', self.sim_dir)
+        self.executor.begin_cycle()
+        self.assertTrue(self.executor.is_running(job_id))  # not started twice if the batch system does not answer
+        self.assertTrue(self.executor.is_running('42'))
+
+    def test_simulation_task_on_batch_system(self):
+        with open(os.path.join(self.sim_dir, 'SiMon.conf'), 'w') as f_conf:
+            f_conf.write('[Simulation]\nCode_name = DemoSimulation\nOutput_file = output.txt\nT_end = 30\n'
+                         'Start_command = echo 1.0 > output.txt; sleep 60\n')
+        SimulationTask.executor = self.executor
+        SimulationTask.begin_probe_cycle()
+        sim = SimulationTask(1, 'sim', self.sim_dir, SimulationTask.STATUS_NEW)
+        self.assertEqual(sim.sim_start(), 0)
+        self.assertEqual(sim.config.get('Simulation', 'PID'), '1')
+        SimulationTask.begin_probe_cycle()
+        self.assertEqual(sim.sim_get_status(), SimulationTask.STATUS_RUN)
+        self.assertEqual(sim.sim_start(), 1)  # already running
+
+        self.assertEqual(sim.sim_kill(), 0)
+        SimulationTask.begin_probe_cycle()
+        self.assertEqual(sim.sim_get_status(), SimulationTask.STATUS_STOP)
+
+    def test_failed_submission(self):
+        with open(os.path.join(self.sim_dir, 'SiMon.conf'), 'w') as f_conf:
+            f_conf.write('[Simulation]\nCode_name = DemoSimulation\nOutput_file = output.txt\nT_end = 30\n'
+                         'Start_command = sleep 60\n')
+        self.executor.submit_command = 'echo sbatch: error: invalid partition >&2; false'
+        SimulationTask.executor = self.executor
+        sim = SimulationTask(1, 'sim', self.sim_dir, SimulationTask.STATUS_NEW)
+        self.assertEqual(sim.sim_start(), -1)
+        self.assertIsNone(self.executor.read_job_id(self.sim_dir))
+
+    def test_non_ascii_output(self):
+        self.executor.status_command = "printf 'squeue: erreur: d\\303\\251lai d\\303\\251pass\\303\\251\\n' >&2; false"
+        self.assertEqual(self.executor.get_state('42'), 'UNKNOWN')  # the query failed: the state is unknown
+        self.assertTrue(self.executor.query_failed)
+
+        self.executor.begin_cycle()
+        self.executor.status_command = "printf '42 RUNNING sim_\\303\\251\\n'"
+        self.assertEqual(self.executor.get_state('42'), 'RUNNING')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+from ..ic_generator import InitialConditionGenerator
+import os
+import json
+import shutil
+import tempfile
+import unittest
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class TestInitialConditionGenerator(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ic = InitialConditionGenerator(os.path.join(self.tmp_dir, 'SiMon.conf'))
+        self.ic.sim_data_dir = self.tmp_dir
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_generate_simulations(self):
+        columns = {'a': [1.0, 2.0, 3.0], 'e': [0.1, 0.2, 0.3]}
+        dirs = self.ic.generate_simulations('DemoSimulation', 30, columns, 'sim_a=%(a)g_e=%(e)g',
+                                            'run -a %(a)f -e %(e)f -x %(x)s', restart_cmd_template='restart %(index)d',
+                                            constants={'x': 'y'}, workers=2, output_file='output.txt')
+        self.assertEqual(dirs, ['sim_a=1_e=0.1', 'sim_a=2_e=0.2', 'sim_a=3_e=0.3'])
+        conf = open(os.path.join(self.tmp_dir, 'sim_a=2_e=0.2', 'SiMon.conf')).read()
+        self.assertIn('Start_command: run -a 2.000000 -e 0.200000 -x y\n', conf)
+        self.assertIn('Restart_command: restart 1\n', conf)
+        self.assertIn('Output_file = output.txt\n', conf)
+        # the same config as a simulation generated on its own
+        self.ic.generate_simulation_ic('DemoSimulation', 30, 'single', 'run -a 2.000000 -e 0.200000 -x y',
+                                       output_file='output.txt', restart_cmd='restart 1')
+        self.assertEqual(open(os.path.join(self.tmp_dir, 'single', 'SiMon.conf')).read(), conf)
+        manifest = json.load(open(os.path.join(self.tmp_dir, 'sweep_manifest.json')))
+        self.assertEqual(manifest['directories'], dirs)
+        self.assertEqual(manifest['values']['e'], [0.1, 0.2, 0.3])
+
+    def test_directory_names_must_be_unique(self):
+        self.assertRaises(ValueError, self.ic.generate_simulations, 'DemoSimulation', 30, {'a': [1.0, 1.0]},
+                          'sim_a=%(a)g', 'run')
+
+    def test_columns_must_have_the_same_length(self):
+        self.assertRaises(ValueError, self.ic.generate_simulations, 'DemoSimulation', 30,
+                          {'a': [1.0, 2.0, 3.0], 'e': [0.1, 0.2]}, 'sim_%(index)d', 'run')
+        self.assertEqual(os.listdir(self.tmp_dir), [])  # nothing generated
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_numpy_seed(self):
+        self.ic.generate_simulations('DemoSimulation', 30, {'a': np.array([1.0, 2.0])}, 'sim_%(index)d', 'run',
+                                     sampling='random', seed=np.int32(7))
+        manifest = json.load(open(os.path.join(self.tmp_dir, 'sweep_manifest.json')))
+        self.assertEqual(manifest['seed'], 7)
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_sampling(self):
+        columns = InitialConditionGenerator.sample_parameters([('a', np.array([1.0, 2.0])), ('e', range(3))])
+        self.assertEqual(list(columns['a']), [1.0, 1.0, 1.0, 2.0, 2.0, 2.0])
+        self.assertEqual(list(columns['e']), [0, 1, 2, 0, 1, 2])
+        columns = InitialConditionGenerator.sample_parameters([('a', (0.0, 10.0)), ('e', (0.0, 1.0))], 'lhs', 10,
+                                                               seed=1)
+        # one sample in every tenth of the range of every parameter
+        self.assertEqual(sorted((columns['a'] // 1.0).astype(int)), list(range(10)))
+        self.assertEqual(sorted((columns['e'] // 0.1).astype(int)), list(range(10)))
+        columns = InitialConditionGenerator.sample_parameters([('a', (5.0, 6.0))], 'random', 100, seed=1)
+        self.assertTrue(np.all((columns['a'] >= 5.0) & (columns['a'] < 6.0)))
+        self.assertRaises(ValueError, InitialConditionGenerator.sample_parameters, [('a', (0, 1))], 'lhs')
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_generate_sweep(self):
+        dirs = self.ic.generate_sweep('DemoSimulation', 30, [('a', (0.0, 1.0))], 'sim_%(index)05d', 'run %(a)f',
+                                      sampling='random', n_samples=50, seed=2)
+        self.assertEqual(len(dirs), 50)
+        self.assertEqual(len(os.listdir(self.tmp_dir)), 51)  # and the manifest
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+from ..metrics import MetricsRegistry, create_daemon_metrics
+import os
+import shutil
+import tempfile
+import time
+import unittest
+try:
+    from urllib.request import urlopen  # Python 3 only
+except ImportError:
+    from urllib2 import urlopen  # Python 2 only
+
+
+class TestMetrics(unittest.TestCase):
+    def test_render(self):
+        metrics = create_daemon_metrics()
+        metrics.set('simon_simulations', 3, status='RUN')
+        metrics.inc('simon_kills_total')
+        metrics.inc('simon_kills_total')
+        metrics.observe('simon_launch_latency_seconds', 0.02)
+        metrics.observe('simon_launch_latency_seconds', 2.0)
+        text = metrics.render()
+        self.assertIn('# TYPE simon_simulations gauge\nsimon_simulations{status="RUN"} 3\n', text)
+        self.assertIn('simon_kills_total 2\n', text)
+        self.assertIn('simon_launch_latency_seconds_bucket{le="0.01"} 0\n', text)
+        self.assertIn('simon_launch_latency_seconds_bucket{le="0.05"} 1\n', text)
+        self.assertIn('simon_launch_latency_seconds_bucket{le="+Inf"} 2\n', text)
+        self.assertIn('simon_launch_latency_seconds_count 2\n', text)
+
+    def test_nested_phases_are_exclusive(self):
+        metrics = create_daemon_metrics()
+        metrics.begin_cycle()
+        with metrics.phase('schedule'):
+            with metrics.phase('backup'):
+                time.sleep(0.05)
+        metrics.end_cycle('full')
+        self.assertLess(metrics.get('simon_cycle_phase_duration_seconds', phase='schedule'), 0.04)
+        self.assertGreaterEqual(metrics.get('simon_cycle_phase_duration_seconds', phase='backup'), 0.04)
+        self.assertEqual(metrics.get('simon_cycle_phase_duration_seconds', phase='walk'), 0.0)
+        self.assertEqual(metrics.get('simon_cycles_total', mode='full'), 1)
+
+    def test_write_and_serve(self):
+        metrics = MetricsRegistry()
+        metrics.describe('simon_test', 'gauge', 'A test metric.')
+        metrics.set('simon_test', 1.5)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            metrics_file = os.path.join(tmp_dir, 'simon.prom')
+            metrics.write(metrics_file)
+            self.assertEqual(os.listdir(tmp_dir), ['simon.prom'])
+            self.assertIn('simon_test 1.5\n', open(metrics_file).read())
+        finally:
+            shutil.rmtree(tmp_dir)
+        server = metrics.serve(0)
+        try:
+            body = urlopen('http://127.0.0.1:%d/metrics' % server.server_address[1]).read().decode('utf-8')
+            self.assertIn('simon_test 1.5\n', body)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
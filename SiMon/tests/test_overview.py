@@ -0,0 +1,63 @@
+from ..module_common import SimulationTask
+from ..overview import OverviewFilter, write_overview
+import unittest
+try:
+    from StringIO import StringIO  # Python 2 only
+except ImportError:
+    from io import StringIO  # Python 3 only
+
+
+class TestOverview(unittest.TestCase):
+    def setUp(self):
+        # sim_1 (STOP) -> restart1 (RUN), sim_2 (NEW), sim_3 (DONE)
+        self.root = SimulationTask(0, 'root', '/nonexistent', SimulationTask.STATUS_NEW)
+        sim_id = 0
+        for name, status in [('sim_1', SimulationTask.STATUS_STOP), ('sim_2', SimulationTask.STATUS_NEW),
+                             ('sim_3', SimulationTask.STATUS_DONE)]:
+            sim_id += 1
+            sim = SimulationTask(sim_id, name, '/nonexistent/%s' % name, status)
+            sim.status = status
+            self.root.restarts.append(sim)
+        restart = SimulationTask(4, 'restart1', '/nonexistent/sim_1/restart1', SimulationTask.STATUS_RUN)
+        restart.status = SimulationTask.STATUS_RUN
+        self.root.restarts[0].restarts.append(restart)
+
+    def overview(self, overview_filter=None):
+        out = StringIO()
+        ret = write_overview(self.root.sim_overview_rows(), out, overview_filter)
+        return out.getvalue().splitlines(), ret
+
+    def test_pre_order(self):
+        lines, (n_shown, n_matched) = self.overview()
+        self.assertEqual([line.split('\t')[0] for line in lines], ['[NEW] /nonexistent', '[STOP]', '[RUN]', '[NEW]',
+                                                                   '[DONE]'])
+        self.assertEqual((n_shown, n_matched), (4, 4))
+        self.assertEqual(repr(self.root), '\n'.join(lines) + '\n')
+
+    def test_filters(self):
+        lines, _ = self.overview(OverviewFilter(statuses=['run', 'DONE']))
+        self.assertEqual(len(lines), 3)
+        self.assertIn('restart1', lines[1])
+        self.assertIn('sim_3', lines[2])
+        lines, _ = self.overview(OverviewFilter(max_level=1, name='sim_[12]'))
+        self.assertEqual(len(lines), 3)
+        self.assertIn('sim_2', lines[2])
+        self.assertRaises(ValueError, OverviewFilter, ['BOGUS'])
+
+    def test_pagination(self):
+        lines, (n_shown, n_matched) = self.overview(OverviewFilter(offset=1, limit=2))
+        self.assertEqual((n_shown, n_matched), (2, 4))
+        self.assertIn('restart1', lines[1])
+        self.assertIn('sim_2', lines[2])
+        self.assertEqual(lines[-1], '-- 2 to 3 of 4 matching simulations shown --')
+
+    def test_command_line(self):
+        overview_filter = OverviewFilter.from_args(['--status', 'RUN,STALL', '--name', 'sim_*', '--limit', '50'])
+        self.assertEqual(overview_filter.statuses, set([SimulationTask.STATUS_RUN, SimulationTask.STATUS_STALL]))
+        self.assertEqual(overview_filter.name, 'sim_*')
+        self.assertEqual(overview_filter.limit, 50)
+        self.assertEqual(overview_filter.offset, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+from ..progress import ProgressHistory
+from ..utilities import Utilities
+import unittest
+
+
+class TestProgressHistory(unittest.TestCase):
+    def test_ring_buffer_and_sample_interval(self):
+        history = ProgressHistory(capacity=4, sample_interval=10.0)
+        for i in range(10):
+            history.add(i * 10.0, float(i))
+        history.add(95.0, 9.5)  # too close to the newest sample, only kept as the latest probe
+        samples = history.samples()
+        self.assertEqual(samples[0], (60.0, 6.0))
+        self.assertEqual(samples[-2], (90.0, 9.0))
+        self.assertEqual(samples[-1], (95.0, 9.5))
+        self.assertEqual(len(history.buffer), 8)
+
+    def test_rate_and_eta(self):
+        history = ProgressHistory(capacity=8, sample_interval=1.0)
+        self.assertIsNone(history.eta(100.0))
+        for i in range(5):
+            history.add(100.0 + i * 10.0, i * 5.0)
+        self.assertAlmostEqual(history.rate(), 0.5)
+        self.assertAlmostEqual(history.eta(100.0), 160.0)
+        history.add(150.0, 0.0)  # started from scratch again
+        self.assertIsNone(history.rate())
+
+    def test_frozen_model_time_is_stalled(self):
+        history = ProgressHistory(capacity=64, sample_interval=60.0)
+        for i in range(20):
+            history.add(i * 60.0, i * 1.0)
+        self.assertFalse(history.is_stalled(600.0, 0.0))
+        for i in range(20, 40):
+            history.add(i * 60.0, 19.0)
+        self.assertTrue(history.is_stalled(600.0, 0.0))
+        self.assertFalse(history.is_stalled(0, 0.0))
+
+    def test_slow_down_is_not_stalled_at_ratio_zero(self):
+        history = ProgressHistory(capacity=64, sample_interval=60.0)
+        for i in range(40):
+            history.add(i * 60.0, min(i, 20) + 0.001 * max(i - 20, 0))
+        self.assertFalse(history.is_stalled(600.0, 0.0))
+        self.assertTrue(history.is_stalled(600.0, 0.01))
+
+    def test_rare_reports_widen_the_window(self):
+        # the code reports its model time only every 20 min
+        history = ProgressHistory(capacity=64, sample_interval=60.0)
+        for i in range(50):
+            history.add(i * 60.0, float(i // 20))
+        self.assertFalse(history.is_stalled(600.0, 0.0))
+
+    def test_format_duration(self):
+        self.assertEqual(Utilities.format_duration(45), '45s')
+        self.assertEqual(Utilities.format_duration(750), '12m30s')
+        self.assertEqual(Utilities.format_duration(3 * 3600 + 300), '3h05m')
+        self.assertEqual(Utilities.format_duration(2 * 86400 + 7 * 3600), '2d07h')
+
+
+if __name__ == '__main__':
+    unittest.main()
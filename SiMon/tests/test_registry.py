@@ -0,0 +1,41 @@
+from ..registry import ModuleRegistry
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+
+class TestModuleRegistry(unittest.TestCase):
+    def setUp(self):
+        self.mod_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.mod_dir, 'module_registry_test_code.py'), 'w') as f_mod:
+            f_mod.write("import os\n\n__simulation__ = 'RegistryTestCode'\n\n\nclass RegistryTestCode(object):\n"
+                        "    pass\n")
+        with open(os.path.join(self.mod_dir, 'module_registry_test_helper.py'), 'w') as f_mod:
+            f_mod.write('# not a SiMon module\n')
+        self.manifest_file = os.path.join(self.mod_dir, ModuleRegistry.MANIFEST_FILE)
+
+    def tearDown(self):
+        shutil.rmtree(self.mod_dir)
+        if self.mod_dir in sys.path:
+            sys.path.remove(self.mod_dir)
+        sys.modules.pop('module_registry_test_code', None)
+
+    def test_lazy_import(self):
+        registry = ModuleRegistry([self.mod_dir], manifest_file=self.manifest_file)
+        self.assertEqual(registry.scan(), {'RegistryTestCode': 'module_registry_test_code'})
+        self.assertEqual(registry.n_read, 2)
+        self.assertNotIn('module_registry_test_code', sys.modules)
+
+        # the second scan uses the manifest
+        registry = ModuleRegistry([self.mod_dir], manifest_file=self.manifest_file)
+        registry.scan()
+        self.assertEqual(registry.n_read, 0)
+        self.assertNotIn('module_registry_test_code', sys.modules)
+
+        sim_class = registry.get_class('RegistryTestCode')
+        self.assertEqual(sim_class.__name__, 'RegistryTestCode')
+        self.assertIn('module_registry_test_code', sys.modules)
+        self.assertIs(registry.get_class('RegistryTestCode'), sim_class)
+        self.assertIsNone(registry.get_class('UnknownCode'))
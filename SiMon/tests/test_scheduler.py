@@ -0,0 +1,123 @@
+from ..scheduler import TaskScheduler, IndexedHeap, ResourcePool
+from ..module_common import SimulationTask
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import configparser as cp  # Python 3 only
+except ImportError:
+    import ConfigParser as cp  # Python 2 only
+
+
+class FakeSimulation(object):
+    def __init__(self, sim_id, status=SimulationTask.STATUS_NEW, niceness=0, t=0., t_max=10., group='A', full_dir=None):
+        self.id = sim_id
+        self.full_dir = full_dir
+        self.name = 'sim_%d' % sim_id
+        self.status = status
+        self.level = 1
+        self.cid = -1
+        self.niceness = niceness
+        self.t = t
+        self.t_max = t_max
+        self.config = cp.ConfigParser()
+        self.config.add_section('Simulation')
+        self.config.set('Simulation', 'Group', group)
+
+
+class TestScheduler(unittest.TestCase):
+    @staticmethod
+    def drain(scheduler):
+        order = []
+        sim_id = scheduler.pop()
+        while sim_id is not None:
+            order.append(sim_id)
+            sim_id = scheduler.pop()
+        return order
+
+    def test_indexed_heap(self):
+        heap = IndexedHeap()
+        for item, key in [('a', 3), ('b', 1), ('c', 2)]:
+            heap.push(item, key)
+        heap.push('b', 5)
+        heap.remove('c')
+        self.assertEqual(len(heap), 2)
+        self.assertEqual([heap.pop(), heap.pop(), heap.pop()], ['a', 'b', None])
+
+    def test_niceness_policy(self):
+        scheduler = TaskScheduler('niceness')
+        sims = [FakeSimulation(1, niceness=5), FakeSimulation(2, niceness=-5), FakeSimulation(3, niceness=0),
+                FakeSimulation(4, status=SimulationTask.STATUS_DONE)]
+        for sim in sims:
+            scheduler.update(sim)
+        self.assertEqual(scheduler.n_pending(), 3)
+        # a simulation started meanwhile leaves the queue
+        sims[2].status = SimulationTask.STATUS_RUN
+        scheduler.update(sims[2])
+        self.assertEqual(self.drain(scheduler), [2, 1])
+
+    def test_fifo_and_srt_policies(self):
+        fifo = TaskScheduler('fifo')
+        srt = TaskScheduler('srt')
+        for sim in [FakeSimulation(3, t=9.), FakeSimulation(1, t=1.), FakeSimulation(2, t=5.)]:
+            fifo.update(sim)
+            srt.update(sim)
+        self.assertEqual(self.drain(fifo), [3, 1, 2])
+        self.assertEqual(self.drain(srt), [3, 2, 1])
+
+    def test_fair_policy(self):
+        scheduler = TaskScheduler('fair')
+        sims = [FakeSimulation(i, group='A') for i in range(1, 5)] + [FakeSimulation(i, group='B') for i in range(5, 7)]
+        sims.append(FakeSimulation(7, status=SimulationTask.STATUS_RUN, group='A'))
+        for sim in sims:
+            scheduler.update(sim)
+        # group A has one running simulation already, so B is served first, then they alternate
+        self.assertEqual(self.drain(scheduler), [5, 1, 6, 2, 3, 4])
+        scheduler.retain([7])
+        self.assertEqual(scheduler.running_group, {7: 'A'})
+
+    def test_backfill(self):
+        scheduler = TaskScheduler('niceness')
+        cores = {1: 16, 2: 32, 3: 8, 4: 4}
+        for sim_id in sorted(cores.keys()):
+            scheduler.update(FakeSimulation(sim_id))
+        pool = ResourcePool(cores=32, memory=64., max_jobs=0)
+        pool.allocate(8, 0)  # a running simulation
+
+        def fits(sim_id):
+            return pool.fits(cores[sim_id], 0)
+
+        order = []
+        while not pool.is_full():
+            sim_id = scheduler.pop(fits)
+            if sim_id is None:
+                break
+            pool.allocate(cores[sim_id], 0)
+            order.append(sim_id)
+        # #2 does not fit into the 16 cores left after #1, so #3 is started in its place
+        self.assertEqual(order, [1, 3])
+        self.assertEqual(scheduler.n_pending(), 2)
+        # on an idle node, #2 is first again
+        pool = ResourcePool(cores=32, memory=64., max_jobs=1)
+        self.assertEqual(scheduler.pop(fits), 2)
+        pool.allocate(32, 0)
+        self.assertIsNone(scheduler.pop(fits))
+        self.assertTrue(pool.exceeds_capacity(64, 0))
+        self.assertTrue(pool.exceeds_capacity(1, 128.))
+
+    def test_stopped_simulation_is_not_pending(self):
+        sim_dir = tempfile.mkdtemp()
+        try:
+            scheduler = TaskScheduler('niceness')
+            stopped = FakeSimulation(1, status=SimulationTask.STATUS_STOP, full_dir=sim_dir)
+            scheduler.update(stopped)
+            self.assertEqual(self.drain(scheduler), [1])  # to be restarted
+
+            open(os.path.join(sim_dir, 'STOP'), 'w').close()  # stopped by the user: restart skipped
+            scheduler.update(stopped)
+            scheduler.update(FakeSimulation(2))
+            self.assertEqual(self.drain(scheduler), [2])
+        finally:
+            shutil.rmtree(sim_dir)
@@ -0,0 +1,106 @@
+from ..shard import ShardLeases
+from ..sim_index import SimulationIndex
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+
+class TestShardLeases(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def expire(self, shard):
+        """
+        Make a daemon look dead, as if it had not renewed its leases and heartbeat for a long time.
+        """
+        old = time.time() - 2 * shard.lease_time
+        paths = [shard.lease_path(bucket) for bucket in shard.owned]
+        paths.append(os.path.join(shard.lease_dir, 'daemons', shard.name))
+        for path in paths:
+            os.utime(path, (old, old))
+
+    def test_buckets_are_shared_fairly(self):
+        shard_a = ShardLeases(self.root, n_buckets=8, name='node_a')
+        shard_b = ShardLeases(self.root, n_buckets=8, name='node_b')
+        self.assertEqual(len(shard_a.update()), 8)  # alone
+        self.assertEqual(len(shard_b.update()), 0)  # all buckets are held
+        self.assertEqual(len(shard_a.update()), 4)  # node_b joined, half of the buckets released
+        self.assertEqual(len(shard_b.update()), 4)
+        self.assertEqual(shard_a.owned | shard_b.owned, set(range(8)))
+        self.assertEqual(shard_a.owned & shard_b.owned, set())
+
+    def test_busy_buckets_are_kept(self):
+        shard_a = ShardLeases(self.root, n_buckets=4, name='node_a')
+        shard_a.update()
+        busy_dirs = ['sim_%d' % i for i in range(20)]
+        shard_b = ShardLeases(self.root, n_buckets=4, name='node_b')
+        shard_b.update()
+        self.assertEqual(len(shard_a.update(busy_dirs)), 4)  # every bucket has a running simulation
+
+    def test_dead_daemon_buckets_are_taken_over(self):
+        shard_a = ShardLeases(self.root, n_buckets=8, name='node_a')
+        shard_b = ShardLeases(self.root, n_buckets=8, name='node_b')
+        shard_a.update()
+        shard_b.update()
+        shard_a.update()
+        shard_b.update()
+        self.expire(shard_a)
+        self.assertEqual(len(shard_b.update()), 8)
+        self.assertEqual(shard_b.n_live, 1)
+        self.assertEqual(len(shard_a.update()), 0)  # the leases have been lost, and all buckets are held
+        self.assertEqual(shard_a.n_live, 2)
+
+    def test_restarted_daemon_gets_its_buckets_back(self):
+        ShardLeases(self.root, n_buckets=8, name='node_a').update()
+        self.assertEqual(len(ShardLeases(self.root, n_buckets=8, name='node_a').update()), 8)
+
+    def test_non_ascii_names(self):
+        shard = ShardLeases(self.root, n_buckets=8, name='node_a')
+        shard.owned = set(range(8))
+        names = ['sim_\xc3\xa9', 'sim_1']
+        self.assertEqual(shard.select(names), names)
+        self.assertEqual(shard.bucket_of('sim_\xc3\xa9'), shard.bucket_of(u'sim_\xe9'))
+
+    def test_lease_lost_while_renewed(self):
+        shard = ShardLeases(self.root, n_buckets=2, name='node_a')
+        self.assertEqual(len(shard.update()), 2)
+        read_owner = ShardLeases.read_owner
+
+        def read_owner_then_take_over(path):
+            owner = read_owner(path)
+            if path == shard.lease_path(0):
+                os.rename(path, path + '.stale')  # another daemon takes the lease over in the meantime
+            return owner
+
+        ShardLeases.read_owner = staticmethod(read_owner_then_take_over)
+        try:
+            self.assertFalse(shard.renew(0))
+        finally:
+            ShardLeases.read_owner = staticmethod(read_owner)
+        self.assertTrue(shard.renew(1))
+
+    def test_index_of_the_shard(self):
+        names = ['sim_%d' % i for i in range(20)]
+        for name in names:
+            os.makedirs(os.path.join(self.root, name, 'restart1'))
+        shard = ShardLeases(self.root, n_buckets=4, name='node_a')
+        shard.owned = set([0, 1])  # without leases
+        selected = shard.select(names + [ShardLeases.LEASE_DIR])
+        self.assertEqual(selected, [name for name in names if shard.bucket_of(name) in [0, 1]])
+        self.assertTrue(0 < len(selected) < len(names))
+
+        index = SimulationIndex(self.root)
+        index.select_top_level = shard.select
+        index.refresh()
+        top_level = [path for path, _ in index.walk() if os.path.dirname(path) == self.root]
+        self.assertEqual(top_level, [os.path.join(self.root, name) for name in sorted(selected)])
+        self.assertEqual(index.get_id(os.path.join(self.root, ShardLeases.LEASE_DIR)), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
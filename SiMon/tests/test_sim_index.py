@@ -0,0 +1,83 @@
+from ..sim_index import SimulationIndex
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestSimulationIndex(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for d in ['sim_a', 'sim_b', os.path.join('sim_a', 'restart1')]:
+            os.makedirs(os.path.join(self.root, d))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_ids_are_stable(self):
+        index = SimulationIndex(self.root)
+        index.refresh()
+        id_a = index.get_id(os.path.join(self.root, 'sim_a'))
+        id_b = index.get_id(os.path.join(self.root, 'sim_b'))
+        self.assertEqual(index.get_id(self.root), 0)
+        self.assertEqual([p for p, _ in index.walk()],
+                         [self.root, os.path.join(self.root, 'sim_a'),
+                          os.path.join(self.root, 'sim_a', 'restart1'), os.path.join(self.root, 'sim_b')])
+        index.save()
+
+        # reload from disk, add a new directory and remove an old one
+        os.makedirs(os.path.join(self.root, 'sim_0'))
+        shutil.rmtree(os.path.join(self.root, 'sim_b'))
+        index = SimulationIndex(self.root)
+        self.assertEqual(index.load(), 4)
+        index.refresh()
+        self.assertEqual(index.get_id(os.path.join(self.root, 'sim_a')), id_a)
+        self.assertEqual(index.get_id(os.path.join(self.root, 'sim_b')), -1)
+        self.assertGreater(index.get_id(os.path.join(self.root, 'sim_0')), id_b)
+
+    def test_unchanged_dirs_are_not_listed(self):
+        index = SimulationIndex(self.root)
+        index.refresh()
+        # age the directories so that their mtime is trusted
+        for path in index.entries:
+            os.utime(path, (1.e9, 1.e9))
+        index.refresh()
+        self.assertEqual(index.refresh(), 0)
+        self.assertEqual(index.n_visited, 4)
+
+    def test_save_does_not_trigger_rescan(self):
+        index = SimulationIndex(self.root)
+        index.refresh()
+        for path in index.entries:
+            os.utime(path, (1.e9, 1.e9))
+        index.refresh()
+        self.assertEqual(index.save(), 0)  # creates the directory of the index in the root
+        index.refresh()
+        self.assertFalse(index.modified)
+        os.utime(self.root, (1.e9, 1.e9))
+        index.refresh()
+        for i in range(3):  # e.g. a new simulation in every cycle
+            index.modified = True
+            self.assertEqual(index.save(), 0)
+            self.assertEqual(index.refresh(), 0)  # the index file is not in an indexed directory
+            self.assertFalse(index.modified)
+        self.assertEqual(index.get_id(os.path.join(self.root, SimulationIndex.INDEX_DIR)), -1)
+
+        # a new file in the root changes its mtime, but not the directory structure: listed, but not written again
+        open(os.path.join(self.root, 'simon_state.db'), 'w').close()
+        os.utime(self.root, (2.e9, 2.e9))
+        self.assertEqual(index.refresh(), 1)
+        self.assertFalse(index.modified)
+
+    def test_symlinked_simulations(self):
+        target = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(target, 'restart1'))
+            os.symlink(target, os.path.join(self.root, 'sim_link'))
+            index = SimulationIndex(self.root)
+            index.refresh()
+            link = os.path.join(self.root, 'sim_link')
+            self.assertGreater(index.get_id(link), 0)  # registered, as with os.path.isdir
+            self.assertEqual(index.get_id(os.path.join(link, 'restart1')), -1)  # not descended, as os.path.walk
+        finally:
+            shutil.rmtree(target)
@@ -0,0 +1,136 @@
+from ..module_common import SimulationTask
+import os
+import errno
+import gzip
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+
+class FailingExecutor(object):
+    JOB_LABEL = 'job'
+
+    def read_job_id(self, cwd):
+        return 42
+
+    def cancel(self, job_id):
+        raise OSError(errno.EPERM, 'Operation not permitted')
+
+
+class TestSimulationTask(unittest.TestCase):
+    def setUp(self):
+        self.sim_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.sim_dir, 'SiMon.conf'), 'w') as f_conf:
+            f_conf.write('[Simulation]\nCode_name = DemoSimulation\nOutput_file = output.txt\nT_end = 30\n')
+        with open(os.path.join(self.sim_dir, 'output.txt'), 'w') as f_out:
+            f_out.write('1.0, 0.5\n12.0, 0.7\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.sim_dir)
+
+    def test_status_probed_once_per_cycle(self):
+        SimulationTask.begin_probe_cycle()
+        sim = SimulationTask(1, 'sim', self.sim_dir, SimulationTask.STATUS_NEW)
+        self.assertEqual(sim.t, 12.0)
+        sim.sim_get_status()
+        sim.sim_get_status()
+        self.assertEqual(SimulationTask.probe_counters['probes'], 1)
+        self.assertEqual(SimulationTask.probe_counters['cached'], 2)
+
+        sim.sim_invalidate_status()
+        sim.sim_get_status()
+        self.assertEqual(SimulationTask.probe_counters['probes'], 2)
+
+        SimulationTask.begin_probe_cycle()
+        sim.sim_get_status()
+        self.assertEqual(SimulationTask.probe_counters['probes'], 1)
+
+    def test_restart_without_chdir(self):
+        with open(os.path.join(self.sim_dir, 'SiMon.conf'), 'a') as f_conf:
+            f_conf.write('Restart_command = echo 20 > output.txt\nTimestamp_started = 1\n')
+        proc = subprocess.Popen(['true'])
+        proc.wait()
+        with open(os.path.join(self.sim_dir, '.process.pid'), 'w') as f_pid:
+            f_pid.write('%d\n' % proc.pid)  # a process that is not running anymore
+        cwd = os.getcwd()
+        sim = SimulationTask(1, 'sim', self.sim_dir, SimulationTask.STATUS_NEW)
+        self.assertEqual(sim.status, SimulationTask.STATUS_STOP)
+        self.assertEqual(sim.sim_restart(), 0)
+        self.assertEqual(os.getcwd(), cwd)
+        restart_dir = os.path.join(self.sim_dir, 'restart1')
+        self.assertTrue(os.path.isfile(os.path.join(restart_dir, 'SiMon.conf')))
+        pid = int(open(os.path.join(restart_dir, '.process.pid')).read())
+        os.waitpid(pid, 0)
+        self.assertEqual(open(os.path.join(restart_dir, 'output.txt')).read(), '20\n')
+
+    def test_restart_restores_missing_restart_file(self):
+        with open(os.path.join(self.sim_dir, 'SiMon.conf'), 'a') as f_conf:
+            f_conf.write('Restart_file = restart.txt\nRestart_command = cp ../restart.txt .\nTimestamp_started = 1\n')
+        backup = gzip.open(os.path.join(self.sim_dir, 'restart.tmp.1000.gz'), 'wb')
+        backup.write(b'T = 12\n')
+        backup.close()
+        proc = subprocess.Popen(['true'])
+        proc.wait()
+        with open(os.path.join(self.sim_dir, '.process.pid'), 'w') as f_pid:
+            f_pid.write('%d\n' % proc.pid)
+        sim = SimulationTask(1, 'sim', self.sim_dir, SimulationTask.STATUS_NEW)
+        self.assertEqual(sim.sim_restart(), 0)
+        restart_dir = os.path.join(self.sim_dir, 'restart1')
+        os.waitpid(int(open(os.path.join(restart_dir, '.process.pid')).read()), 0)
+        self.assertEqual(open(os.path.join(restart_dir, 'restart.txt')).read(), 'T = 12\n')
+
+    def test_kill_return_codes(self):
+        sim = SimulationTask(1, 'sim', self.sim_dir, SimulationTask.STATUS_NEW)
+        self.assertEqual(sim.sim_kill(), 1)  # never started
+
+        proc = subprocess.Popen(['true'])
+        proc.wait()
+        with open(os.path.join(self.sim_dir, '.process.pid'), 'w') as f_pid:
+            f_pid.write('%d\n' % proc.pid)
+        self.assertEqual(sim.sim_kill(), 1)  # not running anymore
+
+        proc = subprocess.Popen(['sleep', '60'])
+        with open(os.path.join(self.sim_dir, '.process.pid'), 'w') as f_pid:
+            f_pid.write('%d\n' % proc.pid)
+        self.assertEqual(sim.sim_kill(), 0)
+        proc.wait()
+
+        local_executor = SimulationTask.executor
+        SimulationTask.executor = FailingExecutor()
+        try:
+            self.assertEqual(sim.sim_kill(), -1)
+        finally:
+            SimulationTask.executor = local_executor
+
+    def test_progress_histories_are_pruned(self):
+        SimulationTask.prune_progress_histories([])  # left by other tests
+        sim = SimulationTask(1, 'sim', self.sim_dir, SimulationTask.STATUS_NEW)
+        history = sim.sim_get_progress_history()
+        gone_dir = os.path.join(self.sim_dir, 'deleted')
+        SimulationTask(2, 'deleted', gone_dir, SimulationTask.STATUS_NEW).sim_get_progress_history()
+        self.assertEqual(SimulationTask.prune_progress_histories([self.sim_dir]), 1)
+        self.assertNotIn(gone_dir, SimulationTask.progress_histories)
+        self.assertIs(sim.sim_get_progress_history(), history)
+        SimulationTask.prune_progress_histories([])
+
+    def test_status_propagated_through_deep_restart_chains(self):
+        root = SimulationTask(0, 'root', self.sim_dir, SimulationTask.STATUS_NEW)
+        parent = root
+        chain = []
+        for level in range(40):
+            sim = SimulationTask(level + 1, 'restart1', os.path.join(self.sim_dir, 'nonexistent'),
+                                 SimulationTask.STATUS_STOP)
+            sim.status = SimulationTask.STATUS_STOP
+            sim.t = level
+            parent.restarts.append(sim)
+            chain.append(sim)
+            parent = sim
+        chain[-1].status = SimulationTask.STATUS_RUN
+        self.assertEqual(root.sim_propagate_status(), 41)
+        top = chain[0]
+        self.assertEqual(top.status, SimulationTask.STATUS_RUN)
+        self.assertEqual(top.cid, 2)
+        self.assertEqual(top.leaf_id, 40)
+        self.assertEqual(top.t_latest, 39)
+        self.assertEqual(chain[-1].cid, -1)
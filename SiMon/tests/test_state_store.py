@@ -0,0 +1,60 @@
+from ..state_store import StateStore
+from ..module_common import SimulationTask
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class FakeSimulation(object):
+    def __init__(self, sim_id, parent_id, status):
+        self.id = sim_id
+        self.name = 'sim_%d' % sim_id
+        self.full_dir = '/data/sim_%d' % sim_id
+        self.parent_id = parent_id
+        self.level = 1
+        self.status = status
+        self.config = None
+        self.t = 0.
+        self.t_min = 0.
+        self.t_max = 10.
+        self.mtime = 0.
+        self.ctime = 0.
+        self.restarts = []
+
+
+class TestStateStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = StateStore(os.path.join(self.tmp_dir, 'state.db'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_sync_writes_changes_only(self):
+        sims = dict([(i, FakeSimulation(i, 0, SimulationTask.STATUS_NEW)) for i in range(1, 4)])
+        self.assertEqual(self.store.last_sync(), None)
+        self.assertEqual(self.store.sync(sims), 3)
+        self.assertEqual(self.store.sync(sims), 0)
+
+        sims[2].status = SimulationTask.STATUS_RUN
+        sims[3].t = 5.
+        self.assertEqual(self.store.sync(sims), 2)
+        self.assertEqual(self.store.count_by_status(), {SimulationTask.STATUS_NEW: 2, SimulationTask.STATUS_RUN: 1})
+        self.assertEqual([task['id'] for task in self.store.tasks(status=SimulationTask.STATUS_RUN)], [2])
+        self.assertEqual([(old, new) for _, old, new in self.store.history(2)],
+                         [(SimulationTask.STATUS_NEW, SimulationTask.STATUS_RUN), (None, SimulationTask.STATUS_NEW)])
+
+        # a partial sync does not delete the other simulations, a full one does
+        del sims[1]
+        self.store.sync({2: sims[2]}, full=False)
+        self.assertEqual(len(self.store.tasks()), 3)
+        self.store.sync(sims)
+        self.assertEqual(len(self.store.tasks()), 2)
+
+        # the state survives reopening the database
+        self.store.close()
+        self.store = StateStore(os.path.join(self.tmp_dir, 'state.db'))
+        self.assertEqual(self.store.sync(sims), 0)
+        self.assertIsNotNone(self.store.last_sync())
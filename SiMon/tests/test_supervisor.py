@@ -0,0 +1,40 @@
+from ..supervisor import ProcessSupervisor
+from ..watcher import TreeWatcher
+import os
+import shutil
+import signal
+import tempfile
+import unittest
+
+
+class TestProcessSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.sim_dir = tempfile.mkdtemp()
+        self.supervisor = ProcessSupervisor()
+
+    def tearDown(self):
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        shutil.rmtree(self.sim_dir)
+
+    def test_launch_and_reap(self):
+        wakeup_fd = self.supervisor.install_sigchld_handler()
+        pid = self.supervisor.launch('echo started > output.txt; exit 3', self.sim_dir)
+        self.assertEqual(ProcessSupervisor.read_pid_file(self.sim_dir), pid)
+        # the SIGCHLD handler wakes up the main loop when the child exits (select() may return early with EINTR)
+        for _ in range(50):
+            if TreeWatcher.select([wakeup_fd], 0.1) == [wakeup_fd]:
+                break
+        self.assertEqual(TreeWatcher.select([wakeup_fd], 0), [wakeup_fd])
+        self.supervisor.drain_wakeup()
+        while self.supervisor.is_running(pid):
+            TreeWatcher.select([wakeup_fd], 0.1)
+        self.assertEqual(self.supervisor.reap(), [(pid, self.sim_dir, 3)])
+        self.assertTrue(os.path.isfile(os.path.join(self.sim_dir, 'output.txt')))
+
+    def test_kill_process_group(self):
+        pid = self.supervisor.launch('sleep 60 & sleep 60', self.sim_dir)
+        self.assertTrue(self.supervisor.is_running(pid))
+        self.supervisor.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        self.assertEqual(self.supervisor.reap()[0][0], pid)
+        self.assertFalse(self.supervisor.is_running(pid))
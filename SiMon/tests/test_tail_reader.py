@@ -0,0 +1,57 @@
+from ..utilities import TailReader
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestTailReader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.tmp_dir, 'output.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, text, mode='w'):
+        with open(self.fn, mode) as f:
+            f.write(text)
+
+    def test_last_line_like_tail(self):
+        reader = TailReader()
+        reader.block_size = 4  # force reading backwards across several blocks
+        self.assertIsNone(reader.last_line(self.fn))
+        self.write('1.0, 2.0\n2.0, 3.0\n')
+        self.assertEqual(reader.last_line(self.fn), '2.0, 3.0')
+        self.write('3.0, 4.0', mode='a')
+        self.assertEqual(reader.last_line(self.fn), '3.0, 4.0')
+        self.write('5\n', mode='a')
+        self.assertEqual(reader.last_line(self.fn), '3.0, 4.05')
+        self.write('single line')
+        self.assertEqual(reader.last_line(self.fn), 'single line')
+
+    def test_cached_value(self):
+        reader = TailReader()
+        self.write('10 a\n20 b\n')
+        parse = lambda line: float(line.split()[0])
+        self.assertEqual(reader.last_value(self.fn, parse), 20.0)
+        self.assertEqual(reader.last_value(self.fn, parse), 20.0)
+        self.assertEqual((reader.n_reads, reader.n_hits), (1, 1))
+
+    def test_rewritten_in_place(self):
+        reader = TailReader()
+        self.write('10\n20\n30\n')
+        self.assertEqual(reader.last_line(self.fn), '30')
+        # truncated and rewritten past the old size: same inode, but the old last line is gone
+        with open(self.fn, 'r+') as f:
+            f.truncate(0)
+            f.write('1234567890\n')
+        self.assertEqual(reader.last_line(self.fn), '1234567890')
+        self.write('40\n', mode='a')  # grown: searched from the cached offset
+        self.assertEqual(reader.last_line(self.fn), '40')
+
+    def test_last_lines(self):
+        self.assertEqual(TailReader.read_last_lines(self.fn, 2), '')
+        self.write(''.join('line %d\n' % i for i in range(100)))
+        self.assertEqual(TailReader.read_last_lines(self.fn, 2, block_size=5), 'line 98\nline 99\n')
+        self.assertEqual(TailReader.read_last_lines(self.fn, 200).count('\n'), 100)
@@ -0,0 +1,97 @@
+from ..module_common import SimulationTask
+import shutil
+import tempfile
+import unittest
+try:
+    from ..task_table import TaskTable
+except ImportError:  # NumPy not installed
+    TaskTable = None
+
+
+class Task(object):
+    def __init__(self, sim_id, parent_id, level, status, t, t_latest, t_max, name=None):
+        self.id = sim_id
+        self.parent_id = parent_id
+        self.level = level
+        self.status = status
+        self.t = t
+        self.t_latest = t_latest
+        self.t_min = 0.0
+        self.t_max = t_max
+        self.mtime = 1000.0 + sim_id
+        self.ctime = 900.0
+        self.niceness = 0
+        self.cid = -1
+        self.name = name or 'sim_%d' % sim_id
+        self.full_dir = '/data/%s' % self.name
+
+
+@unittest.skipIf(TaskTable is None, 'NumPy is not installed')
+class TestTaskTable(unittest.TestCase):
+    def setUp(self):
+        tasks = [Task(0, -1, 0, SimulationTask.STATUS_RUN, 0, 0, 0, name='root'),
+                 Task(1, 0, 1, SimulationTask.STATUS_DONE, 100, 100, 100),
+                 Task(2, 0, 1, SimulationTask.STATUS_RUN, 10, 60, 100),
+                 Task(3, 2, 2, SimulationTask.STATUS_RUN, 60, 60, 100),
+                 Task(4, 0, 1, SimulationTask.STATUS_NEW, 0, 0, 100),
+                 Task(5, 0, 1, SimulationTask.STATUS_STOP, 20, 20, 100)]
+        self.table = TaskTable.from_tasks(dict([(task.id, task) for task in tasks]))
+
+    def test_views(self):
+        self.assertEqual(len(self.table), 6)
+        view = self.table.view(self.table.index_of(3))
+        self.assertEqual((view.id, view.parent_id, view.level), (3, 2, 2))
+        self.assertEqual(view.status, SimulationTask.STATUS_RUN)
+        self.assertEqual(view.t, 60.0)
+        self.assertEqual(view.full_dir, '/data/sim_3')
+        self.assertAlmostEqual(view.progress, 0.6)
+        self.assertFalse(hasattr(view, '__dict__'))
+        self.assertRaises(AttributeError, getattr, view, 'restarts')
+        self.assertIsNone(self.table.index_of(42))
+
+    def test_status_counts_exclude_the_root(self):
+        self.assertEqual(self.table.status_counts(), [1, 1, 2, 0, 1, 0])
+
+    def test_progress_of_the_campaign(self):
+        # top-level: 1 (done), 0.6 (through its restart), 0 and 0.2
+        self.assertAlmostEqual(self.table.total_progress(), 0.45)
+        self.assertEqual(list(self.table.select(statuses=[SimulationTask.STATUS_RUN], max_level=1)), [2])
+
+    def test_least_advanced(self):
+        self.assertEqual([sim.id for sim in self.table.least_advanced(2)], [4, 5])
+        self.assertEqual([sim.id for sim in self.table.least_advanced(10)], [4, 5, 2])
+        self.assertEqual([sim.id for sim in self.table.least_advanced(1, statuses=[SimulationTask.STATUS_RUN])], [2])
+
+    def test_table_grows(self):
+        table = TaskTable()
+        for i in range(40):
+            table.append(Task(i + 1, 0, 1, SimulationTask.STATUS_NEW, i, i, 40))
+        self.assertEqual(len(table), 40)
+        self.assertEqual(table.column('t')[-1], 39.0)
+        self.assertEqual(table.view(table.index_of(17)).name, 'sim_17')
+
+    def test_update_in_place(self):
+        rows = self.table.rows
+        task = Task(5, 0, 1, SimulationTask.STATUS_RUN, 50, 50, 100)
+        self.assertEqual(self.table.update(task), self.table.index_of(5))
+        self.assertIs(self.table.rows, rows)  # not rebuilt
+        self.assertEqual(len(self.table), 6)
+        self.assertEqual(self.table.status_counts(), [1, 0, 3, 0, 1, 0])  # STOP -> RUN
+        self.assertAlmostEqual(self.table.total_progress(), 0.525)
+        self.assertEqual(self.table.update(Task(6, 0, 1, SimulationTask.STATUS_NEW, 0, 0, 100)), 6)
+        self.assertEqual(len(self.table), 7)
+
+
+class TestSimulationTaskSlots(unittest.TestCase):
+    def test_no_instance_dictionary(self):
+        sim_dir = tempfile.mkdtemp()
+        try:
+            sim = SimulationTask(0, 'root', sim_dir, SimulationTask.STATUS_NEW)
+            self.assertFalse(hasattr(sim, '__dict__'))
+            sim.fulldir = sim_dir
+        finally:
+            shutil.rmtree(sim_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
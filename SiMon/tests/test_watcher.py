@@ -0,0 +1,76 @@
+from ..watcher import TreeWatcher, InotifyWatcher, PollingWatcher
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.sim_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.sim_dir)
+
+    def check_watcher(self, watcher):
+        watcher.sync({self.sim_dir: TreeWatcher.MARKER_FILES})
+        self.assertEqual(watcher.wait(0.05), (set(), False, []))
+
+        open(os.path.join(self.sim_dir, 'unrelated.txt'), 'w').close()
+        open(os.path.join(self.sim_dir, 'STOP'), 'w').close()
+        changed, rescan, _ = watcher.wait(1.0)
+        self.assertEqual(changed, set([self.sim_dir]))
+        self.assertFalse(rescan)
+
+        os.mkdir(os.path.join(self.sim_dir, 'restart1'))
+        changed, rescan, _ = watcher.wait(1.0)
+        self.assertTrue(rescan)
+        watcher.close()
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is only available on Linux')
+    def test_inotify(self):
+        self.check_watcher(InotifyWatcher(debounce=0.05))
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is only available on Linux')
+    def test_inotify_output_appended_in_place(self):
+        output_fn = os.path.join(self.sim_dir, 'output.txt')
+        f_out = open(output_fn, 'w')
+        watcher = InotifyWatcher(debounce=0.05, modify_interval=0.5)
+        watcher.sync({self.sim_dir: list(TreeWatcher.MARKER_FILES) + ['output.txt']})
+        f_out.write('1.0\n')
+        f_out.flush()
+        self.assertEqual(watcher.wait(1.0)[0], set([self.sim_dir]))
+        f_out.write('2.0\n')
+        f_out.flush()
+        self.assertEqual(watcher.wait(0.1)[0], set())  # at most once per modify_interval
+        time.sleep(0.5)
+        watcher.wait(0.01)  # IN_MODIFY watched again
+        f_out.write('3.0\n')
+        f_out.flush()
+        self.assertEqual(watcher.wait(1.0)[0], set([self.sim_dir]))
+        f_out.close()
+        watcher.close()
+
+    def test_incomplete_watcher(self):
+        class NoWaitWatcher(TreeWatcher):
+            pass
+        with self.assertRaises(TypeError):
+            NoWaitWatcher()
+
+    def test_polling(self):
+        watcher = PollingWatcher(poll_interval=0.05, debounce=0.05)
+        # the directory mtime may not change within the resolution of the timestamps
+        os.utime(self.sim_dir, (1.e9, 1.e9))
+        self.check_watcher(watcher)
+
+    def test_wakeup_fd(self):
+        watcher = TreeWatcher.create(poll_interval=0.05)
+        r_fd, w_fd = os.pipe()
+        watcher.add_wakeup_fd(r_fd)
+        os.write(w_fd, b'x')
+        self.assertEqual(watcher.wait(1.0)[2], [r_fd])
+        os.close(r_fd)
+        os.close(w_fd)
+        watcher.close()
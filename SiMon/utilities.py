@@ -1,6 +1,8 @@
 """
 Implementation of utilities used by SiMon globally.
 """
+import os
+import sys
 
 
 config_file_template = """# Global config file for SiMon
@@ -9,12 +11,93 @@ config_file_template = """# Global config file for SiMon
 # The simulation data root directory
 Root_dir: examples/demo_simulations
 
+# The file (relative to Root_dir) caching the simulation directory tree between scans. It should not be placed in a
+# simulation directory or directly in Root_dir, since every save would then trigger a rescan of that directory
+# [Default: .simon_index/index.json]
+Index_file: .simon_index/index.json
+
+# A SQLite database (relative to Root_dir) in which the daemon records the state and the status history of the
+# simulations, used to print the overview without scanning the simulations. Prefer a local file system. none: disabled
+# [Default: none]
+State_db: none
+
+# A file (relative to Root_dir) to which the daemon writes its metrics in the Prometheus text format after every
+# cycle, e.g. for the textfile collector of the node exporter. none: disabled [Default: none]
+Metrics_file: none
+
+# The local port on which the daemon serves its metrics over HTTP (127.0.0.1 only). 0: disabled [Default: 0]
+Metrics_port: 0
+
+# The number of scheduler cycles profiled (cProfile) when the daemon starts. The statistics and a report are written
+# to simon_profile_<timestamp>.* in Root_dir. See also ``simon profile [N]``. 0: no profiling [Default: 0]
+Profile_cycles: 0
+
 # The time interval for the SiMon daemon to check all the simulations (in seconds) [Default: 180]
 Daemon_sleep_time: 180
 
-# The number of simulations to be carried out simultaneously [Default: 2]
+# Wake up the daemon as soon as a simulation changes (inotify on Linux, polling elsewhere) instead of waiting for
+# the next scan. Daemon_sleep_time is then the interval of the full safety-net scan [Default: False]
+Event_driven: False
+
+# The polling interval (in seconds) used in the event-driven mode if inotify is not available. With inotify, the
+# output file written by a running simulation is checked at most once per interval [Default: 10]
+Event_poll_interval: 10
+
+# The number of simulations to be carried out simultaneously (0: unlimited, e.g. if limited by Node_cores) [Default: 2]
 Max_concurrent_jobs: 2
 
+# The number of CPU cores of the node available to the simulations. A simulation is only started if its Cores
+# (per-simulation SiMon.conf, default: 1) fit into the free cores (0: unlimited) [Default: 0]
+Node_cores: 0
+
+# The memory (in GB) of the node available to the simulations, shared according to the Memory of the simulations
+# (per-simulation SiMon.conf, default: 0) (0: unlimited) [Default: 0]
+Node_memory: 0
+
+# The number of background threads making the checkpoint backups (0: in the scheduler loop) [Default: 0]
+Checkpoint_workers: 0
+
+# The compression of the checkpoint backups: none, gzip, bz2 or lzma (Python 3 only) [Default: none]
+Checkpoint_compression: none
+
+# The backend launching the simulations: 'local' (processes on this host) or 'batch' (jobs submitted to a batch
+# system, so that the simulations can run on other nodes). The batch commands default to Slurm (sbatch, squeue,
+# scancel). In Batch_submit_command, {command}, {cwd} and {name} are replaced with the start/restart command, the
+# simulation directory and the simulation name; in Batch_cancel_command, {job_id} is replaced with the job ID.
+# Batch_status_command lists the jobs of the user, one per line: the job ID followed by its state. It is run once per
+# scheduler cycle [Default: local]
+Executor: local
+# Batch_submit_command: sbatch --parsable --job-name={name} --chdir={cwd} --wrap={command}
+# Batch_status_command: squeue --noheader --Format=JobID,State --user=$USER
+# Batch_cancel_command: scancel {job_id}
+# Batch_job_id_pattern: (\d+)
+
+# Sharding of Root_dir between several daemons, e.g. on several nodes sharing the file system. The top-level
+# simulation directories are distributed into Shard_buckets buckets, and each daemon leases a fair share of them (lease
+# files in Root_dir/.simon_shards). A daemon only scans and schedules the simulations in its buckets. The buckets of a
+# daemon whose leases have not been renewed for Shard_lease_time seconds (much longer than Daemon_sleep_time) are taken
+# over by the other daemons. Shard_name identifies the daemon (default: the host name). 0: no sharding [Default: 0]
+Shard_buckets: 0
+Shard_lease_time: 900
+# Shard_name: node1
+
+# The Unix-domain socket on which the daemon answers the queries and commands of ``simon`` and ``simon -i`` (relative
+# to the directory of SiMon.conf; with sharding, the name of the daemon is inserted). none: disabled
+# [Default: SiMon_control.sock]
+Control_socket: SiMon_control.sock
+
+# The number of threads probing the status of the simulations in parallel. Useful on network file systems
+# (e.g. Lustre/NFS), where every file access is a round trip [Default: 1]
+Probe_workers: 1
+
+# The maximum number of parsed per-simulation config files kept in memory, so that unchanged files are not read
+# again on every scan (0: always read the files) [Default: 10000]
+Config_cache_size: 10000
+
+# The order in which simulations waiting for a slot are started: niceness (lowest first), fifo, srt (shortest
+# remaining model time first) or fair (fair share between the Group of the simulations) [Default: niceness]
+Scheduling_policy: niceness
+
 # The maximum number of times a simulation will be restarted (a simulation is marked as ERROR when exceeding this limit) [Default: 2]
 Max_restarts: 2
 
@@ -50,6 +133,21 @@ class Utilities(object):
             # return '[%s] %s%s %s\r' % (bar, percents, '%', suffix)
             return '%s [%s] %s\r' % (prefix, bar, suffix)
 
+    @staticmethod
+    def format_duration(seconds):
+        """
+        Format a duration for display, e.g. 45s, 12m30s, 3h05m, 2d07h.
+        """
+        seconds = int(round(seconds))
+        if seconds < 60:
+            return '%ds' % seconds
+        elif seconds < 3600:
+            return '%dm%02ds' % (seconds // 60, seconds % 60)
+        elif seconds < 86400:
+            return '%dh%02dm' % (seconds // 3600, (seconds % 3600) // 60)
+        else:
+            return '%dd%02dh' % (seconds // 86400, (seconds % 86400) // 3600)
+
     @staticmethod
     def highlighted_text(text, color=None, bold=False):
         colors = ['red', 'blue', 'cyan', 'green', 'reset']
@@ -106,3 +204,131 @@ class Utilities(object):
             target.close()
         except IOError:
             print("Unexpected error:", sys.exc_info()[0])
+
+
+class TailReader(object):
+    """
+    Read the last line of (growing) text files in-process, instead of forking ``tail -1`` for every file.
+
+    For every file, the reader remembers the size, the modification time, the offset of the last line and the value
+    parsed from it. If the file has not changed since the last call, the cached value is returned without opening the
+    file. If the file has grown, only the bytes after the previous last line are examined, unless the previous last line
+    is no longer found at its offset (e.g. the file has been truncated and rewritten in place).
+    """
+
+    block_size = 4096
+
+    def __init__(self):
+        self.cache = dict()  # path -> (inode, size, mtime, offset of the last line, last line, parsed value)
+        self.n_reads = 0  # number of times a file has been actually read
+        self.n_hits = 0  # number of times the cached value has been returned
+
+    def last_line(self, path):
+        """
+        :return: The last line of the file (without the newline character), or None if the file does not exist.
+        """
+        return self.last_value(path)
+
+    def last_value(self, path, parse=None):
+        """
+        Get the value parsed from the last line of a file.
+
+        :param path: The path of the file.
+        :param parse: A function that maps the last line to a value. If None, the last line itself is returned.
+        :return: The parsed value, or None if the file does not exist.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.cache.pop(path, None)
+            return None
+        cached = self.cache.get(path)
+        if cached is not None and cached[:3] == (st.st_ino, st.st_size, st.st_mtime):
+            self.n_hits += 1
+            return cached[5]
+
+        # If the same file has grown, the new last line cannot start before the previous one
+        start = 0
+        previous_line = None
+        if cached is not None and cached[0] == st.st_ino and cached[1] <= st.st_size:
+            start = cached[3]
+            previous_line = cached[4]
+        try:
+            offset, line = TailReader.read_last_line(path, st.st_size, start, self.block_size, previous_line)
+        except IOError:
+            return None
+        self.n_reads += 1
+        if parse is None:
+            value = line
+        else:
+            value = parse(line)
+        self.cache[path] = (st.st_ino, st.st_size, st.st_mtime, offset, line, value)
+        return value
+
+    @staticmethod
+    def read_last_line(path, size, start=0, block_size=4096, previous_line=None):
+        """
+        Seek backwards from the end of the file until the beginning of the last line. Like ``tail -1``, a newline at
+        the very end of the file is ignored.
+
+        :param path: The path of the file.
+        :param size: The size of the file.
+        :param start: The offset known to be the beginning of a line at or before the last line.
+        :param block_size: The size of the blocks read backwards.
+        :param previous_line: The line read at ``start`` before (optional). If it is not found there anymore, together
+                              with the newline before it, the file has been rewritten and is searched to its beginning.
+        :return: A tuple of the offset of the last line and the last line.
+        """
+        with open(path, 'rb') as f:
+            if start > 0 and previous_line is not None:
+                f.seek(start - 1)
+                if f.read(len(previous_line) + 1) != b'\n' + previous_line:
+                    start = 0
+            end = size
+            if end > start:
+                f.seek(end - 1)
+                if f.read(1) == b'\n':
+                    end -= 1
+            line_start = start
+            pos = end
+            while pos > start:
+                step = min(block_size, pos - start)
+                f.seek(pos - step)
+                chunk = f.read(step)
+                nl = chunk.rfind(b'\n')
+                if nl >= 0:
+                    line_start = pos - step + nl + 1
+                    break
+                pos -= step
+            f.seek(line_start)
+            line = f.read(max(end - line_start, 0))
+        return line_start, line
+
+    @staticmethod
+    def read_last_lines(path, lines=20, block_size=4096):
+        """
+        Read the last lines of a file, like ``tail -n``.
+
+        :return: The last lines (including the newline characters), or an empty string if the file does not exist.
+        """
+        if lines <= 0:
+            return ''
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return ''
+        with f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            data = b''
+            # a trailing newline does not start a new line, so one more newline than the number of lines is needed
+            while pos > 0 and data.count(b'\n') <= lines:
+                step = min(block_size, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+        if len(data) == 0:
+            return ''
+        if data.endswith(b'\n'):
+            data = data[:-1]
+        return b'\n'.join(data.split(b'\n')[-lines:]) + b'\n'
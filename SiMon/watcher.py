@@ -0,0 +1,376 @@
+"""
+Watch the simulation directories for changes, so that the daemon can wake up as soon as something happens to a
+simulation (a process ID file written, an output file closed because the code exited, a STOP/ERROR marker created,
+a restart directory added), instead of sleeping for a fixed period of time between two full scans.
+
+On Linux, the changes are obtained from inotify (through ctypes). Elsewhere, or if inotify is not available, the
+watched files are polled with os.stat(). The output files written by the running codes are picked up at most once per
+poll interval by both watchers, so that their progress and stalls are detected without a full scan.
+"""
+import os
+import abc
+import sys
+import stat
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+
+class TreeWatcher(object):
+    """
+    The interface of the watchers. A watcher is given a set of directories, each with the names of the files of
+    interest in that directory. wait() blocks until some of these files change, and returns the directories in which
+    the changes happened.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    # the file names relevant to every simulation, in addition to its output and error files
+    MARKER_FILES = ('.process.pid', '.batch.job', 'STOP', 'ERROR')
+
+    def __init__(self, debounce=0.5, logger=None):
+        """
+        :param debounce: After the first change is detected, keep collecting changes for this period of time
+                         (in seconds), so that a burst of changes is handled in one go.
+        :param logger: The logger of the daemon (optional).
+        """
+        self.debounce = debounce
+        self.logger = logger
+        self.watched = dict()  # path -> a set of the names of the files of interest
+        self.wakeup_fds = []  # additional file descriptors that interrupt wait() when they become readable
+
+    @staticmethod
+    def create(poll_interval=10.0, debounce=0.5, logger=None):
+        """
+        Create the best watcher available on the current platform.
+
+        :return: An InotifyWatcher if inotify is available, otherwise a PollingWatcher.
+        """
+        try:
+            return InotifyWatcher(debounce=debounce, modify_interval=poll_interval, logger=logger)
+        except (OSError, AttributeError) as err:
+            if logger is not None:
+                logger.warning('inotify is not available (%s). Polling the simulation files every %g sec instead.'
+                               % (err, poll_interval))
+            return PollingWatcher(poll_interval=poll_interval, debounce=debounce, logger=logger)
+
+    def add_wakeup_fd(self, fd):
+        """
+        Register a file descriptor that interrupts wait() when it becomes readable. The owner of the file descriptor
+        is responsible for reading from it.
+        """
+        if fd not in self.wakeup_fds:
+            self.wakeup_fds.append(fd)
+
+    def sync(self, targets):
+        """
+        Update the set of watched directories.
+
+        :param targets: A dict mapping each directory to watch to the names of the files of interest in it.
+        """
+        for path in list(self.watched.keys()):
+            if path not in targets:
+                self.unwatch(path)
+                del self.watched[path]
+        for path, names in targets.items():
+            names = set(names)
+            if path not in self.watched:
+                self.watch(path, names)
+            self.watched[path] = names
+
+    def watch(self, path, names):
+        pass
+
+    def unwatch(self, path):
+        pass
+
+    @abc.abstractmethod
+    def wait(self, timeout):
+        """
+        Block until changes are detected, a wakeup file descriptor becomes readable, or the timeout expires.
+
+        :param timeout: The maximum waiting time in seconds.
+        :return: A tuple of (the set of directories with changes of interest, whether the directory structure has
+                 changed so that a full rescan is needed, the list of the readable wakeup file descriptors).
+        """
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def select(fds, timeout):
+        """
+        select() on readable file descriptors, treating an interrupted call (e.g. by SIGCHLD) as a timeout.
+        """
+        try:
+            readable, _, _ = select.select(fds, [], [], max(timeout, 0))
+        except (select.error, OSError, IOError) as err:
+            if err.args[0] == errno.EINTR:
+                return []
+            raise
+        return readable
+
+
+class InotifyWatcher(TreeWatcher):
+    """
+    Watch the simulation directories with the Linux inotify API, accessed through ctypes.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    # When a code exits, its output file is closed, which is reported as IN_CLOSE_WRITE. A running code modifies its
+    # output file continuously: after an IN_MODIFY event, IN_MODIFY is removed from the watch of the directory for
+    # modify_interval seconds, so that a simulation wakes the daemon up at most once per interval.
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+
+    EVENT_HEADER = struct.Struct('iIII')  # struct inotify_event: wd, mask, cookie, len, followed by the name
+
+    def __init__(self, debounce=0.5, modify_interval=10.0, logger=None):
+        """
+        :param modify_interval: The minimum time (in seconds) between two reports of the modifications of the files of
+                                interest in a directory, e.g. the output file of a running code.
+        """
+        super(InotifyWatcher, self).__init__(debounce=debounce, logger=logger)
+        self.modify_interval = modify_interval
+        self.muted = dict()  # path -> the time after which the IN_MODIFY events of the directory are watched again
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._inotify_init1 = libc.inotify_init1
+        self._inotify_add_watch = libc.inotify_add_watch
+        self._inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._inotify_rm_watch = libc.inotify_rm_watch
+        self._inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = self._inotify_init1(InotifyWatcher.IN_NONBLOCK | InotifyWatcher.IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.wd_to_path = dict()
+        self.path_to_wd = dict()
+        self.watch_limit_reached = False
+
+    def watch(self, path, names, modify=True):
+        """
+        Watch a directory, or change the events watched in a directory.
+
+        :param modify: Watch the IN_MODIFY events.
+        """
+        if isinstance(path, bytes):
+            c_path = path
+        else:
+            c_path = path.encode(sys.getfilesystemencoding())
+        mask = InotifyWatcher.WATCH_MASK
+        if modify:
+            mask |= InotifyWatcher.IN_MODIFY
+        wd = self._inotify_add_watch(self.fd, c_path, mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC and not self.watch_limit_reached:
+                # fs.inotify.max_user_watches exceeded: the remaining directories are covered by the periodic sweep
+                self.watch_limit_reached = True
+                if self.logger is not None:
+                    self.logger.warning('inotify watch limit reached. Some simulations are only checked by the '
+                                        'periodic sweep. Consider increasing fs.inotify.max_user_watches.')
+            return
+        self.wd_to_path[wd] = path
+        self.path_to_wd[path] = wd
+
+    def unwatch(self, path):
+        self.muted.pop(path, None)
+        wd = self.path_to_wd.pop(path, None)
+        if wd is not None:
+            self._inotify_rm_watch(self.fd, wd)
+            self.wd_to_path.pop(wd, None)
+
+    def wait(self, timeout):
+        changed = set()
+        rescan = False
+        ready_fds = []
+        deadline = time.time() + timeout
+        first_event_time = None
+        while True:
+            if first_event_time is not None:
+                deadline = min(deadline, first_event_time + self.debounce)
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            unmute_time = self._unmute()
+            if unmute_time is not None:
+                remaining = min(remaining, unmute_time - time.time())
+            readable = TreeWatcher.select([self.fd] + self.wakeup_fds, remaining)
+            for fd in readable:
+                if fd != self.fd:
+                    ready_fds.append(fd)
+            if len(ready_fds) > 0:
+                break
+            if self.fd in readable:
+                n_changed = len(changed)
+                rescan = self._read_events(changed) or rescan
+                if first_event_time is None and (rescan or len(changed) > n_changed):
+                    first_event_time = time.time()
+        return changed, rescan, ready_fds
+
+    def _unmute(self):
+        """
+        Watch again the IN_MODIFY events of the directories whose interval has elapsed.
+
+        :return: The next time at which a directory is to be unmuted, or None.
+        """
+        now = time.time()
+        next_time = None
+        for path, unmute_time in list(self.muted.items()):
+            if unmute_time <= now:
+                del self.muted[path]
+                if path in self.path_to_wd:
+                    self.watch(path, self.watched.get(path, ()))
+            elif next_time is None or unmute_time < next_time:
+                next_time = unmute_time
+        return next_time
+
+    def _read_events(self, changed):
+        """
+        Read the pending inotify events and add the directories with relevant changes to ``changed``.
+
+        :return: True if the directory structure changed (or events have been lost), i.e. a rescan is needed.
+        """
+        rescan = False
+        try:
+            buf = os.read(self.fd, 65536)
+        except OSError as err:
+            if err.errno in (errno.EAGAIN, errno.EINTR):
+                return False
+            raise
+        pos = 0
+        header_size = InotifyWatcher.EVENT_HEADER.size
+        while pos + header_size <= len(buf):
+            wd, mask, cookie, length = InotifyWatcher.EVENT_HEADER.unpack_from(buf, pos)
+            name = buf[pos + header_size:pos + header_size + length].rstrip(b'\0')
+            pos += header_size + length
+            if not isinstance(name, str):
+                name = name.decode(sys.getfilesystemencoding())
+            if mask & InotifyWatcher.IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            path = self.wd_to_path.get(wd)
+            if path is None:
+                continue
+            if mask & InotifyWatcher.IN_IGNORED:
+                # the watch has been removed by the kernel, e.g. the directory has been deleted
+                self.wd_to_path.pop(wd, None)
+                self.path_to_wd.pop(path, None)
+                rescan = True
+            elif mask & (InotifyWatcher.IN_ISDIR | InotifyWatcher.IN_DELETE_SELF):
+                rescan = True  # a restart directory (or a simulation) added or removed
+            elif mask & InotifyWatcher.IN_MODIFY:
+                # a file written in place, e.g. the output file of a running code
+                if path in self.muted:
+                    continue  # already queued before IN_MODIFY was removed from the watch
+                self.muted[path] = time.time() + self.modify_interval
+                self.watch(path, self.watched.get(path, ()), modify=False)
+                if name in self.watched.get(path, ()):
+                    changed.add(path)
+            elif name in self.watched.get(path, ()):
+                changed.add(path)
+        return rescan
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher(TreeWatcher):
+    """
+    Watch the simulation directories by periodically stat'ing the files of interest. A change in the modification
+    time of a directory is followed by a listing of its sub-directories to detect new restart directories.
+    """
+
+    def __init__(self, poll_interval=10.0, debounce=0.5, logger=None):
+        super(PollingWatcher, self).__init__(debounce=debounce, logger=logger)
+        self.poll_interval = poll_interval
+        self.snapshots = dict()  # path -> (directory mtime, sub-directories, {name: (size, mtime)})
+
+    @staticmethod
+    def take_snapshot(path, names, previous=None):
+        try:
+            dir_mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        if previous is not None and previous[0] == dir_mtime:
+            subdirs = previous[1]
+        else:
+            subdirs = set()
+            try:
+                for name in os.listdir(path):
+                    try:
+                        if stat.S_ISDIR(os.lstat(os.path.join(path, name)).st_mode):
+                            subdirs.add(name)
+                    except OSError:
+                        continue
+            except OSError:
+                pass
+        files = dict()
+        for name in names:
+            try:
+                st = os.stat(os.path.join(path, name))
+                files[name] = (st.st_size, st.st_mtime)
+            except OSError:
+                files[name] = None
+        return dir_mtime, subdirs, files
+
+    def watch(self, path, names):
+        self.snapshots[path] = PollingWatcher.take_snapshot(path, names)
+
+    def unwatch(self, path):
+        self.snapshots.pop(path, None)
+
+    def poll(self, changed):
+        """
+        Compare the watched files with their snapshots.
+
+        :return: True if the directory structure changed.
+        """
+        rescan = False
+        for path, names in self.watched.items():
+            previous = self.snapshots.get(path)
+            snapshot = PollingWatcher.take_snapshot(path, names, previous)
+            self.snapshots[path] = snapshot
+            if snapshot is None or previous is None:
+                rescan = True
+                continue
+            if snapshot[1] != previous[1]:
+                rescan = True
+            if snapshot[2] != previous[2]:
+                changed.add(path)
+        return rescan
+
+    def wait(self, timeout):
+        changed = set()
+        rescan = False
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            ready_fds = TreeWatcher.select(self.wakeup_fds, min(self.poll_interval, remaining))
+            if len(ready_fds) > 0:
+                return changed, rescan, ready_fds
+            rescan = self.poll(changed) or rescan
+            if rescan or len(changed) > 0:
+                break
+        return changed, rescan, []